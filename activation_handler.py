@@ -5,7 +5,8 @@ import hashlib
 import tkinter as tk
 from tkinter import messagebox, Toplevel, Entry, Label, Button, Frame
 import subprocess
-import sqlite3
+import datetime
+from database import get_connection, get_db_path
 
 # ！！！重要！！！
 # 这是你的私人密钥（盐），请务必修改成一个复杂且无人知晓的字符串。
@@ -65,31 +66,10 @@ def verify_key(user_key):
     expected_key = generate_key(local_machine_id)
     return user_key.strip() == expected_key
 
-def get_db_path():
-    """获取数据库文件路径"""
-    if hasattr(sys, '_MEIPASS'):
-        base_dir = os.path.dirname(sys.executable)
-    else:
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-    return os.path.join(base_dir, 'listening_history.db')
-
 def create_activation_table():
-    """创建激活信息表"""
+    """创建激活信息表（由数据库迁移负责建表，这里只需确保连接可用）"""
     try:
-        db_path = get_db_path()
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS activation_info (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                activation_key TEXT NOT NULL,
-                activation_date TEXT NOT NULL,
-                machine_id TEXT NOT NULL,
-                created_time TEXT NOT NULL
-            )
-        """)
-        conn.commit()
-        conn.close()
+        get_connection()
         return True
     except Exception:
         return False
@@ -101,24 +81,12 @@ def check_license():
         if not os.path.exists(db_path):
             return False
             
-        conn = sqlite3.connect(db_path)
+        conn = get_connection()
         cursor = conn.cursor()
         
-        # 确保激活信息表存在
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS activation_info (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                activation_key TEXT NOT NULL,
-                activation_date TEXT NOT NULL,
-                machine_id TEXT NOT NULL,
-                created_time TEXT NOT NULL
-            )
-        """)
-        
         # 查询激活信息
         cursor.execute("SELECT activation_key FROM activation_info ORDER BY created_time DESC LIMIT 1")
         result = cursor.fetchone()
-        conn.close()
         
         if result:
             stored_key = result[0]
@@ -126,36 +94,19 @@ def check_license():
                 return True
             else:
                 # 如果密钥无效，删除激活记录
-                conn = sqlite3.connect(db_path)
-                cursor = conn.cursor()
                 cursor.execute("DELETE FROM activation_info")
                 conn.commit()
-                conn.close()
                 return False
         return False
     except Exception:
         return False
 
-import datetime
-
 def save_license(key):
     """保存有效的许可证密钥和激活日期到数据库"""
     try:
-        db_path = get_db_path()
-        conn = sqlite3.connect(db_path)
+        conn = get_connection()
         cursor = conn.cursor()
         
-        # 确保激活信息表存在
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS activation_info (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                activation_key TEXT NOT NULL,
-                activation_date TEXT NOT NULL,
-                machine_id TEXT NOT NULL,
-                created_time TEXT NOT NULL
-            )
-        """)
-        
         # 先清空之前的激活记录（保证唯一性）
         cursor.execute("DELETE FROM activation_info")
         
@@ -170,7 +121,6 @@ def save_license(key):
         """, (key, activation_date, machine_id, current_time))
         
         conn.commit()
-        conn.close()
         return True
         
     except Exception as e:
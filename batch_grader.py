@@ -0,0 +1,186 @@
+import os
+import sys
+import csv
+import json
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from subtitles import load_subtitle
+from dictation import align_dictation
+
+# 听写批量评分（不需要图形界面）：
+#   python batch_grader.py 字幕/lesson1.srt 答卷文件夹/ -o 成绩.csv
+# 答卷为文本文件，每行对应字幕中的一句（空行表示该句未作答）。
+# 每份答卷在进程池中独立评分，评分方式与播放器中的听写练习相同。
+
+CSV_FIELDS = ('sheet', 'sentence', 'start', 'reference', 'answer', 'similarity', 'wer',
+              'substitutions', 'deletions', 'insertions', 'correct')
+SUMMARY_FIELDS = ('sheet', 'sentences', 'answered', 'char_accuracy', 'word_accuracy', 'wer', 'sentence_accuracy')
+
+_reference = None  # 工作进程中的 [(开始时间, 文本), ...]，由 _init_worker 设置
+
+
+def read_answer_sheet(path):
+    """读取答卷，返回每行的答案（去掉首尾空白）"""
+    with open(path, 'r', encoding='utf-8-sig', errors='replace') as f:
+        return [line.strip() for line in f]
+
+
+def collect_sheets(paths):
+    """展开命令行中的路径：文件夹中的 .txt 文件按文件名排序加入"""
+    sheets = []
+    for path in paths:
+        if os.path.isdir(path):
+            sheets.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                 if name.lower().endswith('.txt')))
+        else:
+            sheets.append(path)
+    return sheets
+
+
+def grade_answers(reference, answers):
+    """按句评分，reference 为 [(开始时间, 文本), ...]，answers 为每句的答案（不足的按未作答处理）
+
+    返回 (汇总, [每句结果, ...])。
+    """
+    rows = []
+    total_chars = correct_chars = total_words = word_errors = correct_sentences = answered = 0
+    for index, (start, text) in enumerate(reference):
+        answer = answers[index] if index < len(answers) else ''
+        alignment = align_dictation(answer, text)
+        words = alignment.words
+        if answer:
+            answered += 1
+        total_chars += len(text)
+        correct_chars += alignment.correct_chars
+        total_words += words.reference_count
+        word_errors += words.error_count
+        correct_sentences += alignment.is_correct
+        rows.append({
+            'sentence': index + 1,
+            'start': round(start, 3),
+            'reference': text,
+            'answer': answer,
+            'similarity': round(alignment.similarity, 4),
+            'wer': round(words.wer, 4),
+            'substitutions': words.substitutions,
+            'deletions': words.deletions,
+            'insertions': words.insertions,
+            'correct': alignment.is_correct,
+        })
+    count = len(reference)
+    summary = {
+        'sentences': count,
+        'answered': answered,
+        'char_accuracy': round(correct_chars / total_chars, 4) if total_chars else 0.0,
+        'word_accuracy': round(max(0.0, 1.0 - word_errors / total_words), 4) if total_words else 0.0,
+        'wer': round(word_errors / total_words, 4) if total_words else 0.0,
+        'sentence_accuracy': round(correct_sentences / count, 4) if count else 0.0,
+    }
+    return summary, rows
+
+
+def _init_worker(reference):
+    global _reference
+    _reference = reference
+
+
+def _grade_sheet(path):
+    """工作进程：读取并评分一份答卷"""
+    try:
+        summary, rows = grade_answers(_reference, read_answer_sheet(path))
+    except OSError as e:
+        return path, None, str(e)
+    return path, (dict(sheet=path, **summary), rows), None
+
+
+def grade_sheets(subtitle_path, sheet_paths, workers=None, on_progress=None):
+    """在进程池中评分全部答卷，按输入顺序返回 [(答卷路径, (汇总, 每句结果) 或None, 错误信息), ...]"""
+    reference = [(start, text) for start, _, text in load_subtitle(subtitle_path)]
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(reference,)) as pool:
+        # 答卷很多时按块分发，减少进程间通信次数
+        chunksize = max(1, len(sheet_paths) // ((workers or os.cpu_count() or 1) * 8))
+        for result in pool.map(_grade_sheet, sheet_paths, chunksize=chunksize):
+            results.append(result)
+            if on_progress:
+                on_progress(len(results), len(sheet_paths))
+    return results
+
+
+def write_csv_report(path, results, summary_only=False):
+    """CSV 报告：默认每句一行；summary_only 时每份答卷一行"""
+    fields = SUMMARY_FIELDS if summary_only else CSV_FIELDS
+    # utf-8-sig：Excel 打开时能正确识别中文
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        for sheet, graded, _ in results:
+            if graded is None:
+                continue
+            summary, rows = graded
+            if summary_only:
+                writer.writerow(summary)
+            else:
+                for row in rows:
+                    writer.writerow(dict(row, sheet=sheet))
+
+
+def write_json_report(path, subtitle_path, results, summary_only=False):
+    sheets = []
+    for sheet, graded, error in results:
+        if graded is None:
+            sheets.append({'sheet': sheet, 'error': error})
+            continue
+        summary, rows = graded
+        entry = dict(summary)
+        if not summary_only:
+            entry['details'] = rows
+        sheets.append(entry)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'subtitle': subtitle_path, 'sheets': sheets}, f, ensure_ascii=False, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="听写答卷批量评分：每行答案对应字幕中的一句")
+    parser.add_argument('subtitle', help="字幕文件（.srt/.vtt/.lrc/.ass）")
+    parser.add_argument('sheets', nargs='+', help="答卷文件，或包含 .txt 答卷的文件夹")
+    parser.add_argument('-o', '--output', required=True, help="报告文件，扩展名为 .csv 或 .json")
+    parser.add_argument('--summary', action='store_true', help="只输出每份答卷的汇总")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="进程数（默认为CPU核数）")
+    args = parser.parse_args(argv)
+
+    sheet_paths = collect_sheets(args.sheets)
+    if not sheet_paths:
+        parser.error("没有找到答卷文件")
+    output_ext = os.path.splitext(args.output)[1].lower()
+    if output_ext not in ('.csv', '.json'):
+        parser.error("报告文件的扩展名必须是 .csv 或 .json")
+
+    def report_progress(done, total):
+        if done == total or done % 50 == 0:
+            print(f"\r已评分 {done}/{total}", end='', file=sys.stderr, flush=True)
+
+    try:
+        results = grade_sheets(args.subtitle, sheet_paths, args.workers, report_progress)
+    except IOError as e:
+        print(f"无法读取字幕：{e}", file=sys.stderr)
+        return 1
+    print(file=sys.stderr)
+
+    if output_ext == '.json':
+        write_json_report(args.output, args.subtitle, results, args.summary)
+    else:
+        write_csv_report(args.output, results, args.summary)
+
+    failed = [(sheet, error) for sheet, graded, error in results if graded is None]
+    for sheet, error in failed:
+        print(f"无法读取答卷 {sheet}：{error}", file=sys.stderr)
+    print(f"已评分 {len(results) - len(failed)} 份答卷，报告已保存到 {args.output}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,945 @@
+import os
+import sys
+import time
+import datetime
+import queue
+import sqlite3
+import threading
+from library import file_fingerprint
+
+DB_FILENAME = 'listening_history.db'
+
+# 数据库结构版本记录在 PRAGMA user_version 中。
+# 每个迁移只执行一次，按顺序升级；已发布的迁移不要修改，只能在末尾追加。
+
+
+def _migration_1_sessions(cursor):
+    """创建学习历史表（兼容缺少 total_audio_length 列的旧数据库）"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            audio_path TEXT NOT NULL,
+            start_time TEXT NOT NULL,
+            end_time TEXT NOT NULL,
+            duration REAL NOT NULL,
+            total_audio_length REAL
+        )
+    """)
+    cursor.execute("PRAGMA table_info(sessions)")
+    columns = [info[1] for info in cursor.fetchall()]
+    if 'total_audio_length' not in columns:
+        cursor.execute("ALTER TABLE sessions ADD COLUMN total_audio_length REAL")
+
+
+def _migration_2_session_indexes(cursor):
+    """为按音频路径查询和按时间分页的历史列表添加索引"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_audio_path ON sessions(audio_path)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_start_time ON sessions(start_time, id)")
+
+
+def _migration_3_activation_info(cursor):
+    """创建激活信息表（原先由 activation_handler 每次调用时创建）"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS activation_info (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            activation_key TEXT NOT NULL,
+            activation_date TEXT NOT NULL,
+            machine_id TEXT NOT NULL,
+            created_time TEXT NOT NULL
+        )
+    """)
+
+
+def _migration_4_sentence_events(cursor):
+    """创建音频文件表和逐句练习记录表
+
+    sentence_events 每次单句循环重播、每次听写提交各记一行，
+    两个覆盖索引分别服务于"某文件最难的句子"和"每日练习时长"两类聚合查询。
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS audio_files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            path TEXT NOT NULL UNIQUE
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sentence_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_id INTEGER NOT NULL REFERENCES audio_files(id),
+            sentence_index INTEGER NOT NULL,
+            event_type INTEGER NOT NULL,
+            event_time TEXT NOT NULL,
+            event_date TEXT NOT NULL,
+            speed REAL NOT NULL DEFAULT 1.0,
+            duration REAL NOT NULL DEFAULT 0,
+            similarity REAL
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_sentence_events_file
+        ON sentence_events(file_id, sentence_index, event_type, similarity)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_sentence_events_date
+        ON sentence_events(event_date, duration)
+    """)
+
+
+def _migration_5_daily_stats(cursor):
+    """创建按天汇总的学习统计表，并用已有的学习记录回填
+
+    daily_stats 每天一行，随会话和逐句事件的写入增量维护；daily_files 用于
+    统计当天练习过的不同文件数；stats_summary 只有一行，保存累计值和连续天数。
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_stats (
+            stat_date TEXT PRIMARY KEY,
+            listen_seconds REAL NOT NULL DEFAULT 0,
+            files_touched INTEGER NOT NULL DEFAULT 0,
+            sentences_looped INTEGER NOT NULL DEFAULT 0,
+            dictation_attempts INTEGER NOT NULL DEFAULT 0,
+            dictation_similarity_sum REAL NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_files (
+            stat_date TEXT NOT NULL,
+            file_id INTEGER NOT NULL,
+            PRIMARY KEY (stat_date, file_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stats_summary (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            listen_seconds REAL NOT NULL DEFAULT 0,
+            sentences_looped INTEGER NOT NULL DEFAULT 0,
+            dictation_attempts INTEGER NOT NULL DEFAULT 0,
+            dictation_similarity_sum REAL NOT NULL DEFAULT 0,
+            active_days INTEGER NOT NULL DEFAULT 0,
+            current_streak INTEGER NOT NULL DEFAULT 0,
+            longest_streak INTEGER NOT NULL DEFAULT 0,
+            last_active_date TEXT
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO stats_summary (id) VALUES (1)")
+
+    # 回填：旧会话只有累计时长，按开始日期归档
+    cursor.execute("INSERT OR IGNORE INTO audio_files (path) SELECT DISTINCT audio_path FROM sessions")
+    cursor.execute("""
+        INSERT OR IGNORE INTO daily_files (stat_date, file_id)
+        SELECT substr(s.start_time, 1, 10), f.id FROM sessions s JOIN audio_files f ON f.path = s.audio_path
+        UNION
+        SELECT event_date, file_id FROM sentence_events
+    """)
+    cursor.execute("""
+        INSERT OR IGNORE INTO daily_stats (stat_date, listen_seconds, files_touched, sentences_looped,
+                                 dictation_attempts, dictation_similarity_sum)
+        SELECT d.stat_date,
+               COALESCE((SELECT SUM(duration) FROM sessions WHERE substr(start_time, 1, 10) = d.stat_date), 0),
+               (SELECT COUNT(*) FROM daily_files f WHERE f.stat_date = d.stat_date),
+               COALESCE((SELECT COUNT(*) FROM sentence_events e WHERE e.event_date = d.stat_date AND e.event_type = 1), 0),
+               COALESCE((SELECT COUNT(*) FROM sentence_events e WHERE e.event_date = d.stat_date AND e.event_type = 2), 0),
+               COALESCE((SELECT SUM(similarity) FROM sentence_events e WHERE e.event_date = d.stat_date AND e.event_type = 2), 0)
+        FROM (SELECT DISTINCT stat_date FROM daily_files) d
+    """)
+    cursor.execute("""
+        UPDATE stats_summary SET
+            listen_seconds = (SELECT COALESCE(SUM(listen_seconds), 0) FROM daily_stats),
+            sentences_looped = (SELECT COALESCE(SUM(sentences_looped), 0) FROM daily_stats),
+            dictation_attempts = (SELECT COALESCE(SUM(dictation_attempts), 0) FROM daily_stats),
+            dictation_similarity_sum = (SELECT COALESCE(SUM(dictation_similarity_sum), 0) FROM daily_stats),
+            active_days = (SELECT COUNT(*) FROM daily_stats)
+        WHERE id = 1
+    """)
+    cursor.execute("SELECT stat_date FROM daily_stats ORDER BY stat_date")
+    current_streak = longest_streak = 0
+    last_date = None
+    for (stat_date,) in cursor.fetchall():
+        day = datetime.date.fromisoformat(stat_date)
+        if last_date is not None and day - last_date == datetime.timedelta(days=1):
+            current_streak += 1
+        else:
+            current_streak = 1
+        longest_streak = max(longest_streak, current_streak)
+        last_date = day
+    cursor.execute("""
+        UPDATE stats_summary SET current_streak = ?, longest_streak = ?, last_active_date = ? WHERE id = 1
+    """, (current_streak, longest_streak, last_date.isoformat() if last_date else None))
+
+
+def _migration_6_fingerprints(cursor):
+    """为学习记录和音频文件增加内容指纹列，文件移动/改名后按指纹重新关联"""
+    cursor.execute("ALTER TABLE sessions ADD COLUMN fingerprint TEXT")
+    cursor.execute("ALTER TABLE audio_files ADD COLUMN fingerprint TEXT")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_fingerprint ON sessions(fingerprint)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audio_files_fingerprint ON audio_files(fingerprint)")
+
+
+def _migration_7_library(cursor):
+    """创建音频库索引表：音频文件夹中每个音频一行，由后台索引线程增量维护"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS library (
+            path TEXT PRIMARY KEY,
+            base_name TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            fingerprint TEXT,
+            duration REAL,
+            subtitle_path TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_library_base_name ON library(base_name)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_library_fingerprint ON library(fingerprint)")
+
+
+def _migration_8_subtitle_search(cursor):
+    """创建字幕全文索引：subtitle_fts 的 rowid = 字幕文件ID * SENTENCE_ROWID_STRIDE + 句子序号"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS subtitle_files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            path TEXT NOT NULL UNIQUE,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_library_subtitle_path ON library(subtitle_path)")
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS subtitle_fts USING fts5(
+                text, start_time UNINDEXED, tokenize = 'unicode61 remove_diacritics 2'
+            )
+        """)
+    except sqlite3.OperationalError:
+        # SQLite 未编译 FTS5 时不提供字幕搜索，其余功能不受影响
+        pass
+
+
+def _migration_9_embedded_subtitles(cursor):
+    """创建内嵌字幕缓存：按视频文件指纹保存提取并解析后的字幕，cues 为NULL表示没有文本字幕"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS embedded_subtitles (
+            fingerprint TEXT PRIMARY KEY,
+            cues TEXT
+        )
+    """)
+
+
+def _migration_10_dictation_progress(cursor):
+    """创建听写进度表：每个音频一行保存当前句子和统计，每句保存最近一次提交的答案
+
+    两张表都以音频文件ID为主键前缀，重新打开文件时按主键直接读取，不需要回放练习事件。
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS dictation_progress (
+            file_id INTEGER PRIMARY KEY REFERENCES audio_files(id),
+            current_sentence INTEGER NOT NULL DEFAULT 0,
+            total_chars INTEGER NOT NULL DEFAULT 0,
+            correct_chars INTEGER NOT NULL DEFAULT 0,
+            total_sentences INTEGER NOT NULL DEFAULT 0,
+            correct_sentences INTEGER NOT NULL DEFAULT 0,
+            total_words INTEGER NOT NULL DEFAULT 0,
+            word_errors INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS dictation_answers (
+            file_id INTEGER NOT NULL REFERENCES audio_files(id),
+            sentence_index INTEGER NOT NULL,
+            user_input TEXT NOT NULL,
+            similarity REAL NOT NULL,
+            wer REAL,
+            answered_at TEXT NOT NULL,
+            PRIMARY KEY (file_id, sentence_index)
+        ) WITHOUT ROWID
+    """)
+
+
+def _migration_11_review_schedule(cursor):
+    """创建复习计划表：需要复习的句子按间隔重复安排下次复习日期"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS review_schedule (
+            file_id INTEGER NOT NULL REFERENCES audio_files(id),
+            sentence_index INTEGER NOT NULL,
+            repetitions INTEGER NOT NULL DEFAULT 0,
+            interval_days INTEGER NOT NULL DEFAULT 0,
+            ease REAL NOT NULL DEFAULT 2.5,
+            due_date TEXT NOT NULL,
+            PRIMARY KEY (file_id, sentence_index)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_review_schedule_due ON review_schedule(file_id, due_date)")
+
+
+def _migration_12_subtitle_end_time(cursor):
+    """字幕全文索引增加句子结束时间列（例句截取到字幕的结束时间，而不是下一句的开始）
+
+    FTS5 表不能增加列，重建为空表并清空字幕文件记录：外部字幕由下一次扫描重新索引，
+    内嵌字幕由索引线程从 embedded_subtitles 缓存重新写入。
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'subtitle_fts'")
+    if cursor.fetchone() is None:
+        return
+    cursor.execute("DROP TABLE subtitle_fts")
+    cursor.execute("""
+        CREATE VIRTUAL TABLE subtitle_fts USING fts5(
+            text, start_time UNINDEXED, end_time UNINDEXED, tokenize = 'unicode61 remove_diacritics 2'
+        )
+    """)
+    cursor.execute("DELETE FROM subtitle_files")
+
+
+MIGRATIONS = [
+    _migration_1_sessions,
+    _migration_2_session_indexes,
+    _migration_3_activation_info,
+    _migration_4_sentence_events,
+    _migration_5_daily_stats,
+    _migration_6_fingerprints,
+    _migration_7_library,
+    _migration_8_subtitle_search,
+    _migration_9_embedded_subtitles,
+    _migration_10_dictation_progress,
+    _migration_11_review_schedule,
+    _migration_12_subtitle_end_time,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def configure_connection(conn):
+    """设置连接级参数：WAL日志模式，NORMAL同步级别"""
+    # WAL模式下读写互不阻塞，NORMAL同步在WAL下仍保证数据库一致性
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+
+
+def get_schema_version(conn):
+    """读取数据库当前结构版本"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """将数据库升级到最新结构版本，返回升级后的版本号"""
+    version = get_schema_version(conn)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"数据库版本({version})高于程序支持的版本({SCHEMA_VERSION})，请升级程序")
+
+    conn.commit()  # 结束可能存在的隐式事务，迁移使用显式事务
+    for target_version in range(version + 1, SCHEMA_VERSION + 1):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            MIGRATIONS[target_version - 1](cursor)
+            # PRAGMA 不支持参数绑定，版本号为内部整数
+            cursor.execute(f"PRAGMA user_version = {int(target_version)}")
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+    return SCHEMA_VERSION
+
+
+_db_path = None
+
+
+def get_db_path():
+    """获取数据库文件路径（与可执行文件/脚本同目录，只解析一次）"""
+    global _db_path
+    if _db_path is None:
+        if hasattr(sys, '_MEIPASS'):
+            base_dir = os.path.dirname(sys.executable)
+        else:
+            base_dir = os.path.dirname(os.path.abspath(__file__))
+        _db_path = os.path.join(base_dir, DB_FILENAME)
+    return _db_path
+
+
+class ConnectionManager:
+    """按线程复用数据库连接的管理器
+
+    每个线程首次访问时创建一条连接并一直复用，sqlite3 的语句缓存随连接保留，
+    相同SQL不会重复编译；结构迁移在整个进程中只执行一次。
+    """
+
+    def __init__(self, db_path=None, cached_statements=256):
+        self._db_path = db_path
+        self._cached_statements = cached_statements
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._migrated = False
+
+    @property
+    def db_path(self):
+        if self._db_path is None:
+            self._db_path = get_db_path()
+        return self._db_path
+
+    def connection(self):
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+
+        # check_same_thread=False 仅用于退出时由主线程统一关闭，连接本身只在所属线程使用
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               cached_statements=self._cached_statements)
+        configure_connection(conn)
+        with self._lock:
+            if not self._migrated:
+                migrate(conn)
+                self._migrated = True
+            self._connections.append(conn)
+        self._local.conn = conn
+        return conn
+
+    def close_all(self):
+        """关闭所有线程的连接（程序退出时调用）"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+
+_manager = ConnectionManager()
+
+
+def get_connection():
+    """获取当前线程共享的数据库连接"""
+    return _manager.connection()
+
+
+def close_connections():
+    """关闭所有共享连接"""
+    _manager.close_all()
+
+
+def _safe_fingerprint(path):
+    """计算文件指纹，文件不可读时返回None"""
+    try:
+        return file_fingerprint(path)
+    except OSError:
+        return None
+
+
+def upsert_session(cursor, audio_path, start_time, end_time, duration, total_audio_length):
+    """写入某个音频的学习记录（每个音频一行），返回会话ID
+
+    路径查不到时按内容指纹查找原路径已失效的记录，找到则把记录迁移到新路径。
+    """
+    cursor.execute("SELECT id FROM sessions WHERE audio_path = ?", (audio_path,))
+    existing_session = cursor.fetchone()
+    fingerprint = None
+    if not existing_session:
+        fingerprint = _safe_fingerprint(audio_path)
+        if fingerprint:
+            cursor.execute("SELECT id, audio_path FROM sessions WHERE fingerprint = ?", (fingerprint,))
+            for session_id, old_path in cursor.fetchall():
+                if not os.path.exists(old_path):
+                    existing_session = (session_id,)
+                    break
+    if existing_session:
+        cursor.execute("""
+            UPDATE sessions SET audio_path = ?, duration = ?, end_time = ?, total_audio_length = ? WHERE id = ?
+        """, (audio_path, duration, end_time, total_audio_length, existing_session[0]))
+        return existing_session[0]
+    cursor.execute("""
+        INSERT INTO sessions (audio_path, start_time, end_time, duration, total_audio_length, fingerprint)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (audio_path, start_time, end_time, duration, total_audio_length, fingerprint))
+    return cursor.lastrowid
+
+
+def update_session_path(cursor, session_id, audio_path):
+    """把学习记录关联到新的文件路径（文件被移动或改名后）"""
+    cursor.execute("UPDATE sessions SET audio_path = ? WHERE id = ?", (audio_path, session_id))
+    return session_id
+
+
+def find_session_by_path(conn, audio_path):
+    """按路径查询学习记录，查不到时按内容指纹查找已移动文件的记录，返回 (id, duration) 或 None"""
+    row = conn.execute("SELECT id, duration FROM sessions WHERE audio_path = ?", (audio_path,)).fetchone()
+    if row:
+        return row
+    fingerprint = _safe_fingerprint(audio_path)
+    if fingerprint:
+        for session_id, old_path, duration in conn.execute(
+                "SELECT id, audio_path, duration FROM sessions WHERE fingerprint = ?", (fingerprint,)):
+            if not os.path.exists(old_path):
+                return session_id, duration
+    return None
+
+
+def delete_sessions(cursor, session_ids):
+    """删除指定的学习记录"""
+    cursor.executemany("DELETE FROM sessions WHERE id = ?", [(session_id,) for session_id in session_ids])
+
+
+def clear_sessions(cursor):
+    """清空全部学习记录"""
+    cursor.execute("DELETE FROM sessions")
+
+
+def _is_busy_error(error):
+    """数据库被其他连接锁住（稍后重试即可成功）"""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+
+class DatabaseWriter:
+    """后台数据库写入线程（write-behind）
+
+    UI线程通过 submit() 提交写操作后立即返回，写线程按 flush_interval 攒批，
+    在一个事务中提交。带相同 key 的待写操作会合并，只保留最后一次，
+    并按最后一次提交的位置排序。callback 在提交成功后于写线程中调用。
+    数据库被其他连接锁住时，操作留到下一轮重试；其他错误的操作记录后跳过。
+    """
+
+    _FLUSH = object()
+    _STOP = object()
+
+    def __init__(self, manager=None, flush_interval=1.0):
+        self._manager = manager or _manager
+        self._flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._retry = []  # 因数据库被锁而未写入的操作，下一轮排在最前面
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, func, *args, key=None, callback=None):
+        """提交写操作：func(cursor, *args)，返回值传给 callback"""
+        self._queue.put((key, func, args, callback))
+
+    def flush(self, wait=False, timeout=None):
+        """立即写入所有待写操作，wait=True 时等待写入完成"""
+        done = threading.Event()
+        self._queue.put((self._FLUSH, done))
+        if wait:
+            done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """写入剩余操作并结束写线程（程序退出时调用）"""
+        if self._thread is None:
+            return
+        self._queue.put((self._STOP, None))
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while True:
+            batch, self._retry = self._retry, []
+            events = []
+            stop = False
+            try:
+                # 有待重试的操作时最多等一个写入周期
+                item = self._queue.get(timeout=self._flush_interval if batch else None)
+            except queue.Empty:
+                item = None
+            deadline = time.monotonic() + self._flush_interval
+            while item is not None:
+                if item[0] is self._STOP:
+                    stop = True
+                    break
+                if item[0] is self._FLUSH:
+                    events.append(item[1])
+                    break
+                batch.append(item)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if stop:
+                # 退出前取出队列中剩余的操作
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item[0] is self._FLUSH:
+                        events.append(item[1])
+                    elif item[0] is not self._STOP:
+                        batch.append(item)
+
+            if batch:
+                self._write_batch(self._coalesce(batch))
+            if stop and self._retry:
+                # 退出前再试一次，仍然失败的只能放弃
+                retry, self._retry = self._retry, []
+                self._write_batch(retry)
+                if self._retry:
+                    print(f"数据库被锁定，退出时有 {len(self._retry)} 项记录未能写入", file=sys.stderr)
+            for event in events:
+                event.set()
+            if stop:
+                return
+
+    @staticmethod
+    def _coalesce(batch):
+        """合并相同 key 的操作，只保留最后一次，位置也取最后一次
+
+        取最后的位置，才不会让后提交的写入越过两次提交之间的其他操作（如删除记录）。
+        """
+        ops = []
+        positions = {}
+        for op in batch:
+            key = op[0]
+            if key is not None:
+                if key in positions:
+                    ops[positions[key]] = None
+                positions[key] = len(ops)
+            ops.append(op)
+        return [op for op in ops if op is not None]
+
+    def _write_batch(self, ops):
+        conn = self._manager.connection()
+        try:
+            results = self._execute(conn, ops)
+        except sqlite3.Error as e:
+            conn.rollback()
+            _discard_uncommitted_file_ids()
+            if _is_busy_error(e):
+                # 数据库被其他连接锁住，整批留到下一轮
+                self._retry.extend(ops)
+                return
+            # 批量写入失败时逐条重试，跳过出错的操作，避免一条坏数据拖累整批
+            results = []
+            for op in ops:
+                try:
+                    results.extend(self._execute(conn, [op]))
+                except sqlite3.Error as e:
+                    conn.rollback()
+                    _discard_uncommitted_file_ids()
+                    if _is_busy_error(e):
+                        self._retry.append(op)
+                    else:
+                        print(f"数据库写入失败，已跳过 {op[1].__name__}: {e}", file=sys.stderr)
+        for callback, result in results:
+            if callback is not None:
+                try:
+                    callback(result)
+                except Exception:
+                    pass
+
+    @staticmethod
+    def _execute(conn, ops):
+        cursor = conn.cursor()
+        results = [(callback, func(cursor, *args)) for _, func, args, callback in ops]
+        conn.commit()
+        _uncommitted_file_paths.clear()
+        return results
+
+
+# sentence_events.event_type
+SENTENCE_EVENT_LOOP = 1       # 单句循环播放一遍
+SENTENCE_EVENT_DICTATION = 2  # 提交一次听写答案
+
+_audio_file_ids = {}  # 音频路径 -> audio_files.id（audio_files 只增不删，可安全缓存）
+_uncommitted_file_paths = set()  # 写线程当前事务中新建或改了路径的记录，回滚时从缓存中移除
+
+
+def _discard_uncommitted_file_ids():
+    """写事务回滚后，缓存中本事务新建的ID已不存在，必须丢弃"""
+    for audio_path in _uncommitted_file_paths:
+        _audio_file_ids.pop(audio_path, None)
+    _uncommitted_file_paths.clear()
+
+
+def get_audio_file_id(cursor, audio_path):
+    """获取音频文件ID，不存在时创建
+
+    新路径先按内容指纹查找原路径已失效的记录，找到则沿用原ID，
+    这样文件移动后逐句练习记录和统计仍归属同一个文件。
+    只在 DatabaseWriter 的写操作中调用：新建的ID要等事务提交后才算数。
+    """
+    file_id = _audio_file_ids.get(audio_path)
+    if file_id is not None:
+        return file_id
+
+    cursor.execute("SELECT id FROM audio_files WHERE path = ?", (audio_path,))
+    row = cursor.fetchone()
+    if row is None:
+        fingerprint = _safe_fingerprint(audio_path)
+        if fingerprint:
+            cursor.execute("SELECT id, path FROM audio_files WHERE fingerprint = ?", (fingerprint,))
+            for candidate_id, old_path in cursor.fetchall():
+                if not os.path.exists(old_path):
+                    cursor.execute("UPDATE audio_files SET path = ? WHERE id = ?", (audio_path, candidate_id))
+                    row = (candidate_id,)
+                    break
+        if row is None:
+            cursor.execute("INSERT INTO audio_files (path, fingerprint) VALUES (?, ?)", (audio_path, fingerprint))
+            row = (cursor.lastrowid,)
+        _uncommitted_file_paths.add(audio_path)
+    file_id = _audio_file_ids[audio_path] = row[0]
+    return file_id
+
+
+def find_audio_file_id(conn, audio_path):
+    """查询音频文件ID（只读），不存在时返回None"""
+    file_id = _audio_file_ids.get(audio_path)
+    if file_id is None:
+        row = conn.execute("SELECT id FROM audio_files WHERE path = ?", (audio_path,)).fetchone()
+        if row:
+            file_id = _audio_file_ids[audio_path] = row[0]
+    return file_id
+
+
+def insert_sentence_event(cursor, audio_path, sentence_index, event_type, event_time,
+                          speed=1.0, duration=0.0, similarity=None):
+    """记录一条逐句练习事件，event_time 为 datetime，同时更新每日汇总"""
+    file_id = get_audio_file_id(cursor, audio_path)
+    stat_date = event_time.date().isoformat()
+    cursor.execute("""
+        INSERT INTO sentence_events (file_id, sentence_index, event_type, event_time, event_date, speed, duration, similarity)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (file_id, sentence_index, event_type, event_time.isoformat(), stat_date,
+          speed, duration, similarity))
+    event_id = cursor.lastrowid
+
+    _touch_daily_stats(cursor, stat_date, file_id)
+    if event_type == SENTENCE_EVENT_LOOP:
+        delta = (1, 0, 0.0)
+    else:
+        delta = (0, 1, similarity or 0.0)
+    for table, key_column, key in (('daily_stats', 'stat_date', stat_date), ('stats_summary', 'id', 1)):
+        cursor.execute(f"""
+            UPDATE {table} SET sentences_looped = sentences_looped + ?,
+                               dictation_attempts = dictation_attempts + ?,
+                               dictation_similarity_sum = dictation_similarity_sum + ?
+            WHERE {key_column} = ?
+        """, (*delta, key))
+    return event_id
+
+
+def add_listening_time(cursor, audio_path, event_time, seconds):
+    """把一段收听时长累加到当天的汇总统计，event_time 为 datetime"""
+    if seconds <= 0:
+        return
+    file_id = get_audio_file_id(cursor, audio_path)
+    stat_date = event_time.date().isoformat()
+    _touch_daily_stats(cursor, stat_date, file_id)
+    cursor.execute("UPDATE daily_stats SET listen_seconds = listen_seconds + ? WHERE stat_date = ?", (seconds, stat_date))
+    cursor.execute("UPDATE stats_summary SET listen_seconds = listen_seconds + ? WHERE id = 1", (seconds,))
+
+
+def _touch_daily_stats(cursor, stat_date, file_id):
+    """确保当天的汇总行存在，并维护当天文件数、活跃天数和连续天数"""
+    cursor.execute("INSERT OR IGNORE INTO daily_stats (stat_date) VALUES (?)", (stat_date,))
+    if cursor.rowcount == 1:
+        # 当天第一次有练习：更新活跃天数和连续天数
+        cursor.execute("SELECT current_streak, longest_streak, last_active_date FROM stats_summary WHERE id = 1")
+        current_streak, longest_streak, last_active_date = cursor.fetchone()
+        # 事件按时间顺序到达；早于最近活跃日的补录不影响连续天数
+        if not last_active_date or stat_date > last_active_date:
+            gap = (datetime.date.fromisoformat(stat_date) - datetime.date.fromisoformat(last_active_date)).days if last_active_date else None
+            current_streak = current_streak + 1 if gap == 1 else 1
+            last_active_date = stat_date
+        cursor.execute("""
+            UPDATE stats_summary SET active_days = active_days + 1, current_streak = ?,
+                                     longest_streak = ?, last_active_date = ?
+            WHERE id = 1
+        """, (current_streak, max(longest_streak, current_streak), last_active_date))
+
+    cursor.execute("INSERT OR IGNORE INTO daily_files (stat_date, file_id) VALUES (?, ?)", (stat_date, file_id))
+    if cursor.rowcount == 1:
+        cursor.execute("UPDATE daily_stats SET files_touched = files_touched + 1 WHERE stat_date = ?", (stat_date,))
+
+
+def get_daily_stats(conn, start_date, end_date):
+    """读取日期区间内的每日汇总（闭区间），返回 {stat_date: (分钟, 文件数, 循环句数, 听写次数, 听写平均相似度)}"""
+    rows = conn.execute("""
+        SELECT stat_date, listen_seconds, files_touched, sentences_looped,
+               dictation_attempts, dictation_similarity_sum
+        FROM daily_stats WHERE stat_date BETWEEN ? AND ?
+    """, (start_date, end_date)).fetchall()
+    return {
+        stat_date: (seconds / 60.0, files, looped, attempts, (similarity_sum / attempts) if attempts else None)
+        for stat_date, seconds, files, looped, attempts, similarity_sum in rows
+    }
+
+
+def get_stats_summary(conn, today=None):
+    """读取累计统计，返回字典；超过一天未练习时当前连续天数为0"""
+    row = conn.execute("""
+        SELECT listen_seconds, sentences_looped, dictation_attempts, dictation_similarity_sum,
+               active_days, current_streak, longest_streak, last_active_date
+        FROM stats_summary WHERE id = 1
+    """).fetchone()
+    (listen_seconds, sentences_looped, dictation_attempts, similarity_sum,
+     active_days, current_streak, longest_streak, last_active_date) = row
+    today = today or datetime.date.today()
+    if not last_active_date or (today - datetime.date.fromisoformat(last_active_date)).days > 1:
+        current_streak = 0
+    return {
+        'listen_minutes': listen_seconds / 60.0,
+        'sentences_looped': sentences_looped,
+        'dictation_attempts': dictation_attempts,
+        'dictation_accuracy': (similarity_sum / dictation_attempts) if dictation_attempts else None,
+        'active_days': active_days,
+        'current_streak': current_streak,
+        'longest_streak': longest_streak,
+    }
+
+
+def get_hardest_sentences(conn, audio_path, limit=10):
+    """某个音频中最难的句子：听写平均相似度最低者优先，其次循环次数最多者
+
+    返回 [(sentence_index, loop_count, dictation_count, avg_similarity), ...]，limit 为None时返回全部，
+    只扫描该文件的覆盖索引区间。
+    """
+    file_id = find_audio_file_id(conn, audio_path)
+    if file_id is None:
+        return []
+    return _hardest_sentences(conn, file_id, limit)
+
+
+def _hardest_sentences(conn, file_id, limit):
+    return conn.execute("""
+        SELECT sentence_index,
+               SUM(event_type = ?) AS loop_count,
+               SUM(event_type = ?) AS dictation_count,
+               AVG(CASE WHEN event_type = ? THEN similarity END) AS avg_similarity
+        FROM sentence_events
+        WHERE file_id = ?
+        GROUP BY sentence_index
+        ORDER BY avg_similarity IS NULL, avg_similarity ASC, loop_count DESC
+        LIMIT ?
+    """, (SENTENCE_EVENT_LOOP, SENTENCE_EVENT_DICTATION, SENTENCE_EVENT_DICTATION, file_id,
+          -1 if limit is None else limit)).fetchall()
+
+
+def get_daily_practice_minutes(conn, start_date, end_date):
+    """按天统计逐句练习时长（分钟），日期为 'YYYY-MM-DD' 字符串，闭区间
+
+    返回 [(event_date, minutes), ...]，只扫描日期覆盖索引。
+    """
+    return conn.execute("""
+        SELECT event_date, SUM(duration) / 60.0
+        FROM sentence_events
+        WHERE event_date BETWEEN ? AND ?
+        GROUP BY event_date
+        ORDER BY event_date
+    """, (start_date, end_date)).fetchall()
+
+
+# dictation_progress 中的统计列，与界面中 dictation_stats 的键相同
+DICTATION_STAT_KEYS = ('total_chars', 'correct_chars', 'total_sentences', 'correct_sentences',
+                       'total_words', 'word_errors')
+
+
+def save_dictation_position(cursor, audio_path, current_sentence, stats, updated_at):
+    """保存听写进度（当前句子和统计），updated_at 为 datetime"""
+    file_id = get_audio_file_id(cursor, audio_path)
+    cursor.execute(f"""
+        INSERT OR REPLACE INTO dictation_progress (file_id, current_sentence, {', '.join(DICTATION_STAT_KEYS)}, updated_at)
+        VALUES (?, ?, {', '.join('?' * len(DICTATION_STAT_KEYS))}, ?)
+    """, (file_id, current_sentence, *(stats[key] for key in DICTATION_STAT_KEYS), updated_at.isoformat()))
+    return file_id
+
+
+def save_dictation_answer(cursor, audio_path, sentence_index, user_input, similarity, wer,
+                          current_sentence, stats, answered_at):
+    """保存一次听写提交（同一句只保留最近一次答案），并更新进度"""
+    file_id = save_dictation_position(cursor, audio_path, current_sentence, stats, answered_at)
+    cursor.execute("""
+        INSERT OR REPLACE INTO dictation_answers (file_id, sentence_index, user_input, similarity, wer, answered_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (file_id, sentence_index, user_input, similarity, wer, answered_at.isoformat()))
+    return file_id
+
+
+def clear_dictation_progress(cursor, audio_path):
+    """清除某个音频的听写进度和答案（重置听写时调用）"""
+    file_id = get_audio_file_id(cursor, audio_path)
+    cursor.execute("DELETE FROM dictation_progress WHERE file_id = ?", (file_id,))
+    cursor.execute("DELETE FROM dictation_answers WHERE file_id = ?", (file_id,))
+
+
+def load_dictation_progress(conn, audio_path):
+    """读取某个音频的听写进度，没有时返回None
+
+    返回 (当前句子, 统计字典, [(sentence_index, user_input, similarity, wer), ...])，答案按句子顺序排列。
+    """
+    file_id = find_audio_file_id(conn, audio_path)
+    if file_id is None:
+        return None
+    row = conn.execute(f"""
+        SELECT current_sentence, {', '.join(DICTATION_STAT_KEYS)} FROM dictation_progress WHERE file_id = ?
+    """, (file_id,)).fetchone()
+    if row is None:
+        return None
+    answers = conn.execute("""
+        SELECT sentence_index, user_input, similarity, wer FROM dictation_answers
+        WHERE file_id = ? ORDER BY sentence_index
+    """, (file_id,)).fetchall()
+    return row[0], dict(zip(DICTATION_STAT_KEYS, row[1:])), answers
+
+
+# 复习计划（简化的 SM-2 间隔重复）
+REVIEW_SIMILARITY_THRESHOLD = 0.8  # 听写平均相似度低于此值的句子需要复习
+REVIEW_LOOP_THRESHOLD = 3          # 单句循环次数达到此值的句子需要复习
+REVIEW_MIN_EASE = 1.3
+REVIEW_MAX_EASE = 3.0
+
+
+def get_review_queue(conn, audio_path, today, similarity_threshold=REVIEW_SIMILARITY_THRESHOLD,
+                     loop_threshold=REVIEW_LOOP_THRESHOLD, limit=50):
+    """今天需要复习的句子序号：已到期的计划（越早到期越靠前），其次是尚未安排的薄弱句子（最难的优先）
+
+    today 为 date。难度排序沿用 get_hardest_sentences 的逐句聚合，计划按主键区间读取。
+    """
+    file_id = find_audio_file_id(conn, audio_path)
+    if file_id is None:
+        return []
+    hardest = _hardest_sentences(conn, file_id, None)
+    rank = {row[0]: position for position, row in enumerate(hardest)}
+    schedule = dict(conn.execute("SELECT sentence_index, due_date FROM review_schedule WHERE file_id = ?",
+                                 (file_id,)).fetchall())
+    today_text = today.isoformat()
+    due = sorted((index for index, due_date in schedule.items() if due_date <= today_text),
+                 key=lambda index: (schedule[index], rank.get(index, len(rank))))
+    weak = [sentence_index for sentence_index, loop_count, _, avg_similarity in hardest
+            if sentence_index not in schedule
+            and ((avg_similarity is not None and avg_similarity < similarity_threshold)
+                 or loop_count >= loop_threshold)]
+    return (due + weak)[:limit]
+
+
+def update_review_schedule(cursor, audio_path, sentence_index, remembered, today):
+    """记录一次复习结果并安排下次复习，返回下次复习日期（date）
+
+    记住了：间隔依次为1天、3天，之后每次乘以难度系数，系数略微增大；
+    没记住：明天再复习，系数减小。
+    """
+    file_id = get_audio_file_id(cursor, audio_path)
+    cursor.execute("SELECT repetitions, interval_days, ease FROM review_schedule WHERE file_id = ? AND sentence_index = ?",
+                   (file_id, sentence_index))
+    repetitions, interval_days, ease = cursor.fetchone() or (0, 0, 2.5)
+    if remembered:
+        repetitions += 1
+        interval_days = 1 if repetitions == 1 else 3 if repetitions == 2 else max(1, round(interval_days * ease))
+        ease = min(REVIEW_MAX_EASE, ease + 0.1)
+    else:
+        repetitions = 0
+        interval_days = 1
+        ease = max(REVIEW_MIN_EASE, ease - 0.2)
+    due_date = today + datetime.timedelta(days=interval_days)
+    cursor.execute("""
+        INSERT OR REPLACE INTO review_schedule (file_id, sentence_index, repetitions, interval_days, ease, due_date)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (file_id, sentence_index, repetitions, interval_days, ease, due_date.isoformat()))
+    return due_date
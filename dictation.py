@@ -0,0 +1,302 @@
+import re
+import difflib
+
+# 听写评分：对用户输入和正确答案只做一次对齐（不区分大小写），
+# 结果同时用于详细对比的显示和听写统计，两者不会再出现不一致。
+# 另外按单词计算编辑距离（WER），统计替换、漏写和多写的单词。
+
+SENTENCE_CORRECT_THRESHOLD = 0.8  # 相似度超过此值的句子算作正确
+
+# 对齐片段的类别，同时也是结果文本框中的标签名
+SEGMENT_CORRECT = 'correct'      # 与答案一致
+SEGMENT_INCORRECT = 'incorrect'  # 写错或多写的字符（显示用户输入）
+SEGMENT_MISSING = 'missing'      # 漏写的字符（显示答案中的内容）
+
+# 单词错误类别
+WORD_SUBSTITUTION = 'substitution'
+WORD_DELETION = 'deletion'    # 答案中有、用户漏写
+WORD_INSERTION = 'insertion'  # 用户多写
+
+# 统一引号、撇号和连字符的各种写法，其余标点在分词时忽略
+PUNCTUATION_TRANSLATION = str.maketrans({
+    '\u2018': "'", '\u2019': "'", '\u02bc': "'", '`': "'", '\u00b4': "'",
+    '\u2010': '-', '\u2011': '-', '\u2012': '-', '\u2013': '-', '\u2014': ' ', '\u2015': ' ',
+})
+WORD_PATTERN = re.compile(r"\w+(?:['-]\w+)*")
+
+
+class DictationAlignment:
+    """一次对齐的结果
+
+    opcodes 为 SequenceMatcher 的操作序列（i 对应用户输入，j 对应答案）；
+    segments 为 [(文本, 类别), ...]，按顺序拼接即为详细对比的显示内容；
+    correct_chars 为对齐上的字符数，similarity 与 SequenceMatcher.ratio() 相同。
+    """
+
+    __slots__ = ('correct_text', 'user_input', 'opcodes', 'segments', 'correct_chars', 'similarity', 'words')
+
+    def __init__(self, correct_text, user_input, opcodes, segments, correct_chars, similarity, words=None):
+        self.correct_text = correct_text
+        self.user_input = user_input
+        self.opcodes = opcodes
+        self.segments = segments
+        self.correct_chars = correct_chars
+        self.similarity = similarity
+        self.words = words  # WordScore
+
+    @property
+    def is_correct(self):
+        return self.similarity > SENTENCE_CORRECT_THRESHOLD
+
+    def error_counts(self):
+        """按类别统计字符数：{'correct': n, 'incorrect': n, 'missing': n}"""
+        counts = {SEGMENT_CORRECT: 0, SEGMENT_INCORRECT: 0, SEGMENT_MISSING: 0}
+        for text, kind in self.segments:
+            counts[kind] += len(text)
+        return counts
+
+
+def align_dictation(user_input, correct_text):
+    """对齐用户输入和正确答案（不区分大小写），返回 DictationAlignment"""
+    matcher = difflib.SequenceMatcher(None, user_input.lower(), correct_text.lower())
+    opcodes = matcher.get_opcodes()
+    segments = []
+    matched = 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            matched += i2 - i1
+            segments.append((correct_text[j1:j2], SEGMENT_CORRECT))
+        elif tag == 'insert':
+            segments.append((correct_text[j1:j2], SEGMENT_MISSING))
+        else:
+            # replace / delete：显示用户写错或多写的部分
+            segments.append((user_input[i1:i2], SEGMENT_INCORRECT))
+    total = len(correct_text) + len(user_input)
+    similarity = 2.0 * matched / total if total else 1.0
+    return DictationAlignment(correct_text, user_input, opcodes, segments, matched, similarity,
+                              score_words(user_input, correct_text))
+
+
+def build_result_markup(alignment):
+    """生成对比结果的完整文本和各标签的字符区间，供文本框一次插入、每个标签一次设置
+
+    返回 (文本, {标签: [(开始偏移, 结束偏移), ...]})。相邻的同标签片段合并为一个区间，
+    区间数最多与单词数同级，设置标签的调用次数只与标签种类数有关。
+    """
+    parts = []
+    ranges = {}
+    length = 0
+    last_tag = None
+
+    def add(text, tag):
+        nonlocal length, last_tag
+        if not text:
+            return
+        parts.append(text)
+        tag_ranges = ranges.setdefault(tag, [])
+        if tag == last_tag and tag_ranges and tag_ranges[-1][1] == length:
+            tag_ranges[-1] = (tag_ranges[-1][0], length + len(text))
+        else:
+            tag_ranges.append((length, length + len(text)))
+        length += len(text)
+        last_tag = tag
+
+    add("正确答案：\n", SEGMENT_CORRECT)
+    add(alignment.correct_text + "\n\n", SEGMENT_CORRECT)
+    add("您的答案：\n", 'user_answer')
+    add(alignment.user_input + "\n\n", 'user_answer')
+
+    # 字符级别的对比：正确的字符、写错或多写的字符（红色）、漏写的字符
+    add("详细对比：\n", 'header')
+    for text, tag in alignment.segments:
+        add(text, tag)
+
+    # 单词级别的错误：替换、漏写、多写
+    words = alignment.words
+    if words is not None:
+        add(f"\n\n单词：{words.hits}/{words.reference_count} 正确 | 替换 {words.substitutions}，"
+            f"漏写 {words.deletions}，多写 {words.insertions} | 词错误率 {words.wer * 100:.1f}%\n", 'header')
+        for kind, expected, written in words.errors:
+            if kind == WORD_SUBSTITUTION:
+                add(f"{written} → {expected}\n", SEGMENT_INCORRECT)
+            elif kind == WORD_DELETION:
+                add(f"漏写：{expected}\n", SEGMENT_MISSING)
+            else:
+                add(f"多写：{written}\n", SEGMENT_INCORRECT)
+    return ''.join(parts), ranges
+
+
+def tokenize_words(text):
+    """分词：转为小写，统一撇号/连字符写法，去掉其他标点"""
+    return WORD_PATTERN.findall(text.lower().translate(PUNCTUATION_TRANSLATION))
+
+
+class WordScore:
+    """单词级评分结果
+
+    errors 为 [(类别, 答案中的词, 用户写的词), ...]（漏写时用户写的词为None，多写时答案中的词为None），
+    按句中顺序排列。
+    """
+
+    __slots__ = ('reference_count', 'hits', 'substitutions', 'deletions', 'insertions', 'errors')
+
+    def __init__(self, reference_count, hits, substitutions, deletions, insertions, errors):
+        self.reference_count = reference_count
+        self.hits = hits
+        self.substitutions = substitutions
+        self.deletions = deletions
+        self.insertions = insertions
+        self.errors = errors
+
+    @property
+    def error_count(self):
+        return self.substitutions + self.deletions + self.insertions
+
+    @property
+    def wer(self):
+        """词错误率 (S + D + I) / 答案词数；答案为空时按用户是否多写计算"""
+        if self.reference_count:
+            return self.error_count / self.reference_count
+        return 1.0 if self.insertions else 0.0
+
+
+def _edit_columns(reference, hypothesis):
+    """按列计算 reference 与 hypothesis 的 Levenshtein 距离（Myers/Hyyrö 位并行算法）
+
+    答案的每个词对应整数中的一位，每处理用户的一个词只做常数次整数运算（Python 整数没有位数限制，
+    长句也不需要分块）。返回每列的 (VP, VN)：第 j 列中 D[i][j] - D[i-1][j] 为 +1/-1 的行各占一位，
+    回溯时可以据此还原任意一格的距离。
+    """
+    m = len(reference)
+    full = (1 << m) - 1
+    peq = {}
+    for i, word in enumerate(reference):
+        peq[word] = peq.get(word, 0) | (1 << i)
+    vp, vn = full, 0
+    columns = [(vp, vn)]
+    for word in hypothesis:
+        eq = peq.get(word, 0)
+        xv = eq | vn
+        xh = ((((eq & vp) + vp) & full) ^ vp) | eq
+        hp = vn | (~(xh | vp) & full)
+        hn = vp & xh
+        # 第0行 D[0][j] = j，所以水平差值在最上方补 +1
+        hp = ((hp << 1) | 1) & full
+        hn = (hn << 1) & full
+        vp = hn | (~(xv | hp) & full)
+        vn = hp & xv
+        columns.append((vp, vn))
+    return columns
+
+
+def score_words(user_input, correct_text):
+    """按单词比较用户输入和正确答案，返回 WordScore"""
+    reference = tokenize_words(correct_text)
+    hypothesis = tokenize_words(user_input)
+    columns = _edit_columns(reference, hypothesis)
+
+    def distance(i, j):
+        vp, vn = columns[j]
+        mask = (1 << i) - 1
+        return j + bin(vp & mask).count('1') - bin(vn & mask).count('1')
+
+    # 从右下角回溯：优先匹配，其次多写、漏写、替换（代价相同时，多写或漏写一个词
+    # 比把后面的词都判为替换更符合实际的听写错误）
+    hits = substitutions = deletions = insertions = 0
+    errors = []
+    i, j = len(reference), len(hypothesis)
+    current = distance(i, j)
+    while i or j:
+        if i and j and reference[i - 1] == hypothesis[j - 1] and distance(i - 1, j - 1) == current:
+            hits += 1
+            i, j = i - 1, j - 1
+            continue
+        if j and distance(i, j - 1) + 1 == current:
+            insertions += 1
+            errors.append((WORD_INSERTION, None, hypothesis[j - 1]))
+            j, current = j - 1, current - 1
+            continue
+        if i and distance(i - 1, j) + 1 == current:
+            deletions += 1
+            errors.append((WORD_DELETION, reference[i - 1], None))
+            i, current = i - 1, current - 1
+            continue
+        substitutions += 1
+        errors.append((WORD_SUBSTITUTION, reference[i - 1], hypothesis[j - 1]))
+        i, j, current = i - 1, j - 1, current - 1
+    errors.reverse()
+    return WordScore(len(reference), hits, substitutions, deletions, insertions, errors)
+
+
+def _benchmark():
+    """对齐耗时测试：旧流程（显示和统计各做一次对齐）与单次对齐比较，单词评分和结果显示耗时"""
+    import random
+    import time
+
+    random.seed(0)
+    words = "the quick brown fox jumps over a lazy dog while listening to every word".split()
+    for word_count in (10, 40, 120):
+        correct = ' '.join(random.choice(words) for _ in range(word_count)).capitalize() + '.'
+        user = ''.join(c for c in correct if random.random() > 0.05).replace('fox', 'box')
+        rounds = 2000 if word_count < 100 else 300
+
+        t = time.perf_counter()
+        for _ in range(rounds):
+            difflib.SequenceMatcher(None, user.lower(), correct.lower()).get_opcodes()
+            difflib.SequenceMatcher(None, correct, user).ratio()
+        two_pass = (time.perf_counter() - t) / rounds
+
+        t = time.perf_counter()
+        for _ in range(rounds):
+            align_dictation(user, correct)
+        one_pass = (time.perf_counter() - t) / rounds
+
+        print(f"{word_count:4d} 词 {len(correct):5d} 字符  两次对齐 {two_pass * 1000:7.3f} ms  "
+              f"单次对齐 {one_pass * 1000:7.3f} ms  ({two_pass / one_pass:.1f}x)")
+
+        t = time.perf_counter()
+        for _ in range(rounds):
+            score_words(user, correct)
+        words_time = (time.perf_counter() - t) / rounds
+        print(f"{'':19s}单词评分 {words_time * 1000:7.3f} ms")
+
+    # 结果显示：500字符的段落，逐段插入与一次插入 + 按标签批量设置比较（需要图形界面）
+    paragraph = ' '.join(random.choice(words) for _ in range(110))[:500]
+    answer = ''.join(c for c in paragraph if random.random() > 0.08).replace('dog', 'dot')
+    alignment = align_dictation(answer, paragraph)
+    text, ranges = build_result_markup(alignment)
+    print(f"500 字符段落：{len(alignment.segments)} 个对比片段，合并后 "
+          f"{sum(len(r) for r in ranges.values())} 个标签区间，{len(ranges)} 次设置标签")
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception:
+        print("（没有图形界面，跳过文本框渲染测试）")
+        return
+    widget = tk.Text(root)
+    widget.pack()
+    rounds = 50
+
+    t = time.perf_counter()
+    for _ in range(rounds):
+        widget.delete("1.0", tk.END)
+        for segment, tag in alignment.segments:
+            widget.insert(tk.END, segment, tag)
+        root.update_idletasks()
+    per_segment = (time.perf_counter() - t) / rounds
+
+    t = time.perf_counter()
+    for _ in range(rounds):
+        widget.delete("1.0", tk.END)
+        text, ranges = build_result_markup(alignment)
+        widget.insert("1.0", text)
+        for tag, tag_ranges in ranges.items():
+            widget.tag_add(tag, *(f"1.0 + {offset} chars" for r in tag_ranges for offset in r))
+        root.update_idletasks()
+    batched = (time.perf_counter() - t) / rounds
+    root.destroy()
+    print(f"文本框渲染  逐段插入 {per_segment * 1000:6.2f} ms  批量 {batched * 1000:6.2f} ms  (一帧 16.7 ms)")
+
+
+if __name__ == "__main__":
+    _benchmark()
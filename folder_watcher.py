@@ -0,0 +1,204 @@
+import os
+import sys
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+import threading
+
+# 文件夹监视：Linux 下通过 ctypes 调用 inotify，其他平台（或 inotify 不可用时）
+# 定时列出文件夹并与上次的快照比较（原地覆盖的文件不改变文件夹修改时间，所以每次都比较文件）。
+# 两种方式都只把发生变化的文件路径交给回调，不做整体重新扫描。
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+              IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+def _load_inotify():
+    """加载 libc 中的 inotify 函数，不支持时返回None"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+def snapshot_folder(folder):
+    """列出文件夹，返回 {路径: (大小, 修改时间ns)}"""
+    try:
+        entries = os.scandir(folder)
+    except OSError:
+        return {}
+    files = {}
+    with entries:
+        for entry in entries:
+            try:
+                if entry.is_file():
+                    st = entry.stat()
+                    files[entry.path] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                continue
+    return files
+
+
+class FolderWatcher:
+    """监视若干文件夹，把新增/删除/修改的文件路径批量交给 on_paths(paths)
+
+    事件在 settle_delay 秒内没有新变化后才一起提交，复制大量文件时只回调少数几次。
+    inotify 队列溢出等无法确定具体变化的情况会调用 on_rescan()。
+    回调都在监视线程中调用。
+    """
+
+    def __init__(self, folders, on_paths, on_rescan=None, poll_interval=2.0, settle_delay=0.5):
+        self.folders = [os.path.abspath(folder) for folder in folders]
+        self._on_paths = on_paths
+        self._on_rescan = on_rescan
+        self.poll_interval = poll_interval
+        self.settle_delay = settle_delay
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._watches = {}  # inotify 监视描述符 -> 文件夹
+        self._lost = set()  # 被删除或移走、等待重新监视的文件夹
+        self._libc = None
+        self.backend = None  # 'inotify' 或 'polling'
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        libc = _load_inotify()
+        fd = self._init_inotify(libc) if libc else None
+        if fd is not None:
+            self.backend = 'inotify'
+            target, args = self._run_inotify, (fd,)
+        else:
+            self.backend = 'polling'
+            target, args = self._run_polling, ()
+        self._thread = threading.Thread(target=target, args=args, name="folder-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _init_inotify(self, libc):
+        fd = libc.inotify_init1(IN_CLOEXEC)
+        if fd < 0:
+            return None
+        self._libc = libc
+        for folder in self.folders:
+            wd = libc.inotify_add_watch(fd, os.fsencode(folder), WATCH_MASK)
+            if wd < 0:
+                os.close(fd)
+                return None
+            self._watches[wd] = folder
+        return fd
+
+    def _flush(self, paths):
+        if paths:
+            try:
+                self._on_paths(sorted(paths))
+            except Exception:
+                pass
+            paths.clear()
+
+    def _rescan(self):
+        if self._on_rescan:
+            try:
+                self._on_rescan()
+            except Exception:
+                pass
+
+    def _rewatch(self, fd):
+        """重新监视已重新出现的文件夹（被删除后重建或移回原处），返回是否有文件夹恢复监视"""
+        restored = False
+        for folder in list(self._lost):
+            wd = self._libc.inotify_add_watch(fd, os.fsencode(folder), WATCH_MASK)
+            if wd >= 0:
+                self._watches[wd] = folder
+                self._lost.discard(folder)
+                restored = True
+        return restored
+
+    def _run_inotify(self, fd):
+        pending = set()
+        deadline = None
+        next_rewatch = 0.0
+        try:
+            while not self._stop_event.is_set():
+                if self._lost and time.monotonic() >= next_rewatch:
+                    next_rewatch = time.monotonic() + self.poll_interval
+                    if self._rewatch(fd):
+                        # 文件夹不在期间的变化无法得知，重新完整扫描
+                        self._rescan()
+                # 有待提交的事件时等到静默期结束，否则定时醒来检查停止标志
+                timeout = max(0.0, deadline - time.monotonic()) if deadline else 0.5
+                readable, _, _ = select.select([fd], [], [], timeout)
+                if not readable:
+                    if deadline and time.monotonic() >= deadline:
+                        self._flush(pending)
+                        deadline = None
+                    continue
+                data = os.read(fd, 64 * 1024)
+                offset = 0
+                while offset + _EVENT_HEADER.size <= len(data):
+                    wd, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+                    offset += _EVENT_HEADER.size
+                    name = data[offset:offset + name_len].rstrip(b'\0')
+                    offset += name_len
+                    if mask & IN_Q_OVERFLOW:
+                        pending.clear()
+                        self._rescan()
+                        continue
+                    folder = self._watches.get(wd)
+                    if folder is None or mask & IN_IGNORED:
+                        continue
+                    if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                        # 被监视的文件夹本身被删除或移动：原来的监视不再对应该路径，
+                        # 移除后定时尝试重新监视该路径，变化交给完整扫描处理
+                        del self._watches[wd]
+                        self._libc.inotify_rm_watch(fd, wd)
+                        self._lost.add(folder)
+                        next_rewatch = time.monotonic() + self.poll_interval
+                        self._rescan()
+                        continue
+                    if name:
+                        pending.add(os.path.join(folder, os.fsdecode(name)))
+                deadline = time.monotonic() + self.settle_delay
+        finally:
+            os.close(fd)
+
+    def _run_polling(self):
+        snapshots = {folder: snapshot_folder(folder) for folder in self.folders}
+        while not self._stop_event.wait(self.poll_interval):
+            changed = set()
+            for folder in self.folders:
+                old_files = snapshots[folder]
+                new_files = snapshot_folder(folder)
+                # 新增/删除的文件，以及大小或修改时间变化的文件（包括原地覆盖）
+                changed.update(old_files.keys() ^ new_files.keys())
+                changed.update(path for path, stat in new_files.items()
+                               if path in old_files and old_files[path] != stat)
+                snapshots[folder] = new_files
+            self._flush(changed)
@@ -0,0 +1,739 @@
+import os
+import re
+import sys
+import json
+import bisect
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from subtitles import SUBTITLE_EXTENSIONS, SubtitleTrack, load_subtitle, extract_embedded_subtitle
+
+AUDIO_EXTENSIONS = ('.mp3', '.m4a', '.aac', '.ogg', '.opus', '.flac', '.wav', '.mp4', '.mkv')
+VIDEO_EXTENSIONS = ('.mp4', '.mkv')  # 可能带有内嵌字幕的容器
+EMBEDDED_SUBTITLE_PREFIX = 'embedded:'  # library.subtitle_path 中表示内嵌字幕：'embedded:<指纹>'
+SENTENCE_ROWID_STRIDE = 1000000  # 字幕全文索引 rowid = 字幕文件ID * STRIDE + 句子序号
+# 索引时每批读取的文件数：一批文件先在事务之外读完（计算指纹/解析字幕），再写入并提交，
+# 写事务不会在读取文件（可能在网络共享上）期间一直占用数据库，写线程的其他写入不会等到超时
+INDEX_BATCH_SIZE = 32
+INDEX_RETRY_SECONDS = 30  # 索引失败（例如数据库被锁定、文件夹暂时不可访问）后重试的间隔
+
+# 文件指纹：文件大小 + 开头/中间/结尾各取一块做哈希，不读取整个文件。
+# 指纹与路径无关，文件移动或改名后仍然相同，用作历史记录和各类缓存的键。
+FINGERPRINT_CHUNK_SIZE = 64 * 1024
+
+_fingerprint_cache = {}  # (路径, 大小, 修改时间) -> 指纹
+_fingerprint_lock = threading.Lock()
+
+
+def compute_fingerprint(path, size=None):
+    """计算文件指纹，格式为 '<大小(16进制)>-<哈希>'"""
+    if size is None:
+        size = os.path.getsize(path)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(size).encode())
+    with open(path, 'rb') as f:
+        if size <= 3 * FINGERPRINT_CHUNK_SIZE:
+            h.update(f.read())
+        else:
+            for offset in (0, (size - FINGERPRINT_CHUNK_SIZE) // 2, size - FINGERPRINT_CHUNK_SIZE):
+                f.seek(offset)
+                h.update(f.read(FINGERPRINT_CHUNK_SIZE))
+    return f"{size:x}-{h.hexdigest()}"
+
+
+def file_fingerprint(path):
+    """获取文件指纹（按路径、大小和修改时间缓存，文件未变化时不重复读取）"""
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    fingerprint = _fingerprint_cache.get(key)
+    if fingerprint is None:
+        fingerprint = compute_fingerprint(path, st.st_size)
+        with _fingerprint_lock:
+            _fingerprint_cache[key] = fingerprint
+    return fingerprint
+
+
+def fingerprint_size(fingerprint):
+    """从指纹中取出文件大小"""
+    return int(fingerprint.split('-', 1)[0], 16)
+
+
+def find_file_by_fingerprint(folder, fingerprint, extensions=None):
+    """在文件夹中查找指纹相同的文件（先按大小筛选，只对大小相同的文件计算指纹）"""
+    size = fingerprint_size(fingerprint)
+    try:
+        entries = os.scandir(folder)
+    except OSError:
+        return None
+    with entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            if extensions and not entry.name.lower().endswith(extensions):
+                continue
+            try:
+                if entry.stat().st_size != size:
+                    continue
+                if file_fingerprint(entry.path) == fingerprint:
+                    return entry.path
+            except OSError:
+                continue
+    return None
+
+
+def find_library_path(conn, fingerprint):
+    """按指纹在音频库索引中查找仍然存在的文件路径（走指纹索引，不扫描文件夹）"""
+    for (path,) in conn.execute("SELECT path FROM library WHERE fingerprint = ?", (fingerprint,)).fetchall():
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def find_moved_files(conn):
+    """找出需要重新关联的学习记录和音频文件（只读，不在写事务中调用）
+
+    为尚未记录指纹、文件仍存在的旧记录计算指纹；原路径已不存在的按指纹在音频库索引中找回新路径。
+    计算指纹要读取文件，所以放在事务之外，结果交给 relink_moved_sessions 在写线程中一次写入。
+    返回 (会话指纹 [(指纹, 会话ID)], 文件指纹 [(指纹, 文件ID)], 路径变化 [(旧路径, 新路径)])。
+    """
+    session_fingerprints = []
+    file_fingerprints = []
+    for table, column, fingerprints in (('sessions', 'audio_path', session_fingerprints),
+                                        ('audio_files', 'path', file_fingerprints)):
+        rows = conn.execute(f"SELECT id, {column} FROM {table} WHERE fingerprint IS NULL").fetchall()
+        for row_id, path in rows:
+            try:
+                fingerprints.append((file_fingerprint(path), row_id))
+            except OSError:
+                pass
+
+    moves = []
+    rows = conn.execute("""
+        SELECT audio_path, fingerprint FROM sessions WHERE fingerprint IS NOT NULL
+        UNION
+        SELECT path, fingerprint FROM audio_files WHERE fingerprint IS NOT NULL
+    """).fetchall()
+    moved = {}
+    for path, fingerprint in rows:
+        if path in moved or os.path.exists(path):
+            continue
+        new_path = find_library_path(conn, fingerprint)
+        if new_path:
+            moved[path] = new_path
+            moves.append((path, new_path))
+    return session_fingerprints, file_fingerprints, moves
+
+
+def relink_moved_sessions(cursor, relinks):
+    """写入 find_moved_files 的结果：补全指纹，并把学习记录和逐句记录关联到新路径
+
+    返回被修改的会话ID列表。
+    """
+    session_fingerprints, file_fingerprints, moves = relinks
+    cursor.executemany("UPDATE sessions SET fingerprint = ? WHERE id = ? AND fingerprint IS NULL", session_fingerprints)
+    cursor.executemany("UPDATE audio_files SET fingerprint = ? WHERE id = ? AND fingerprint IS NULL", file_fingerprints)
+    # 指纹列出现前创建、文件已被移走的记录：沿用同一路径学习记录中的指纹
+    cursor.execute("""
+        UPDATE audio_files SET fingerprint = (
+            SELECT s.fingerprint FROM sessions s WHERE s.audio_path = audio_files.path AND s.fingerprint IS NOT NULL
+        )
+        WHERE fingerprint IS NULL
+    """)
+    changed = []
+    for old_path, new_path in moves:
+        cursor.execute("SELECT id FROM sessions WHERE audio_path = ?", (old_path,))
+        changed.extend(row[0] for row in cursor.fetchall())
+        cursor.execute("UPDATE sessions SET audio_path = ? WHERE audio_path = ?", (new_path, old_path))
+        cursor.execute("UPDATE audio_files SET path = ? WHERE path = ? AND NOT EXISTS "
+                       "(SELECT 1 FROM audio_files WHERE path = ?)", (new_path, old_path, new_path))
+    return changed
+
+
+def scan_folder(folder, extensions):
+    """用 os.scandir 列出文件夹中指定扩展名的文件，返回 {路径: (大小, 修改时间ns)}"""
+    files = {}
+    try:
+        entries = os.scandir(folder)
+    except OSError:
+        return files
+    with entries:
+        for entry in entries:
+            if not entry.name.lower().endswith(extensions):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            files[entry.path] = (st.st_size, st.st_mtime_ns)
+    return files
+
+
+def pair_subtitles(subtitle_files):
+    """按文件名（不含扩展名）建立字幕索引，返回 {基础文件名: 字幕路径}
+
+    同名的多个字幕按 SUBTITLE_EXTENSIONS 的顺序选用（与 _find_subtitle 一致）。
+    """
+    def priority(path):
+        ext = os.path.splitext(path)[1].lower()
+        return SUBTITLE_EXTENSIONS.index(ext) if ext in SUBTITLE_EXTENSIONS else len(SUBTITLE_EXTENSIONS), path
+
+    pairs = {}
+    for path in sorted(subtitle_files, key=priority):
+        base_name = os.path.splitext(os.path.basename(path))[0]
+        pairs.setdefault(base_name, path)
+    return pairs
+
+
+def _batches(items, size=INDEX_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def update_library(cursor, audio_folder, subtitle_folder):
+    """增量更新音频库索引，只重新检查新增、修改或字幕配对变化的文件
+
+    需要读取内容的文件按批处理，每批提交一次。返回 (新增或更新的行数, 删除的行数)。
+    """
+    audio_files = scan_folder(audio_folder, AUDIO_EXTENSIONS)
+    subtitles = pair_subtitles(scan_folder(subtitle_folder, SUBTITLE_EXTENSIONS))
+
+    cursor.execute("SELECT path, size, mtime_ns, fingerprint, subtitle_path FROM library")
+    indexed = {row[0]: row[1:] for row in cursor.fetchall()}
+    embedded = get_embedded_fingerprints(cursor)
+
+    changed = 0
+    stale = []  # 新增或修改的文件，需要计算指纹
+    for path, (size, mtime_ns) in audio_files.items():
+        base_name = os.path.splitext(os.path.basename(path))[0]
+        old = indexed.get(path)
+        if _is_unchanged(old, size, mtime_ns):
+            changed += _index_audio_file(cursor, path, size, mtime_ns, subtitles.get(base_name), old, embedded)
+        else:
+            stale.append((path, size, mtime_ns, subtitles.get(base_name), old))
+
+    removed = [(path,) for path in indexed if path not in audio_files]
+    cursor.executemany("DELETE FROM library WHERE path = ?", removed)
+    cursor.connection.commit()
+    changed += _index_stale_audio_files(cursor, stale, embedded)
+    return changed, len(removed)
+
+
+def _is_unchanged(old, size, mtime_ns):
+    return old is not None and old[0] == size and old[1] == mtime_ns
+
+
+def _index_stale_audio_files(cursor, stale, embedded):
+    """为新增或修改的文件计算指纹并写入索引，stale 为 [(路径, 大小, 修改时间, 字幕路径, 已有行), ...]
+
+    每批先在事务之外读取文件，再写入并提交。返回写入的行数。
+    """
+    changed = 0
+    for batch in _batches(stale):
+        fingerprints = []
+        for path, *_ in batch:
+            try:
+                fingerprints.append(file_fingerprint(path))
+            except OSError:
+                fingerprints.append(None)
+        for (path, size, mtime_ns, subtitle_path, old), fingerprint in zip(batch, fingerprints):
+            if fingerprint is not None:
+                changed += _index_audio_file(cursor, path, size, mtime_ns, subtitle_path, old, embedded, fingerprint)
+        cursor.connection.commit()
+    return changed
+
+
+def _index_audio_file(cursor, path, size, mtime_ns, subtitle_path, old, embedded, fingerprint=None):
+    """写入一个音频文件的索引行，old 为已有的 (size, mtime_ns, fingerprint, subtitle_path)
+
+    内容有变化（大小或修改时间不同）时必须传入事先计算好的 fingerprint，本函数不读取文件。
+    没有外部字幕而视频内嵌字幕已提取（指纹在 embedded 中）时配对内嵌字幕。
+    返回索引是否有变化。
+    """
+    if _is_unchanged(old, size, mtime_ns):
+        if subtitle_path is None and old[2] in embedded:
+            subtitle_path = EMBEDDED_SUBTITLE_PREFIX + old[2]
+        if old[3] == subtitle_path:
+            return False
+        cursor.execute("UPDATE library SET subtitle_path = ? WHERE path = ?", (subtitle_path, path))
+        return True
+    if subtitle_path is None and fingerprint in embedded:
+        subtitle_path = EMBEDDED_SUBTITLE_PREFIX + fingerprint
+    if old:
+        # 内容未变（仅修改时间变化）时保留已缓存的时长
+        cursor.execute("""
+            UPDATE library SET size = ?, mtime_ns = ?, fingerprint = ?, subtitle_path = ?,
+                               duration = CASE WHEN fingerprint = ? THEN duration END
+            WHERE path = ?
+        """, (size, mtime_ns, fingerprint, subtitle_path, fingerprint, path))
+    else:
+        # 同一内容的文件之前已计算过时长（例如文件被移动），直接沿用
+        cursor.execute("SELECT duration FROM library WHERE fingerprint = ? AND duration IS NOT NULL LIMIT 1",
+                       (fingerprint,))
+        row = cursor.fetchone()
+        base_name = os.path.splitext(os.path.basename(path))[0]
+        cursor.execute("""
+            INSERT INTO library (path, base_name, size, mtime_ns, fingerprint, duration, subtitle_path)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (path, base_name, size, mtime_ns, fingerprint, row[0] if row else None, subtitle_path))
+    return True
+
+
+def _find_subtitle(subtitle_folder, base_name):
+    for ext in SUBTITLE_EXTENSIONS:
+        path = os.path.join(subtitle_folder, base_name + ext)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def update_library_paths(cursor, paths, audio_folder, subtitle_folder):
+    """按文件夹监视器报告的路径更新索引，只处理这些文件（不列出整个文件夹）
+
+    需要读取内容的文件按批处理，每批提交一次。返回 (新增或更新的行数, 删除的行数)。
+    """
+    audio_folder = os.path.abspath(audio_folder)
+    subtitle_folder = os.path.abspath(subtitle_folder)
+    embedded = get_embedded_fingerprints(cursor)
+    changed = removed = 0
+    stale = []
+    for path in paths:
+        folder = os.path.dirname(os.path.abspath(path))
+        name = os.path.basename(path)
+        base_name = os.path.splitext(name)[0]
+        lower_name = name.lower()
+        if folder == audio_folder and lower_name.endswith(AUDIO_EXTENSIONS):
+            path = os.path.join(audio_folder, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                cursor.execute("DELETE FROM library WHERE path = ?", (path,))
+                removed += cursor.rowcount
+                continue
+            cursor.execute("SELECT size, mtime_ns, fingerprint, subtitle_path FROM library WHERE path = ?", (path,))
+            old = cursor.fetchone()
+            subtitle_path = _find_subtitle(subtitle_folder, base_name)
+            if _is_unchanged(old, st.st_size, st.st_mtime_ns):
+                changed += _index_audio_file(cursor, path, st.st_size, st.st_mtime_ns, subtitle_path, old, embedded)
+            else:
+                stale.append((path, st.st_size, st.st_mtime_ns, subtitle_path, old))
+        elif folder == subtitle_folder and lower_name.endswith(SUBTITLE_EXTENSIONS):
+            # 字幕新增或删除：只更新同名音频的配对（外部字幕优先于内嵌字幕）
+            subtitle_path = _find_subtitle(subtitle_folder, base_name)
+            cursor.execute("""
+                UPDATE library
+                SET subtitle_path = COALESCE(?, CASE WHEN fingerprint IN
+                    (SELECT fingerprint FROM embedded_subtitles WHERE cues IS NOT NULL)
+                    THEN ? || fingerprint END)
+                WHERE base_name = ?
+            """, (subtitle_path, EMBEDDED_SUBTITLE_PREFIX, base_name))
+            changed += cursor.rowcount
+    cursor.connection.commit()
+    changed += _index_stale_audio_files(cursor, stale, embedded)
+    return changed, removed
+
+
+def get_library_files(conn):
+    """从索引中读取已配对字幕的音频，返回 [(基础文件名, 音频路径, 字幕路径), ...]"""
+    return conn.execute("""
+        SELECT base_name, path, subtitle_path FROM library
+        WHERE subtitle_path IS NOT NULL
+        ORDER BY base_name, path
+    """).fetchall()
+
+
+def get_cached_duration(conn, path):
+    """读取索引中缓存的音频时长（文件大小和修改时间未变时有效），没有时返回None"""
+    row = conn.execute("SELECT size, mtime_ns, duration FROM library WHERE path = ?", (path,)).fetchone()
+    if not row or row[2] is None:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if (st.st_size, st.st_mtime_ns) != (row[0], row[1]):
+        return None
+    return row[2]
+
+
+def set_cached_duration(cursor, path, duration):
+    """缓存音频时长，同一指纹的其他文件一并更新"""
+    cursor.execute("""
+        UPDATE library SET duration = ?
+        WHERE fingerprint = (SELECT fingerprint FROM library WHERE path = ?)
+    """, (duration, path))
+
+
+def subtitle_search_available(conn):
+    """SQLite 是否支持 FTS5（字幕全文索引表是否存在）"""
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'subtitle_fts'").fetchone() is not None
+
+
+def _index_subtitle_file(cursor, path, size, mtime_ns, file_id, track=None):
+    """解析一个字幕文件（或直接使用已解析的 SubtitleTrack）并写入全文索引，返回是否成功"""
+    if track is None:
+        try:
+            track = load_subtitle(path)
+        except OSError:
+            return False
+    if file_id is None:
+        cursor.execute("INSERT INTO subtitle_files (path, size, mtime_ns) VALUES (?, ?, ?)", (path, size, mtime_ns))
+        file_id = cursor.lastrowid
+    else:
+        cursor.execute("UPDATE subtitle_files SET size = ?, mtime_ns = ? WHERE id = ?", (size, mtime_ns, file_id))
+        _delete_subtitle_lines(cursor, file_id)
+    base = file_id * SENTENCE_ROWID_STRIDE
+    cursor.executemany("INSERT INTO subtitle_fts (rowid, text, start_time, end_time) VALUES (?, ?, ?, ?)",
+                       ((base + index, text, start, end) for index, (start, end, text) in enumerate(track)))
+    return True
+
+
+def _delete_subtitle_lines(cursor, file_id):
+    base = file_id * SENTENCE_ROWID_STRIDE
+    cursor.execute("DELETE FROM subtitle_fts WHERE rowid >= ? AND rowid < ?", (base, base + SENTENCE_ROWID_STRIDE))
+
+
+def update_subtitle_index(cursor, subtitle_folder, paths=None):
+    """增量更新字幕全文索引；paths 为None时对照整个字幕文件夹，否则只处理这些文件
+
+    字幕文件按批在事务之外解析，每批写入后提交。返回重新索引或删除的字幕文件数。
+    """
+    if not subtitle_search_available(cursor.connection):
+        return 0
+    cursor.execute("SELECT path, id, size, mtime_ns FROM subtitle_files WHERE path NOT LIKE ?",
+                   (EMBEDDED_SUBTITLE_PREFIX + '%',))
+    indexed = {row[0]: row[1:] for row in cursor.fetchall()}
+    if paths is None:
+        files = scan_folder(subtitle_folder, SUBTITLE_EXTENSIONS)
+        removed = [path for path in indexed if path not in files]
+    else:
+        subtitle_folder = os.path.abspath(subtitle_folder)
+        files, removed = {}, []
+        for path in paths:
+            if (os.path.dirname(os.path.abspath(path)) != subtitle_folder
+                    or not path.lower().endswith(SUBTITLE_EXTENSIONS)):
+                continue
+            path = os.path.join(subtitle_folder, os.path.basename(path))
+            try:
+                st = os.stat(path)
+                files[path] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                if path in indexed:
+                    removed.append(path)
+
+    changed = 0
+    for path in removed:
+        _delete_subtitle_lines(cursor, indexed[path][0])
+        cursor.execute("DELETE FROM subtitle_files WHERE id = ?", (indexed[path][0],))
+        changed += 1
+    cursor.connection.commit()
+
+    stale = [(path, size, mtime_ns, indexed.get(path)) for path, (size, mtime_ns) in files.items()
+             if not (path in indexed and indexed[path][1:] == (size, mtime_ns))]
+    for batch in _batches(stale):
+        tracks = []
+        for path, *_ in batch:
+            try:
+                tracks.append(load_subtitle(path))
+            except OSError:
+                tracks.append(None)
+        for (path, size, mtime_ns, old), track in zip(batch, tracks):
+            if track is not None:
+                _index_subtitle_file(cursor, path, size, mtime_ns, old[0] if old else None, track)
+                changed += 1
+        cursor.connection.commit()
+
+    if paths is None:
+        changed += _index_cached_embedded_subtitles(cursor)
+    return changed
+
+
+def _index_cached_embedded_subtitles(cursor):
+    """把已缓存、但不在全文索引中的内嵌字幕写入索引（例如索引表重建之后），返回写入的字幕数"""
+    cursor.execute("""
+        SELECT fingerprint FROM embedded_subtitles
+        WHERE cues IS NOT NULL
+          AND ? || fingerprint NOT IN (SELECT path FROM subtitle_files)
+    """, (EMBEDDED_SUBTITLE_PREFIX,))
+    subtitle_paths = [EMBEDDED_SUBTITLE_PREFIX + row[0] for row in cursor.fetchall()]
+    for batch in _batches(subtitle_paths):
+        for subtitle_path in batch:
+            _index_subtitle_file(cursor, subtitle_path, 0, 0, None,
+                                 load_embedded_subtitle(cursor.connection, subtitle_path))
+        cursor.connection.commit()
+    return len(subtitle_paths)
+
+
+def is_embedded_subtitle(subtitle_path):
+    return subtitle_path.startswith(EMBEDDED_SUBTITLE_PREFIX)
+
+
+def get_embedded_fingerprints(cursor):
+    """已提取到文本字幕的视频指纹集合"""
+    cursor.execute("SELECT fingerprint FROM embedded_subtitles WHERE cues IS NOT NULL")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def find_unprobed_videos(cursor):
+    """索引中尚未检查过内嵌字幕的视频文件，返回 [(路径, 指纹), ...]"""
+    cursor.execute("""
+        SELECT path, fingerprint FROM library
+        WHERE fingerprint IS NOT NULL
+          AND fingerprint NOT IN (SELECT fingerprint FROM embedded_subtitles)
+    """)
+    return [row for row in cursor.fetchall() if row[0].lower().endswith(VIDEO_EXTENSIONS)]
+
+
+def store_embedded_subtitle(cursor, fingerprint, cues):
+    """保存提取结果（cues 为 SubtitleTrack，None表示没有文本字幕），写入全文索引并为没有外部字幕的视频配对
+
+    返回重新配对的音频行数。
+    """
+    cursor.execute("INSERT OR REPLACE INTO embedded_subtitles (fingerprint, cues) VALUES (?, ?)",
+                   (fingerprint, json.dumps(list(cues), ensure_ascii=False) if cues else None))
+    if not cues:
+        return 0
+    subtitle_path = EMBEDDED_SUBTITLE_PREFIX + fingerprint
+    if subtitle_search_available(cursor.connection):
+        cursor.execute("SELECT id FROM subtitle_files WHERE path = ?", (subtitle_path,))
+        row = cursor.fetchone()
+        _index_subtitle_file(cursor, subtitle_path, 0, 0, row[0] if row else None, cues)
+    cursor.execute("UPDATE library SET subtitle_path = ? WHERE fingerprint = ? AND subtitle_path IS NULL",
+                   (subtitle_path, fingerprint))
+    return cursor.rowcount
+
+
+def load_embedded_subtitle(conn, subtitle_path):
+    """从缓存读取内嵌字幕，返回 SubtitleTrack"""
+    fingerprint = subtitle_path[len(EMBEDDED_SUBTITLE_PREFIX):]
+    row = conn.execute("SELECT cues FROM embedded_subtitles WHERE fingerprint = ?", (fingerprint,)).fetchone()
+    if not row or not row[0]:
+        raise IOError(f"内嵌字幕缓存不存在：{fingerprint}")
+    cues = json.loads(row[0])
+    if cues and len(cues[0]) == 2:
+        # 旧版本缓存只保存了 [开始时间, 文本]，结束时间取下一句的开始时间
+        cues = [(start, cues[i + 1][0] if i + 1 < len(cues) else start, text)
+                for i, (start, text) in enumerate(cues)]
+    return SubtitleTrack.from_cues(cues)
+
+
+def get_library_subtitle(conn, audio_path):
+    """索引中与音频配对的字幕路径（可能是内嵌字幕），没有时返回None"""
+    row = conn.execute("SELECT subtitle_path FROM library WHERE path = ?", (audio_path,)).fetchone()
+    return row[0] if row else None
+
+
+def build_fts_query(text):
+    """把用户输入转换为 FTS5 查询：每个词加引号（避免语法错误），最后一个词按前缀匹配"""
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def search_subtitles(conn, query, limit=100):
+    """在所有已配对音频的字幕中全文搜索，按相关度排序
+
+    返回 [(音频路径, 字幕路径, 基础文件名, 句子序号, 开始时间, 文本), ...]。
+    """
+    fts_query = build_fts_query(query)
+    if not fts_query:
+        return []
+    return conn.execute("""
+        SELECT l.path, l.subtitle_path, l.base_name, f.rowid % ?, f.start_time, f.text
+        FROM subtitle_fts f
+        JOIN subtitle_files s ON s.id = f.rowid / ?
+        JOIN library l ON l.subtitle_path = s.path
+        WHERE subtitle_fts MATCH ?
+        ORDER BY f.rank
+        LIMIT ?
+    """, (SENTENCE_ROWID_STRIDE, SENTENCE_ROWID_STRIDE, fts_query, limit)).fetchall()
+
+
+def find_concordance(conn, phrase, limit=500):
+    """查找包含某个单词或短语的所有句子（整词匹配），按文件和句子顺序排列
+
+    句子截取到字幕的结束时间（不超过音频时长）；结束时间无效时取下一句的开始时间。
+    返回 [(音频路径, 基础文件名, 句子序号, 开始时间, 结束时间, 文本), ...]。
+    """
+    words = re.findall(r'\w+', phrase)
+    if not words:
+        return []
+    return conn.execute("""
+        SELECT l.path, l.base_name, f.rowid % ?1, f.start_time,
+               CASE WHEN f.end_time > f.start_time THEN MIN(f.end_time, COALESCE(l.duration, f.end_time))
+                    ELSE COALESCE((SELECT n.start_time FROM subtitle_fts n WHERE n.rowid = f.rowid + 1),
+                                  l.duration, f.start_time + 10)
+               END,
+               f.text
+        FROM subtitle_fts f
+        JOIN subtitle_files s ON s.id = f.rowid / ?1
+        JOIN library l ON l.subtitle_path = s.path
+        WHERE subtitle_fts MATCH ?2
+        ORDER BY l.base_name, l.path, f.rowid
+        LIMIT ?3
+    """, (SENTENCE_ROWID_STRIDE, '"' + ' '.join(words) + '"', limit)).fetchall()
+
+
+class NameIndex:
+    """文件名筛选索引：前缀匹配在排序后的小写名称上二分查找，子串匹配在上一次结果中继续筛选
+
+    search() 返回匹配项在 names 中的下标，前缀匹配排在前面。
+    """
+
+    def __init__(self, names):
+        self.names = names
+        self._keys = [name.casefold() for name in names]
+        self._order = sorted(range(len(names)), key=self._keys.__getitem__)
+        self._sorted_keys = [self._keys[i] for i in self._order]
+        self._last_query = None
+        self._last_matches = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def search(self, query):
+        query = query.strip().casefold()
+        if not query:
+            return list(range(len(self.names)))
+
+        # 输入通常是逐字追加，新查询包含上一次查询时只需在上一次的结果中筛选
+        if self._last_query and query.startswith(self._last_query):
+            candidates = self._last_matches
+        else:
+            candidates = range(len(self._keys))
+        keys = self._keys
+        matches = [i for i in candidates if query in keys[i]]
+        self._last_query, self._last_matches = query, matches
+
+        lo = bisect.bisect_left(self._sorted_keys, query)
+        hi = bisect.bisect_left(self._sorted_keys, query + chr(0x10FFFF), lo)
+        prefix = self._order[lo:hi]
+        if len(prefix) == len(matches):
+            return prefix
+        prefix_set = set(prefix)
+        return prefix + [i for i in matches if i not in prefix_set]
+
+
+class LibraryIndexer:
+    """后台音频库索引线程
+
+    request_scan() 只设置标志并立即返回；后台线程用 os.scandir 扫描音频/字幕文件夹，
+    只对变化的文件计算指纹并更新 library 表和字幕全文索引。request_paths() 用于文件夹监视器报告的
+    具体文件，只更新这些行。索引有变化时调用 on_change(changed, removed)
+    （在索引线程中调用）。
+
+    提供 ffmpeg_path 时，新发现的视频文件交给后台进程池提取内嵌文本字幕，
+    结果存入 embedded_subtitles 并自动配对，不会在字幕文件夹中生成文件。
+    """
+
+    def __init__(self, connect, audio_folder, subtitle_folder, on_change=None, ffmpeg_path=None):
+        self._connect = connect
+        self.audio_folder = audio_folder
+        self.subtitle_folder = subtitle_folder
+        self._on_change = on_change
+        self._ffmpeg_path = ffmpeg_path  # 返回ffmpeg路径的函数
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._full_scan = False
+        self._pending_paths = set()
+        self._extracted = []         # [(指纹, 字幕)]，等待索引线程写入
+        self._extracting = set()     # 已提交到进程池或本次运行中提取失败的指纹
+        self._pool = None
+        self._stopped = False
+        self._thread = None
+        self.ready = threading.Event()  # 至少完成过一次扫描
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="library-indexer", daemon=True)
+            self._thread.start()
+        self.request_scan()
+
+    def request_scan(self):
+        """请求一次增量扫描（多次请求会合并）"""
+        with self._lock:
+            self._full_scan = True
+        self._wakeup.set()
+
+    def request_paths(self, paths):
+        """只重新检查指定的文件（新增、删除或修改）"""
+        with self._lock:
+            self._pending_paths.update(paths)
+        self._wakeup.set()
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _submit_extractions(self, cursor):
+        """把尚未检查过的视频交给进程池提取内嵌字幕"""
+        videos = [(path, fp) for path, fp in find_unprobed_videos(cursor) if fp not in self._extracting]
+        if not videos:
+            return
+        try:
+            ffmpeg_path = self._ffmpeg_path()
+        except Exception:
+            return
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=2)
+        for path, fingerprint in videos:
+            self._extracting.add(fingerprint)
+            future = self._pool.submit(extract_embedded_subtitle, ffmpeg_path, path)
+            future.add_done_callback(lambda f, fingerprint=fingerprint: self._on_extracted(fingerprint, f))
+
+    def _on_extracted(self, fingerprint, future):
+        """进程池完成回调：失败的文件本次运行不再重试，结果交给索引线程写入"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        with self._lock:
+            self._extracted.append((fingerprint, future.result()))
+        self._wakeup.set()
+
+    def _run(self):
+        conn = self._connect()
+        retry_timeout = None
+        while True:
+            self._wakeup.wait(retry_timeout)
+            self._wakeup.clear()
+            if self._stopped:
+                return
+            with self._lock:
+                full_scan, self._full_scan = self._full_scan, False
+                paths, self._pending_paths = self._pending_paths, set()
+                extracted, self._extracted = self._extracted, []
+            try:
+                cursor = conn.cursor()
+                changed = removed = 0
+                if full_scan:
+                    changed, removed = update_library(cursor, self.audio_folder, self.subtitle_folder)
+                    changed += update_subtitle_index(cursor, self.subtitle_folder)
+                elif paths:
+                    changed, removed = update_library_paths(cursor, paths, self.audio_folder, self.subtitle_folder)
+                    changed += update_subtitle_index(cursor, self.subtitle_folder, paths)
+                for fingerprint, cues in extracted:
+                    changed += store_embedded_subtitle(cursor, fingerprint, cues)
+                conn.commit()
+                if self._ffmpeg_path and (full_scan or paths):
+                    self._submit_extractions(cursor)
+            except Exception as e:
+                conn.rollback()
+                # 未完成的工作放回队列，稍后重试（已提交的批次重试时会被识别为未变化）
+                with self._lock:
+                    self._full_scan = self._full_scan or full_scan
+                    self._pending_paths |= paths
+                    self._extracted = extracted + self._extracted
+                retry_timeout = INDEX_RETRY_SECONDS
+                print(f"音频库索引失败，{INDEX_RETRY_SECONDS} 秒后重试: {e}", file=sys.stderr)
+                continue
+            retry_timeout = None
+            first_scan = not self.ready.is_set()
+            self.ready.set()
+            if (changed or removed or first_scan) and self._on_change:
+                try:
+                    self._on_change(changed, removed)
+                except Exception:
+                    pass
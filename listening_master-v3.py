@@ -1,15 +1,30 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
+import tkinter.font as tkfont
 import pygame
 import os
 import sys
-import sqlite3
 import datetime
-import re # 解析SRT时间
+import bisect
 from activation_handler import check_license, RegistrationWindow
+from database import (get_connection, close_connections, DatabaseWriter, upsert_session, delete_sessions,
+                      clear_sessions, insert_sentence_event, SENTENCE_EVENT_LOOP, SENTENCE_EVENT_DICTATION,
+                      add_listening_time, get_daily_stats, get_daily_practice_minutes, get_stats_summary, find_session_by_path,
+                      update_session_path, DICTATION_STAT_KEYS, save_dictation_answer, save_dictation_position,
+                      clear_dictation_progress, load_dictation_progress, get_review_queue,
+                      update_review_schedule)
+from library import (find_file_by_fingerprint, find_library_path, find_moved_files, relink_moved_sessions, LibraryIndexer, get_library_files,
+                     get_cached_duration, set_cached_duration, NameIndex, subtitle_search_available,
+                     search_subtitles, find_concordance, file_fingerprint,
+                     is_embedded_subtitle, load_embedded_subtitle, get_library_subtitle, AUDIO_EXTENSIONS)
+from media_cache import DecodeCache, ClipCache, PYGAME_NATIVE_EXTENSIONS, audio_file_duration, atempo_filter
+from folder_watcher import FolderWatcher
+from subtitles import SUBTITLE_EXTENSIONS, SubtitleTrack, load_subtitle
+from dictation import align_dictation, build_result_markup
 import subprocess
 from pydub import AudioSegment
 import time
+import wave
 import threading
 from concurrent.futures import ThreadPoolExecutor
 import queue
@@ -143,6 +158,9 @@ class ListeningPlayer(tk.Tk):
             'bg': '#ececec',
         }
         
+        # 共享字体对象：所有控件引用同一组Font，窗口缩放时只需修改字号
+        self.setup_fonts()
+        
         # Configure ttk styles
         self.setup_styles()
         
@@ -152,7 +170,7 @@ class ListeningPlayer(tk.Tk):
         pygame.mixer.init()
 
         # --- Data ---
-        self.lyrics = []
+        self.lyrics = SubtitleTrack()
         self.current_line_index = -1
         self.is_paused = True
         self.is_loaded = False
@@ -177,44 +195,85 @@ class ListeningPlayer(tk.Tk):
         self.dictation_sentence_playing = False  # 当前句子是否正在播放
         self.dictation_current_sentence = 0  # 当前听写句子索引
         self.dictation_results = []  # 听写结果记录
-        self.dictation_auto_pause_job = None  # 自动暂停任务ID
-        self.dictation_stats = {  # 听写统计
-            'total_chars': 0,
-            'correct_chars': 0,
-            'total_sentences': 0,
-            'correct_sentences': 0
-        }
+        self.dictation_auto_pause_job = None  # 检查片段是否播放完毕的任务ID
+        self.dictation_speed = 1.0  # 听写语速
+        self.dictation_prefetch_count = 3  # 听写时预先渲染后面几句的片段
+        self.last_dictation_render_ms = 0.0  # 最近一次显示对比结果的耗时
+        self.dictation_stats = dict.fromkeys(DICTATION_STAT_KEYS, 0)  # 听写统计
         # 听写模式播放状态保存
         self.dictation_saved_position = 0  # 保存进入听写模式前的播放位置
         self.dictation_saved_paused_state = True  # 保存进入听写模式前的暂停状态
-        self.dictation_paused_manually = False # 是否为手动暂停
-        self.dictation_pause_time = 0.0        # 句子内暂停时间点
-        self.dictation_play_start_time = 0.0   # 句子开始播放的系统时间
+        self.dictation_paused_manually = False # 是否为手动暂停（片段仍在播放器中，可以继续播放）
         
         # --- 异步处理相关 ---
         self.thread_pool = ThreadPoolExecutor(max_workers=2)  # 限制线程数量
+        # 例句连播逐个文件生成批次，耗时较长，单独一个线程，不占用句子循环和听写片段的线程池
+        self.concordance_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="concordance")
         self.processing_queue = queue.Queue()  # 用于线程间通信
         self.is_processing_audio = False  # 标记是否正在处理音频
         self.pending_sentence_change = False  # 标记是否有待处理的句子切换
 
+        # --- 复习模式 ---
+        self.is_reviewing = False
+        self.review_queue = []  # 待复习的句子序号
+        self.review_position = 0
+        self.review_prefetch_count = 2  # 复习时提前渲染队列中后面几句的片段
+
         # --- Session tracking ---
         self.current_audio_path = None
-        self.current_session_db_id = None
         self.current_segment_start_time = None
         self.current_audio_accumulated_duration = 0.0
+        self.current_audio_saved_duration = 0.0  # 最近一次提交写入的累计时长
         self.current_audio_total_length = 0.0
+        self.pending_session_durations = {}  # 已提交但尚未写入数据库的时长：音频路径 -> 累计时长
+
+        # --- 历史记录列表（分页加载 + 增量刷新） ---
+        self.history_page_size = 200  # 每页加载的记录数
+        self.history_loaded = False  # 是否已加载第一页
+        self.history_has_more = False  # 数据库中是否还有未加载的更早记录
+        self.history_loading_page = False  # 是否已排队加载下一页
+        self.history_order = []  # 已加载行的排序键 (start_time, id)，升序
+        self.history_keys = {}  # 会话ID -> 排序键
+        self.history_paths = {}  # 会话ID -> 音频路径
+        self.history_dirty_ids = set()  # 自上次刷新以来有变化的会话ID
+        self.history_dirty_lock = threading.Lock()  # 写线程回调与UI线程共享 history_dirty_ids
 
         # --- 创建音频和字幕文件夹 ---
         self.create_folders()
         
         # --- Database Setup ---
-        self.db_conn = sqlite3.connect('listening_history.db')
-        self.create_history_table()
+        self.db_conn = get_connection()
+        # 写操作交给后台线程，UI线程不等待SQLite
+        self.db_writer = DatabaseWriter()
+        self.db_writer.start()
+        self._closing = False
 
         # --- UI Setup ---
         self.create_views()
         self.show_initial_view()
         
+        # 解码缓存：其他格式的音频转码一次为FLAC，之后直接读取
+        self.current_playback_path = None
+        self.audio_load_token = 0  # 每次加载音频加一，后台转码完成时据此判断是否仍在等待
+        self.decode_cache = DecodeCache(self.cache_folder, self.get_ffmpeg_path)
+        self.decode_cache.start()
+        # 听写片段缓存：按句子起止时间和语速渲染好的WAV，播放时不再定位和计时暂停
+        self.clip_cache = ClipCache(os.path.join(self.cache_folder, "听写片段"), self.get_ffmpeg_path)
+        self.clip_cache.start()
+        
+        # 后台增量维护音频库索引，选择文件对话框直接读取索引
+        self._file_dialog_refresh = None
+        self._relinked = False  # 首次扫描后按指纹找回被移动/改名的音频
+        self.library_indexer = LibraryIndexer(get_connection, self.audio_folder, self.subtitle_folder,
+                                              on_change=self.on_library_changed,
+                                              ffmpeg_path=self.get_ffmpeg_path)
+        # 文件夹监视器只把变化的文件交给索引线程；先启动监视再做首次扫描，避免漏掉期间的变化
+        self.folder_watcher = FolderWatcher([self.audio_folder, self.subtitle_folder],
+                                            on_paths=self.library_indexer.request_paths,
+                                            on_rescan=self.library_indexer.request_scan)
+        self.folder_watcher.start()
+        self.library_indexer.start()
+        
         # --- 初始化字体调整（测试：优化版） ---
         # self.after(500, self.adjust_font_sizes_once)  # 一次性字体调整
         
@@ -354,7 +413,7 @@ class ListeningPlayer(tk.Tk):
             self._font_adjustment_job = self.after(delay, self.delayed_font_adjustment)
     
     def adjust_font_sizes(self):
-        """根据窗口大小调整字体大小（优化版本 - 减少闪烁）"""
+        """根据窗口大小调整字体大小（只修改共享Font对象，Tk统一重新布局）"""
         try:
             current_width = self.window_info['current_width']
             current_height = self.window_info['current_height']
@@ -369,116 +428,54 @@ class ListeningPlayer(tk.Tk):
             # 限制缩放比例在合理范围内
             scale_ratio = max(0.8, min(1.3, scale_ratio))
             
-            # 根据缩放比例调整字体大小
-            base_font_size = 20
-            scaled_font_size = int(base_font_size * scale_ratio)
-            secondary_font_size = int(12 * scale_ratio)
-            
-            # 检查是否需要更新字体大小（避免不必要的更新）
-            need_update = False
-            
-            # 检查当前行字幕字体
-            if hasattr(self, 'current_line_text'):
-                current_font = self.current_line_text.cget('font')
-                if isinstance(current_font, tuple) and len(current_font) >= 2:
-                    if abs(current_font[1] - scaled_font_size) > 1:  # 只有差异大于1才更新
-                        need_update = True
-                else:
-                    need_update = True
+            self.scale_fonts(scale_ratio)
             
-            if need_update or not hasattr(self, '_last_font_size'):
-                # 批量更新字体，减少重绘次数
-                self.update_idletasks()  # 确保之前的更新完成
-                
-                # 临时禁用字幕文本的自动换行，减少闪烁
-                widgets_to_update = []
-                if hasattr(self, 'current_line_text'):
-                    widgets_to_update.append((self.current_line_text, scaled_font_size))
-                if hasattr(self, 'prev_line_text'):
-                    widgets_to_update.append((self.prev_line_text, secondary_font_size))
-                if hasattr(self, 'next_line_text'):
-                    widgets_to_update.append((self.next_line_text, secondary_font_size))
-                
-                # 批量更新字体，在同一个update_idletasks周期内完成
-                for widget, font_size in widgets_to_update:
-                    widget.config(font=("Segoe UI", font_size))
-                
-                # 统一刷新所有文本控件
-                for widget, _ in widgets_to_update:
-                    widget.update_idletasks()
-                
-                # 记录最后的字体大小，用于下次比较
-                self._last_font_size = scaled_font_size
-            
-            # 更新标题字体大小
-            title_font_size = int(22 * scale_ratio)
-            if hasattr(self, 'initial_frame'):
-                # 查找并更新标题标签
-                for widget in self.initial_frame.winfo_children():
-                    if isinstance(widget, ttk.Frame):
-                        for child in widget.winfo_children():
-                            if isinstance(child, ttk.Label):
-                                current_font = child.cget('font')
-                                if isinstance(current_font, tuple) and len(current_font) >= 3:
-                                    if 'bold' in current_font:
-                                        child.config(font=("Segoe UI", title_font_size, "bold"))
-                                    else:
-                                        subtitle_font_size = int(14 * scale_ratio)
-                                        child.config(font=("Segoe UI", subtitle_font_size))
-            
-            # 更新按钮字体大小和尺寸
-            button_font_size = int(11 * scale_ratio)
             if hasattr(self, 'player_frame'):
-                # 更新播放器页面的按钮字体和尺寸
-                self.update_buttons_font_size(self.player_frame, button_font_size)
+                # 更新播放器页面的按钮尺寸和间距
                 self.update_player_buttons_layout(scale_ratio)
-            
-            if hasattr(self, 'initial_frame'):
-                # 更新初始页面的按钮字体
-                self.update_buttons_font_size(self.initial_frame, button_font_size)
-            
-            # 更新时间标签字体大小
-            time_font_size = int(11 * scale_ratio)
-            if hasattr(self, 'time_label'):
-                self.time_label.config(font=("Segoe UI", time_font_size))
-            
-            # 更新倍速选择框的字体大小
-            if hasattr(self, 'speed_combobox'):
-                combobox_font_size = int(10 * scale_ratio)
-                self.speed_combobox.config(font=("Segoe UI", combobox_font_size))
-            
-            # 更新历史记录相关的字体大小
-            history_font_size = int(18 * scale_ratio)
-            history_sub_font_size = int(11 * scale_ratio)
-            if hasattr(self, 'history_tree'):
-                # 更新历史记录树的字体
-                style = ttk.Style()
-                style.configure("Custom.Treeview", font=("Segoe UI", int(10 * scale_ratio)))
-                style.configure("Custom.Treeview.Heading", font=("Segoe UI", int(11 * scale_ratio), 'bold'))
                         
         except Exception as e:
             # 如果调整字体时出错，静默处理
             pass
     
-    def update_buttons_font_size(self, parent, font_size):
-        """递归更新所有按钮的字体大小"""
-        try:
-            for widget in parent.winfo_children():
-                if isinstance(widget, ttk.Button):
-                    current_font = widget.cget('font')
-                    if isinstance(current_font, tuple) and len(current_font) >= 3:
-                        if 'bold' in current_font:
-                            widget.config(font=("Segoe UI", font_size, "bold"))
-                        else:
-                            widget.config(font=("Segoe UI", font_size))
-                    else:
-                        widget.config(font=("Segoe UI", font_size))
-                elif isinstance(widget, (ttk.Frame, tk.Frame)):
-                    # 递归处理子框架
-                    self.update_buttons_font_size(widget, font_size)
-        except Exception as e:
-            # 如果更新按钮字体时出错，静默处理
-            pass
+    def setup_fonts(self):
+        """创建共享字体注册表（名称 -> (基础字号, 字重)）"""
+        font_main = "Segoe UI"
+        self.font_specs = {
+            'subtitle': (20, 'normal'),      # 当前句字幕
+            'secondary': (12, 'normal'),     # 上一句/下一句字幕
+            'button': (11, 'bold'),          # 控制按钮
+            'time': (11, 'normal'),          # 时间标签
+            'combobox': (10, 'normal'),      # 倍速选择框
+            'tree': (10, 'normal'),          # 历史记录列表
+            'tree_heading': (11, 'bold'),    # 历史记录表头
+            'title': (22, 'bold'),           # 主页标题
+            'tagline': (14, 'normal'),       # 主页副标题
+            'day_main': (32, 'bold'),        # DAY X
+            'day_sub': (16, 'bold'),         # DAY X 副标题
+            'view_title': (28, 'bold'),      # 统计/搜索界面标题
+            'stat_value': (20, 'bold'),      # 统计数值
+            'caption': (11, 'normal'),       # 说明文字
+            'dialog_title': (16, 'normal'),  # 文件选择对话框标题
+            'list': (12, 'normal'),          # 文件选择对话框的输入框和列表
+            'list_info': (10, 'normal'),     # 文件选择对话框的计数
+            'search_entry': (14, 'normal'),  # 字幕搜索输入框
+            'concordance': (14, 'normal'),   # 例句连播当前句
+        }
+        self.fonts = {
+            name: tkfont.Font(self, family=font_main, size=size, weight=weight)
+            for name, (size, weight) in self.font_specs.items()
+        }
+        # 当前字号缓存，避免每次缩放都向Tk查询
+        self._font_sizes = {name: size for name, (size, _) in self.font_specs.items()}
+    
+    def scale_fonts(self, scale_ratio, names=None):
+        """按缩放比例更新共享字体，字号未变化的字体不做任何Tcl调用"""
+        for name in (names or self.font_specs):
+            new_size = int(self.font_specs[name][0] * scale_ratio)
+            if self._font_sizes[name] != new_size:
+                self._font_sizes[name] = new_size
+                self.fonts[name].configure(size=new_size)
     
     def update_player_buttons_layout(self, scale_ratio):
         """更新播放界面按钮的布局和尺寸"""
@@ -514,7 +511,7 @@ class ListeningPlayer(tk.Tk):
                 self.speed_combobox.config(width=combobox_width)
             
             # 更新进度条容器的内边距
-            if hasattr(self, 'progress_bar') and hasattr(self, 'progress_bar').master:
+            if hasattr(self, 'progress_bar') and self.progress_bar.master:
                 progress_container = self.progress_bar.master
                 base_padx_left = 30
                 base_padx_right = 60
@@ -566,14 +563,14 @@ class ListeningPlayer(tk.Tk):
                        foreground=self.colors['text_primary'],
                        rowheight=35,
                        fieldbackground=self.colors['bg'],
-                       font=(font_main, 10),
+                       font=self.fonts['tree'],
                        borderwidth=0,
                        relief='flat')
         
         style.configure("Custom.Treeview.Heading",
                        background=self.colors['bg'],
                        foreground=self.colors['text_primary'],
-                       font=(font_main, 11, 'bold'),
+                       font=self.fonts['tree_heading'],
                        borderwidth=0,
                        relief='flat')
 
@@ -590,7 +587,7 @@ class ListeningPlayer(tk.Tk):
         style.configure("Primary.TButton",
                        background=self.colors['bg_secondary'],
                        foreground=self.colors['text_primary'],
-                       font=(font_main, 11, 'bold'),
+                       font=self.fonts['button'],
                        borderwidth=1,
                        relief='solid')
         style.map("Primary.TButton",
@@ -599,7 +596,7 @@ class ListeningPlayer(tk.Tk):
         style.configure("Control.TButton",
                        background=self.colors['bg'],
                        foreground=self.colors['text_secondary'],
-                       font=(font_main, 11, 'bold'),
+                       font=self.fonts['button'],
                        padding=(12, 8))
         style.map("Control.TButton",
                   background=[('active', self.colors['bg_hover'])],
@@ -635,13 +632,16 @@ class ListeningPlayer(tk.Tk):
             if not os.path.exists(self.subtitle_folder):
                 os.makedirs(self.subtitle_folder)
             
+            # 音频解码缓存（转码后的FLAC），可随时删除
+            self.cache_folder = os.path.join(base_dir, "缓存")
+            
             readme_path = os.path.join(base_dir, "使用说明.txt")
             if not os.path.exists(readme_path):
                 with open(readme_path, 'w', encoding='utf-8') as f:
                     f.write("听力大师使用说明\n\n")
                     f.write("=== 文件设置 ===\n")
-                    f.write("1. 请将音频文件(.mp3)放入'音频'文件夹中\n")
-                    f.write("2. 请将对应的字幕文件(.srt)放入'字幕'文件夹中\n")
+                    f.write("1. 请将音频文件(.mp3/.m4a/.flac/.wav/.ogg/.opus，或.mp4/.mkv视频)放入'音频'文件夹中\n")
+                    f.write("2. 请将对应的字幕文件(.srt/.vtt/.lrc/.ass)放入'字幕'文件夹中\n")
                     f.write("3. 音频文件和字幕文件的文件名必须相同（扩展名不同）\n")
                     f.write("   例如：音频/song.mp3 和 字幕/song.srt\n\n")
                     f.write("=== 快捷键操作 ===\n")
@@ -692,8 +692,14 @@ class ListeningPlayer(tk.Tk):
         self.bind_all('<KeyPress-Down>', self.global_down_handler)
         self.bind_all('<KeyPress-x>', self.global_x_handler)
         
+    def is_text_input(self, event):
+        """按键是否发生在输入框中（搜索框、筛选框），此时不触发全局快捷键"""
+        return isinstance(event.widget, tk.Entry)
+        
     def global_space_handler(self, event):
         """全局空格键处理器"""
+        if self.is_text_input(event):
+            return
         # 在听写模式下，空格键不执行播放/暂停功能
         if self.is_dictation_mode:
             return "break"
@@ -706,6 +712,8 @@ class ListeningPlayer(tk.Tk):
         
     def global_left_handler(self, event):
         """全局左箭头处理器"""
+        if self.is_text_input(event):
+            return
         # 在听写模式下，左箭头键不执行跳转功能
         if self.is_dictation_mode:
             return "break"
@@ -716,6 +724,8 @@ class ListeningPlayer(tk.Tk):
         
     def global_right_handler(self, event):
         """全局右箭头处理器"""
+        if self.is_text_input(event):
+            return
         # 在听写模式下，右箭头键不执行跳转功能
         if self.is_dictation_mode:
             return "break"
@@ -726,6 +736,8 @@ class ListeningPlayer(tk.Tk):
         
     def global_up_handler(self, event):
         """全局上箭头处理器"""
+        if self.is_text_input(event):
+            return
         # 在听写模式下，上箭头键不执行显示字幕功能
         if self.is_dictation_mode:
             return "break"
@@ -736,6 +748,8 @@ class ListeningPlayer(tk.Tk):
         
     def global_down_handler(self, event):
         """全局下箭头处理器"""
+        if self.is_text_input(event):
+            return
         # 在听写模式下，下箭头键不执行隐藏字幕功能
         if self.is_dictation_mode:
             return "break"
@@ -746,6 +760,8 @@ class ListeningPlayer(tk.Tk):
         
     def global_x_handler(self, event):
         """全局x键处理器"""
+        if self.is_text_input(event):
+            return
         # 在听写模式下，x键不执行单句循环功能
         if self.is_dictation_mode:
             return "break"
@@ -754,61 +770,87 @@ class ListeningPlayer(tk.Tk):
             self.toggle_sentence_loop()
         return "break"
 
-    def create_history_table(self):
-        cursor = self.db_conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                audio_path TEXT NOT NULL,
-                start_time TEXT NOT NULL,
-                end_time TEXT NOT NULL,
-                duration REAL NOT NULL,
-                total_audio_length REAL
-            )
-        """)
-        
-        cursor.execute("PRAGMA table_info(sessions)")
-        columns = [info[1] for info in cursor.fetchall()]
-        if 'total_audio_length' not in columns:
-            cursor.execute("ALTER TABLE sessions ADD COLUMN total_audio_length REAL")
-        
-        self.db_conn.commit()
-
     def finalize_current_audio_session(self):
         if self.current_audio_path and self.current_segment_start_time:
             segment_duration = (datetime.datetime.now() - self.current_segment_start_time).total_seconds()
             self.current_audio_accumulated_duration += segment_duration
             self.current_segment_start_time = None
 
-        if self.current_audio_path and self.current_audio_accumulated_duration > 0:
-            cursor = self.db_conn.cursor()
-            if self.current_session_db_id is None:
-                cursor.execute("SELECT id FROM sessions WHERE audio_path = ?", (self.current_audio_path,))
-                existing_session = cursor.fetchone()
-
-                if existing_session:
-                    self.current_session_db_id = existing_session[0]
-                    cursor.execute("""
-                        UPDATE sessions SET duration = ?, end_time = ?, total_audio_length = ? WHERE id = ?
-                    """, (self.current_audio_accumulated_duration, datetime.datetime.now().isoformat(), self.current_audio_total_length, self.current_session_db_id))
-                else:
-                    start_time = datetime.datetime.now() - datetime.timedelta(seconds=self.current_audio_accumulated_duration)
-                    cursor.execute("""
-                        INSERT INTO sessions (audio_path, start_time, end_time, duration, total_audio_length)
-                        VALUES (?, ?, ?, ?, ?)
-                    """, (self.current_audio_path, start_time.isoformat(), datetime.datetime.now().isoformat(), self.current_audio_accumulated_duration, self.current_audio_total_length))
-                    self.current_session_db_id = cursor.lastrowid
-            else:
-                cursor.execute("""
-                    UPDATE sessions SET duration = ?, end_time = ?, total_audio_length = ? WHERE id = ?
-                """, (self.current_audio_accumulated_duration, datetime.datetime.now().isoformat(), self.current_audio_total_length, self.current_session_db_id))
-            self.db_conn.commit()
-
-    def get_statistics(self):
+        if (self.current_audio_path and self.current_audio_accumulated_duration > 0
+                and self.current_audio_accumulated_duration != self.current_audio_saved_duration):
+            now = datetime.datetime.now()
+            audio_path = self.current_audio_path
+            duration = self.current_audio_accumulated_duration
+            start_time = now - datetime.timedelta(seconds=duration)
+            # 本次新增的收听时长累加到当天的汇总统计
+            self.db_writer.submit(add_listening_time, audio_path, now,
+                                  duration - self.current_audio_saved_duration)
+            self.current_audio_saved_duration = duration
+            self.pending_session_durations[audio_path] = duration
+            # 同一音频的多次更新在写线程中合并为一次
+            self.db_writer.submit(upsert_session, audio_path, start_time.isoformat(), now.isoformat(),
+                                  duration, self.current_audio_total_length,
+                                  key=('session', audio_path),
+                                  callback=lambda session_id: self.on_session_saved(audio_path, duration, session_id))
+
+    def on_session_saved(self, audio_path, duration, session_id):
+        """学习记录写入完成的回调（在写线程中执行）"""
+        if self.pending_session_durations.get(audio_path) == duration:
+            self.pending_session_durations.pop(audio_path, None)
+        self.mark_history_dirty([session_id])
+
+    def mark_history_dirty(self, session_ids):
+        """标记有变化的学习记录，主页可见时刷新（可在写线程中调用）"""
+        if not session_ids:
+            return
+        with self.history_dirty_lock:
+            self.history_dirty_ids.update(session_ids)
+        # 退出时主线程正在等待写线程结束，此时不能再调度Tk回调
+        if not self._closing:
+            self.after_idle(self.refresh_history_if_visible)
+
+    def refresh_history_if_visible(self):
+        """主页可见时立即应用历史记录的增量变化"""
+        if self.initial_frame.winfo_ismapped():
+            self.update_initial_view_stats()
+
+    def record_sentence_event(self, sentence_index, event_type, speed=1.0, duration=0.0, similarity=None):
+        """异步记录一条逐句练习事件（单句循环/听写）"""
+        if not self.current_audio_path or sentence_index < 0:
+            return
+        self.db_writer.submit(insert_sentence_event, self.current_audio_path, sentence_index, event_type,
+                              datetime.datetime.now(), speed, duration, similarity)
+
+    def get_sentence_bounds(self, index):
+        """返回第index句的 (开始时间, 结束时间)，结束时间取字幕中的结束时间（不播放句间停顿），不超过音频末尾"""
+        start_time = self.lyrics.start(index)
+        end_time = min(self.lyrics.end(index), self.current_audio_total_length)
+        if end_time <= start_time:
+            # 结束时间缺失或有误时退回到下一句开始
+            end_time = self.lyrics.start(index + 1) if index < len(self.lyrics) - 1 else self.current_audio_total_length
+        return start_time, end_time
+
+    def get_history_page(self, before=None, limit=None):
+        """按开始时间倒序获取一页历史记录，before为上一页最后一行的 (start_time, id)"""
         cursor = self.db_conn.cursor()
-        cursor.execute("SELECT id, audio_path, start_time, duration, total_audio_length FROM sessions ORDER BY start_time DESC")
-        history_data = cursor.fetchall()
-        return None, None, history_data
+        if before is None:
+            cursor.execute("""
+                SELECT id, audio_path, start_time, duration, total_audio_length FROM sessions
+                ORDER BY start_time DESC, id DESC LIMIT ?
+            """, (limit or self.history_page_size,))
+        else:
+            cursor.execute("""
+                SELECT id, audio_path, start_time, duration, total_audio_length FROM sessions
+                WHERE (start_time, id) < (?, ?)
+                ORDER BY start_time DESC, id DESC LIMIT ?
+            """, (before[0], before[1], limit or self.history_page_size))
+        return cursor.fetchall()
+
+    def get_history_record(self, db_id):
+        """获取单条历史记录"""
+        cursor = self.db_conn.cursor()
+        cursor.execute("SELECT id, audio_path, start_time, duration, total_audio_length FROM sessions WHERE id = ?", (db_id,))
+        return cursor.fetchone()
     
     def get_activation_info(self):
         """获取激活信息"""
@@ -829,24 +871,34 @@ class ListeningPlayer(tk.Tk):
 
     def on_closing(self):
         self.finalize_current_audio_session()
+        self.stop_concordance()
         # 关闭线程池
         if hasattr(self, 'thread_pool'):
             self.thread_pool.shutdown(wait=False)
-        self.db_conn.close()
+            self.concordance_pool.shutdown(wait=False)
+        # 写入剩余的数据库操作后再关闭连接
+        self._closing = True
+        self.folder_watcher.stop()
+        self.library_indexer.stop()
+        self.decode_cache.stop()
+        self.clip_cache.stop()
+        self.db_writer.close()
+        close_connections()
         self.destroy()
 
     def get_activation_date(self):
-        try:
-            conn = sqlite3.connect('listening_history.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT activation_date FROM activation_info ORDER BY id DESC LIMIT 1")
-            row = cursor.fetchone()
-            conn.close()
-            if row:
-                return datetime.datetime.fromisoformat(row[0]).date()
-        except:
-            pass
-        return datetime.date.today()
+        """获取激活日期（启动时读取一次并缓存）"""
+        return self.activation_date or datetime.date.today()
+
+    def update_day_label(self):
+        """按缓存的激活日期刷新DAY X（跨天后返回主页即更新，不访问数据库）"""
+        if not hasattr(self, 'day_label_main'):
+            return
+        days_since_activation = (datetime.date.today() - self.get_activation_date()).days + 1
+        text = f"DAY {days_since_activation}"
+        if text != self._day_label_text:
+            self._day_label_text = text
+            self.day_label_main.config(text=text)
 
     def create_views(self):
         font_main = "Segoe UI"
@@ -861,15 +913,17 @@ class ListeningPlayer(tk.Tk):
         
         # 获取激活信息来显示DAY X
         activation_info = self.get_activation_info()
+        self.activation_date = None
         if activation_info:
-            activation_date = datetime.datetime.fromisoformat(activation_info['activation_date'])
-            days_since_activation = (datetime.datetime.now() - activation_date).days + 1
+            self.activation_date = datetime.datetime.fromisoformat(activation_info['activation_date']).date()
+            days_since_activation = (datetime.date.today() - self.activation_date).days + 1
+            self._day_label_text = f"DAY {days_since_activation}"
             
             # DAY X信息 - 响应式定位，根据窗口大小调整位置
             self.day_section = ttk.Frame(self.initial_frame)
-            self.day_label_main = ttk.Label(self.day_section, text=f"DAY {days_since_activation}", font=(font_main, 32, "bold"), foreground=self.colors['text_primary'])
+            self.day_label_main = ttk.Label(self.day_section, text=self._day_label_text, font=self.fonts['day_main'], foreground=self.colors['text_primary'])
             self.day_label_main.pack(pady=(0, 5))
-            self.day_label_sub = ttk.Label(self.day_section, text="你真的很棒了", font=(font_main, 16, "bold"), foreground=self.colors['text_primary'])
+            self.day_label_sub = ttk.Label(self.day_section, text="你真的很棒了", font=self.fonts['day_sub'], foreground=self.colors['text_primary'])
             self.day_label_sub.pack()
             # 初始定位将在窗口显示后设置
             self.after(50, self.update_day_position)
@@ -880,9 +934,11 @@ class ListeningPlayer(tk.Tk):
         # 主要内容区域 - 保持居中对齐（不受DAY X影响）
         main_section = ttk.Frame(main_content_frame)
         main_section.pack(pady=(20, 20))
-        ttk.Label(main_section, text="学无止境，听力先行。", font=(font_main, 22, "bold"), foreground=self.colors['text_primary']).pack(pady=(20, 5), anchor='center')
-        ttk.Label(main_section, text="相信自己，听力突破从现在开始！", font=(font_main, 14), foreground=self.colors['text_secondary']).pack(pady=(0, 20), anchor='center')
+        ttk.Label(main_section, text="学无止境，听力先行。", font=self.fonts['title'], foreground=self.colors['text_primary']).pack(pady=(20, 5), anchor='center')
+        ttk.Label(main_section, text="相信自己，听力突破从现在开始！", font=self.fonts['tagline'], foreground=self.colors['text_secondary']).pack(pady=(0, 20), anchor='center')
         ttk.Button(main_section, text="🎧 加载音频", command=self.load_files, style="Primary.TButton").pack(pady=10, ipady=5, anchor='center')
+        ttk.Button(main_section, text="📊 学习统计", command=self.show_dashboard_view, style="Control.TButton").pack(anchor='center')
+        ttk.Button(main_section, text="🔍 字幕搜索", command=self.show_search_view, style="Control.TButton").pack(pady=(10, 0), anchor='center')
 
         # 下半部分：学习历史
         history_section = ttk.Frame(main_content_frame)
@@ -905,7 +961,7 @@ class ListeningPlayer(tk.Tk):
 
         tree_scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.history_tree.yview)
         tree_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.history_tree.configure(yscrollcommand=tree_scrollbar.set)
+        self.history_tree.configure(yscrollcommand=lambda first, last: self.on_history_scroll(tree_scrollbar, first, last))
         self.history_tree.bind('<Double-1>', self.on_history_double_click)
 
         self.history_context_menu = tk.Menu(self, tearoff=0)
@@ -919,21 +975,21 @@ class ListeningPlayer(tk.Tk):
         text_frame = ttk.Frame(self.player_frame, padding=(40, 40))
         text_frame.pack(expand=True, fill=tk.BOTH)
         
-        self.prev_line_text = tk.Text(text_frame, height=2, font=(font_main, 12), 
+        self.prev_line_text = tk.Text(text_frame, height=2, font=self.fonts['secondary'], 
                                      foreground=self.colors['text_muted'], 
                                      background=self.colors['bg'],
                                      wrap=tk.WORD, relief=tk.FLAT,
                                      state=tk.DISABLED, cursor="")
         self.prev_line_text.pack(pady=10, fill='x')
         
-        self.current_line_text = tk.Text(text_frame, height=3, font=(font_main, 20), 
+        self.current_line_text = tk.Text(text_frame, height=3, font=self.fonts['subtitle'], 
                                         foreground=self.colors['text_primary'], 
                                         background=self.colors['bg'],
                                         wrap=tk.WORD, relief=tk.FLAT,
                                         state=tk.DISABLED, cursor="")
         self.current_line_text.pack(pady=15, expand=True, fill='x')
         
-        self.next_line_text = tk.Text(text_frame, height=2, font=(font_main, 12), 
+        self.next_line_text = tk.Text(text_frame, height=2, font=self.fonts['secondary'], 
                                      foreground=self.colors['text_muted'], 
                                      background=self.colors['bg'],
                                      wrap=tk.WORD, relief=tk.FLAT,
@@ -947,6 +1003,10 @@ class ListeningPlayer(tk.Tk):
 
         self.subtitles_visible = True
         
+        # 字幕渲染缓存：记录已渲染的句子索引和上/中/下三行文本，避免每次刷新回读Text控件
+        self._rendered_line_index = None
+        self._rendered_lines = ("", "", "")
+        
         # 为文本框架添加双击事件监听
         text_frame.bind("<Double-Button-1>", self.on_text_frame_double_click)
         
@@ -965,7 +1025,7 @@ class ListeningPlayer(tk.Tk):
         self.progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
         self.progress_bar.bind("<ButtonRelease-1>", self.perform_seek)
         
-        self.time_label = ttk.Label(progress_container, text="00:00/00:00", font=(font_main, 11), foreground=self.colors['text_secondary'])
+        self.time_label = ttk.Label(progress_container, text="00:00/00:00", font=self.fonts['time'], foreground=self.colors['text_secondary'])
         self.time_label.pack(side=tk.RIGHT, padx=(10, 0))
         
         # --- MODIFIED BUTTON LAYOUT ---
@@ -987,6 +1047,7 @@ class ListeningPlayer(tk.Tk):
         # --- 新增：倍速选择 Combobox ---
         self.speed_var = tk.StringVar(value="1.0x")
         self.speed_combobox = ttk.Combobox(buttons_container, textvariable=self.speed_var, state="readonly", width=6,
+                                           font=self.fonts['combobox'],
                                            values=["0.5x", "0.75x", "1.0x", "1.25x", "1.5x", "2.0x"])
         self.speed_combobox.pack(side=tk.LEFT, padx=(0, 6), pady=(2, 0))
         self.speed_combobox.bind("<<ComboboxSelected>>", self.on_speed_change)
@@ -999,12 +1060,31 @@ class ListeningPlayer(tk.Tk):
         self.dictation_mode_btn = ttk.Button(buttons_container, text="✏️ 听写模式", command=self.toggle_dictation_mode, style="Control.TButton")
         self.dictation_mode_btn.pack(side=tk.LEFT, padx=(0, 2))
 
+        self.review_btn = ttk.Button(buttons_container, text="📚 复习", command=self.toggle_review_session, style="Control.TButton")
+        self.review_btn.pack(side=tk.LEFT, padx=(0, 2))
+
         btn_home = ttk.Button(buttons_container, text="🏠 返回主页", command=self.back_to_home, style="Control.TButton")
         btn_home.pack(side=tk.LEFT) # 最后一个按钮右侧不需要间距
+
+        # --- 复习栏（复习时显示在按钮下方） ---
+        self.review_bar = ttk.Frame(bottom_controls_frame)
+        self.review_progress_label = ttk.Label(self.review_bar, text="", font=self.fonts['time'], foreground=self.colors['text_secondary'])
+        self.review_progress_label.pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(self.review_bar, text="✓ 记住了", command=lambda: self.grade_review_item(True), style="Control.TButton").pack(side=tk.LEFT, padx=(0, 2))
+        ttk.Button(self.review_bar, text="✗ 没听清", command=lambda: self.grade_review_item(False), style="Control.TButton").pack(side=tk.LEFT, padx=(0, 2))
+        ttk.Button(self.review_bar, text="结束复习", command=self.end_review_session, style="Control.TButton").pack(side=tk.LEFT)
         
         # --- 创建听写练习界面 ---
         self.dictation_frame = ttk.Frame(self)
         self.create_dictation_view()
+        
+        # --- 创建学习统计界面 ---
+        self.dashboard_frame = ttk.Frame(self)
+        self.create_dashboard_view()
+        
+        # --- 创建字幕搜索界面 ---
+        self.search_frame = ttk.Frame(self)
+        self.create_search_view()
 
     def on_speed_change(self, event=None):
         speed_str = self.speed_var.get().replace("x", "")
@@ -1012,6 +1092,9 @@ class ListeningPlayer(tk.Tk):
             self.playback_speed = float(speed_str)
         except Exception:
             self.playback_speed = 1.0
+        # 已渲染的片段是旧倍速的，按新倍速预先渲染
+        if self.is_reviewing:
+            self.prepare_review_segments()
         # 切换倍速时，若在单句循环且正在播放，立即重播当前句子
         if self.is_looping_sentence and self.is_loaded:
             self.play_current_sentence_with_speed_async()
@@ -1022,6 +1105,11 @@ class ListeningPlayer(tk.Tk):
             messagebox.showinfo("提示", "请先加载音频文件再使用单句循环功能。", parent=self)
             return
         
+        # 复习依赖单句循环，关闭单句循环即结束复习
+        if self.is_reviewing and self.is_looping_sentence:
+            self.end_review_session()
+            return
+
         # 检查是否在播放状态，如果未播放则提示用户先播放
         if self.is_paused and not self.is_looping_sentence:
             messagebox.showinfo("提示", "请先点击播放按钮开始播放，然后再启用单句循环功能。", parent=self)
@@ -1039,7 +1127,7 @@ class ListeningPlayer(tk.Tk):
             
             # 获取当前播放位置，相对于当前句子的开始时间
             current_pos = pygame.mixer.music.get_pos() / 1000.0
-            sentence_start_time = self.lyrics[self.current_line_index][0] if self.current_line_index != -1 else 0
+            sentence_start_time = self.lyrics.start(self.current_line_index) if self.current_line_index != -1 else 0
             absolute_current_time = self.seek_offset + current_pos
             loop_offset = max(0, absolute_current_time - sentence_start_time)
             
@@ -1061,7 +1149,7 @@ class ListeningPlayer(tk.Tk):
             
             # 重新加载原始音频文件
             try:
-                pygame.mixer.music.load(self.current_audio_path)
+                pygame.mixer.music.load(self.current_playback_path)
                 # print(f"[DEBUG] 重新加载原始音频: {self.current_audio_path}")
             except Exception as e:
                 # print(f"[DEBUG] 重新加载音频失败: {e}")
@@ -1101,11 +1189,8 @@ class ListeningPlayer(tk.Tk):
         if not self.lyrics or self.current_line_index == -1:
             return
         
-        start_time = self.lyrics[self.current_line_index][0] + offset
-        if self.current_line_index < len(self.lyrics) - 1:
-            end_time = self.lyrics[self.current_line_index + 1][0]
-        else:
-            end_time = self.current_audio_total_length
+        start_time, end_time = self.get_sentence_bounds(self.current_line_index)
+        start_time += offset
         
         # 立即停止当前播放
         pygame.mixer.music.pause()
@@ -1114,10 +1199,12 @@ class ListeningPlayer(tk.Tk):
         # 标记正在处理
         self.is_processing_audio = True
         
-        # 提交到线程池异步处理
+        # 整句由片段缓存渲染（只截取该句，不解码整个文件），重播和复习时已渲染的片段直接加载；
+        # 从句子中间开始（刚打开单句循环时）才临时截取
+        process = self.render_sentence_clip if offset == 0 else self.process_audio_segment
         future = self.thread_pool.submit(
-            self.process_audio_segment,
-            self.current_audio_path,
+            process,
+            self.current_playback_path,
             start_time,
             end_time,
             self.playback_speed
@@ -1126,6 +1213,23 @@ class ListeningPlayer(tk.Tk):
         # 设置回调处理结果
         future.add_done_callback(self.on_audio_processed)
     
+    def render_sentence_clip(self, input_path, start_time, end_time, speed):
+        """在后台线程中用片段缓存渲染整句（已渲染时直接返回）"""
+        try:
+            clip_path = self.clip_cache.render(input_path, start_time, end_time, speed)
+            return {
+                'success': True,
+                'clip_path': clip_path,
+                'duration': audio_file_duration(clip_path) or (end_time - start_time) / speed,
+                'start_time': start_time,
+                'end_time': end_time
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
     def process_audio_segment(self, input_path, start_time, end_time, speed):
         """在后台线程中处理音频片段"""
         try:
@@ -1167,13 +1271,17 @@ class ListeningPlayer(tk.Tk):
                 
                 if result['success']:
                     # 成功处理音频
-                    seg = result['segment']
                     self.current_loop_duration = result['duration']
                     self.current_loop_start_time = result['start_time']
                     self.current_loop_end_time = result['end_time']
                     
                     # 播放音频
-                    self.playback_obj = self.play_audiosegment(seg)
+                    if 'clip_path' in result:
+                        # 片段缓存中的文件，直接播放（不记为临时文件，停止时不删除）
+                        self.stop_simpleaudio_playback()
+                        self.playback_obj = self.play_clip_file(result['clip_path'])
+                    else:
+                        self.playback_obj = self.play_audiosegment(result['segment'])
                     
                     # 设置进度条
                     self.progress_bar.config(to=self.current_loop_duration)
@@ -1213,33 +1321,27 @@ class ListeningPlayer(tk.Tk):
             # 如果连错误显示都失败了，就静默处理
             pass
 
-    def change_speed_ffmpeg(self, input_path, start_time, end_time, speed):
+    def get_ffmpeg_path(self):
+        """返回 ffmpeg.exe 的路径，找不到时抛出 FileNotFoundError"""
+        if hasattr(sys, '_MEIPASS'):
+            # PyInstaller打包后的临时目录
+            base_dir = sys._MEIPASS
+        else:
+            base_dir = os.path.dirname(os.path.abspath(__file__))
+        
+        ffmpeg_path = os.path.join(base_dir, 'ffmpeg.exe')
+        if not os.path.exists(ffmpeg_path):
+            raise FileNotFoundError(f"FFmpeg可执行文件未找到：{ffmpeg_path}")
+        return ffmpeg_path
+
+    def apply_speed_ffmpeg(self, segment, speed):
+        """用ffmpeg atempo对已解码的音频片段变速（可在后台线程调用，出错时抛出异常）"""
         from tempfile import NamedTemporaryFile
-        import traceback
-        from tkinter import messagebox
-        # print(f"[DEBUG] change_speed_ffmpeg: input_path={input_path}, start={start_time}, end={end_time}, speed={speed}")
         
+        ffmpeg_path = self.get_ffmpeg_path()
         temp_in_path = None
         temp_out_path = None
-        
         try:
-            # 检查FFmpeg是否可用
-            if hasattr(sys, '_MEIPASS'):
-                # PyInstaller打包后的临时目录
-                base_dir = sys._MEIPASS
-            else:
-                base_dir = os.path.dirname(os.path.abspath(__file__))
-            
-            ffmpeg_path = os.path.join(base_dir, 'ffmpeg.exe')
-            if not os.path.exists(ffmpeg_path):
-                raise FileNotFoundError(f"FFmpeg可执行文件未找到：{ffmpeg_path}")
-            
-            # 截取片段
-            audio = AudioSegment.from_file(input_path)
-            # print("[DEBUG] AudioSegment.from_file 完成")
-            segment = audio[start_time*1000:end_time*1000]
-            # print("[DEBUG] segment 截取完成")
-            
             # 导出为临时文件
             with NamedTemporaryFile(delete=False, suffix='.wav') as temp_in, NamedTemporaryFile(delete=False, suffix='.wav') as temp_out:
                 temp_in_path = temp_in.name
@@ -1249,20 +1351,9 @@ class ListeningPlayer(tk.Tk):
                 # print(f"[DEBUG] segment.export 完成: {temp_in_path}")
                 
                 # 用ffmpeg atempo变速（支持0.5~2.0倍速，超出需多次atempo叠加）
-                atempo_filters = []
-                remain = speed
-                while remain > 2.0:
-                    atempo_filters.append("atempo=2.0")
-                    remain /= 2.0
-                while remain < 0.5:
-                    atempo_filters.append("atempo=0.5")
-                    remain /= 0.5
-                atempo_filters.append(f"atempo={remain}")
-                filter_str = ",".join(atempo_filters)
-                
                 cmd = [
                     ffmpeg_path, "-y", "-i", temp_in_path,
-                    "-filter:a", filter_str,
+                    "-filter:a", atempo_filter(speed),
                     temp_out_path
                 ]
                 # print(f"[DEBUG] 调用ffmpeg命令: {' '.join(cmd)}")
@@ -1283,28 +1374,30 @@ class ListeningPlayer(tk.Tk):
                 if not os.path.exists(temp_out_path) or os.path.getsize(temp_out_path) == 0:
                     raise RuntimeError("FFmpeg处理完成但输出文件为空或不存在")
                 
-                sped = AudioSegment.from_file(temp_out_path)
-                # print("[DEBUG] AudioSegment.from_file(temp_out) 完成")
-            
-            # 清理临时文件
-            if temp_in_path and os.path.exists(temp_in_path):
-                os.remove(temp_in_path)
-            if temp_out_path and os.path.exists(temp_out_path):
-                os.remove(temp_out_path)
-            # print("[DEBUG] 临时文件删除完成")
+                return AudioSegment.from_file(temp_out_path)
+        finally:
+            # 确保临时文件被清理
+            for temp_path in (temp_in_path, temp_out_path):
+                try:
+                    if temp_path and os.path.exists(temp_path):
+                        os.remove(temp_path)
+                except OSError:
+                    pass
+
+    def change_speed_ffmpeg(self, input_path, start_time, end_time, speed):
+        from tkinter import messagebox
+        # print(f"[DEBUG] change_speed_ffmpeg: input_path={input_path}, start={start_time}, end={end_time}, speed={speed}")
+        
+        try:
+            # 截取片段
+            audio = AudioSegment.from_file(input_path)
+            # print("[DEBUG] AudioSegment.from_file 完成")
+            segment = audio[start_time*1000:end_time*1000]
+            # print("[DEBUG] segment 截取完成")
             
-            return sped
+            return self.apply_speed_ffmpeg(segment, speed)
             
         except Exception as e:
-            # 确保临时文件被清理
-            try:
-                if temp_in_path and os.path.exists(temp_in_path):
-                    os.remove(temp_in_path)
-                if temp_out_path and os.path.exists(temp_out_path):
-                    os.remove(temp_out_path)
-            except:
-                pass
-            
             # print(f"[DEBUG] change_speed_ffmpeg 异常: {e}")
             error_msg = f"音频变速处理失败：\n{str(e)}"
             
@@ -1319,6 +1412,14 @@ class ListeningPlayer(tk.Tk):
             messagebox.showerror("倍速处理失败", error_msg)
             raise
 
+    def play_clip_file(self, clip_path):
+        try:
+            pygame.mixer.music.load(clip_path)
+            pygame.mixer.music.play()
+        except Exception as e:
+            pass
+        return None
+
     def play_audiosegment(self, seg):
         # 导出为临时wav
         from tempfile import NamedTemporaryFile
@@ -1367,11 +1468,452 @@ class ListeningPlayer(tk.Tk):
         self.next_line_text.pack_forget()
 
     def show_initial_view(self):
+        self.stop_concordance()
         self.player_frame.pack_forget()
+        self.dashboard_frame.pack_forget()
+        self.search_frame.pack_forget()
         self.initial_frame.pack(expand=True, fill=tk.BOTH)
         self.update_initial_view_stats()
+        self.update_day_label()
         self.update_day_position()
 
+    def create_dashboard_view(self):
+        """创建学习统计界面：累计数据、连续天数和最近一年的练习热力图"""
+        container = ttk.Frame(self.dashboard_frame)
+        container.pack(expand=True, fill=tk.BOTH, padx=40, pady=40)
+        
+        ttk.Label(container, text="学习统计", font=self.fonts['view_title'],
+                  foreground=self.colors['text_primary']).pack(pady=(0, 30))
+        
+        # 累计数据
+        totals_frame = ttk.Frame(container)
+        totals_frame.pack(pady=(0, 30))
+        self.dashboard_vars = {}
+        totals = [
+            ('listen_minutes', "累计时长"),
+            ('active_days', "学习天数"),
+            ('current_streak', "当前连续"),
+            ('longest_streak', "最长连续"),
+            ('sentences_looped', "循环句数"),
+            ('dictation_accuracy', "听写准确率"),
+        ]
+        for column, (key, title) in enumerate(totals):
+            self.dashboard_vars[key] = tk.StringVar(value="-")
+            ttk.Label(totals_frame, textvariable=self.dashboard_vars[key], font=self.fonts['stat_value'],
+                      foreground=self.colors['text_primary']).grid(row=0, column=column, padx=20)
+            ttk.Label(totals_frame, text=title, font=self.fonts['caption'],
+                      foreground=self.colors['text_secondary']).grid(row=1, column=column, padx=20)
+        
+        # 热力图：53列（周）x 7行（周一到周日），单元格只创建一次，刷新时只改颜色
+        self.heatmap_weeks = 53
+        self.heatmap_cell = 14
+        gap = 3
+        step = self.heatmap_cell + gap
+        self.heatmap_canvas = tk.Canvas(container, width=self.heatmap_weeks * step, height=7 * step,
+                                        bg=self.colors['bg'], highlightthickness=0)
+        self.heatmap_canvas.pack(pady=(0, 10))
+        self.heatmap_cells = []
+        for week in range(self.heatmap_weeks):
+            for weekday in range(7):
+                x, y = week * step, weekday * step
+                self.heatmap_cells.append(self.heatmap_canvas.create_rectangle(
+                    x, y, x + self.heatmap_cell, y + self.heatmap_cell,
+                    fill=self.colors['bg_secondary'], outline=""))
+        self.heatmap_canvas.bind('<Motion>', self.on_heatmap_motion)
+        self.heatmap_start_date = datetime.date.today()
+        self.heatmap_data = {}
+        self.heatmap_practice = {}
+        
+        self.heatmap_info_label = ttk.Label(container, text="", font=self.fonts['caption'],
+                                            foreground=self.colors['text_secondary'])
+        self.heatmap_info_label.pack()
+        
+        buttons_container = ttk.Frame(self.dashboard_frame)
+        buttons_container.pack(side=tk.BOTTOM, pady=(0, 20))
+        ttk.Button(buttons_container, text="🏠 返回主页", command=self.show_initial_view,
+                   style="Control.TButton", width=12).pack()
+    
+    def show_dashboard_view(self):
+        """显示学习统计界面"""
+        self.initial_frame.pack_forget()
+        self.dashboard_frame.pack(expand=True, fill=tk.BOTH)
+        self.refresh_dashboard()
+    
+    def refresh_dashboard(self):
+        """从每日汇总表刷新统计界面（读取行数固定，与历史记录多少无关）"""
+        today = datetime.date.today()
+        summary = get_stats_summary(self.db_conn, today)
+        self.dashboard_vars['listen_minutes'].set(f"{summary['listen_minutes'] / 60:.1f} 小时")
+        self.dashboard_vars['active_days'].set(f"{summary['active_days']} 天")
+        self.dashboard_vars['current_streak'].set(f"{summary['current_streak']} 天")
+        self.dashboard_vars['longest_streak'].set(f"{summary['longest_streak']} 天")
+        self.dashboard_vars['sentences_looped'].set(str(summary['sentences_looped']))
+        accuracy = summary['dictation_accuracy']
+        self.dashboard_vars['dictation_accuracy'].set(f"{accuracy * 100:.1f}%" if accuracy is not None else "-")
+        
+        # 最后一列包含今天，第一列从周一开始
+        self.heatmap_start_date = today - datetime.timedelta(days=today.weekday() + (self.heatmap_weeks - 1) * 7)
+        self.heatmap_data = get_daily_stats(self.db_conn, self.heatmap_start_date.isoformat(), today.isoformat())
+        # 单句循环和听写片段的实际播放时长，来自逐句事件表的日期覆盖索引
+        self.heatmap_practice = dict(get_daily_practice_minutes(self.db_conn, self.heatmap_start_date.isoformat(),
+                                                                today.isoformat()))
+        for offset, cell in enumerate(self.heatmap_cells):
+            day = self.heatmap_start_date + datetime.timedelta(days=offset)
+            if day > today:
+                color = self.colors['bg']
+            else:
+                stats = self.heatmap_data.get(day.isoformat())
+                color = self.heatmap_color(stats[0] if stats else 0)
+            self.heatmap_canvas.itemconfig(cell, fill=color)
+        self.heatmap_info_label.config(text="将鼠标移到方格上查看当天详情")
+    
+    def heatmap_color(self, minutes):
+        """按当天练习分钟数选择热力图颜色"""
+        if minutes <= 0:
+            return self.colors['bg_secondary']
+        if minutes < 10:
+            return '#c6e9d2'
+        if minutes < 30:
+            return '#7fd39b'
+        if minutes < 60:
+            return '#3bb96a'
+        return self.colors['primary_active']
+    
+    def on_heatmap_motion(self, event):
+        """鼠标悬停时显示对应日期的统计"""
+        step = self.heatmap_cell + 3
+        week, weekday = event.x // step, event.y // step
+        if not (0 <= week < self.heatmap_weeks and 0 <= weekday < 7):
+            return
+        day = self.heatmap_start_date + datetime.timedelta(days=week * 7 + weekday)
+        if day > datetime.date.today():
+            return
+        stats = self.heatmap_data.get(day.isoformat())
+        if not stats:
+            self.heatmap_info_label.config(text=f"{day.isoformat()}：没有练习")
+            return
+        minutes, files, looped, attempts, accuracy = stats
+        text = f"{day.isoformat()}：{minutes:.0f} 分钟，{files} 个文件，循环 {looped} 句"
+        practice_minutes = self.heatmap_practice.get(day.isoformat())
+        if practice_minutes:
+            text += f"（逐句练习 {practice_minutes:.0f} 分钟）"
+        if attempts:
+            text += f"，听写 {attempts} 句（准确率 {accuracy * 100:.1f}%）"
+        self.heatmap_info_label.config(text=text)
+
+    def create_search_view(self):
+        """创建字幕搜索界面：在整个音频库的字幕中全文搜索，双击结果跳转到该句"""
+        container = ttk.Frame(self.search_frame)
+        container.pack(expand=True, fill=tk.BOTH, padx=40, pady=40)
+        
+        ttk.Label(container, text="字幕搜索", font=self.fonts['view_title'],
+                  foreground=self.colors['text_primary']).pack(pady=(0, 20))
+        
+        self.search_var = tk.StringVar()
+        self.search_entry = ttk.Entry(container, textvariable=self.search_var, font=self.fonts['search_entry'])
+        self.search_entry.pack(fill=tk.X, pady=(0, 10))
+        self.search_info_label = ttk.Label(container, text="", font=self.fonts['caption'],
+                                           foreground=self.colors['text_secondary'])
+        self.search_info_label.pack(pady=(0, 10))
+        
+        # 例句连播：把搜索词在整个音频库中的所有例句依次播放
+        concordance_bar = ttk.Frame(container)
+        concordance_bar.pack(fill=tk.X, pady=(0, 10))
+        self.concordance_speed_var = tk.StringVar(value="1.0x")
+        ttk.Combobox(concordance_bar, textvariable=self.concordance_speed_var, state="readonly", width=6,
+                     values=["0.5x", "0.75x", "1.0x", "1.25x", "1.5x", "2.0x"]).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(concordance_bar, text="🔁 连播全部例句", command=self.start_concordance,
+                   style="Control.TButton").pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(concordance_bar, text="⏹ 停止", command=self.stop_concordance,
+                   style="Control.TButton").pack(side=tk.LEFT)
+        self.concordance_label = ttk.Label(container, text="", font=self.fonts['concordance'], wraplength=800,
+                                           foreground=self.colors['text_primary'])
+        self.concordance_label.pack(pady=(0, 10))
+        
+        tree_frame = ttk.Frame(container)
+        tree_frame.pack(expand=True, fill=tk.BOTH)
+        self.search_tree = ttk.Treeview(tree_frame, columns=("Audio", "Time", "Text"), show="headings",
+                                        style="Custom.Treeview")
+        self.search_tree.heading("Audio", text="音频")
+        self.search_tree.heading("Time", text="时间")
+        self.search_tree.heading("Text", text="字幕")
+        self.search_tree.column("Audio", width=200, anchor="w")
+        self.search_tree.column("Time", width=80, anchor="center")
+        self.search_tree.column("Text", width=500, anchor="w")
+        self.search_tree.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
+        search_scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.search_tree.yview)
+        search_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.search_tree.configure(yscrollcommand=search_scrollbar.set)
+        
+        self.search_results = []
+        self._search_job = None
+        
+        self.concordance_token = 0         # 每次开始/停止连播加一，后台任务据此判断是否已过期
+        self.concordance_ready = []        # 已生成、尚未交给pygame的批次
+        self.concordance_current = None    # 正在播放的批次
+        self.concordance_queued = None     # 已用 pygame.mixer.music.queue 排队的下一批次
+        self.concordance_started_at = 0.0  # 当前批次开始播放的时间
+        self.concordance_finished = []     # 已播完的批次文件，确认pygame不再读取后删除
+        self.concordance_failures = []     # 生成失败的文件 (名称, 错误信息)
+        self.concordance_preparing = False
+        self._concordance_job = None
+        self.search_var.trace_add('write', self.schedule_subtitle_search)
+        self.search_entry.bind('<Return>', lambda e: self.open_search_result())
+        self.search_tree.bind('<Double-1>', lambda e: self.open_search_result())
+        self.search_tree.bind('<Return>', lambda e: self.open_search_result())
+        
+        buttons_container = ttk.Frame(self.search_frame)
+        buttons_container.pack(side=tk.BOTTOM, pady=(0, 20))
+        ttk.Button(buttons_container, text="🏠 返回主页", command=self.show_initial_view,
+                   style="Control.TButton", width=12).pack()
+    
+    def show_search_view(self):
+        """显示字幕搜索界面"""
+        self.initial_frame.pack_forget()
+        self.search_frame.pack(expand=True, fill=tk.BOTH)
+        if not subtitle_search_available(self.db_conn):
+            self.search_entry.config(state=tk.DISABLED)
+            self.search_info_label.config(text="当前SQLite不支持全文索引（FTS5），无法使用字幕搜索")
+            return
+        self.search_info_label.config(text="输入单词或短语，双击结果从该句开始播放")
+        self.search_entry.focus_set()
+        if self.search_var.get().strip():
+            self.run_subtitle_search()
+    
+    def schedule_subtitle_search(self, *_):
+        """输入停顿后再查询，连续输入时只执行最后一次"""
+        if self._search_job:
+            self.after_cancel(self._search_job)
+        self._search_job = self.after(150, self.run_subtitle_search)
+    
+    def run_subtitle_search(self):
+        self._search_job = None
+        query = self.search_var.get()
+        try:
+            self.search_results = search_subtitles(self.db_conn, query, limit=200)
+        except Exception:
+            self.search_results = []
+        self.search_tree.delete(*self.search_tree.get_children())
+        for i, (_, _, base_name, _, start_time, text) in enumerate(self.search_results):
+            self.search_tree.insert("", tk.END, iid=str(i), values=(base_name, self.format_time(start_time), text))
+        if query.strip():
+            self.search_info_label.config(text=f"找到 {len(self.search_results)} 条结果"
+                                               + ("（仅显示前200条）" if len(self.search_results) >= 200 else ""))
+        else:
+            self.search_info_label.config(text="输入单词或短语，双击结果从该句开始播放")
+    
+    def open_search_result(self):
+        selection = self.search_tree.selection()
+        if selection:
+            index = int(selection[0])
+        elif self.search_results:
+            index = 0
+        else:
+            return
+        audio_path, srt_path, _, sentence_index, _, _ = self.search_results[index]
+        self.open_sentence(audio_path, srt_path, sentence_index)
+    
+    def start_concordance(self):
+        """例句连播：查找包含搜索词的所有句子，后台按文件生成片段，依次无缝播放"""
+        self.stop_concordance()
+        phrase = self.search_var.get()
+        try:
+            hits = find_concordance(self.db_conn, phrase)
+        except Exception:
+            hits = []
+        if not hits:
+            self.concordance_label.config(text="没有找到包含该词的句子")
+            return
+        
+        # 同一文件的句子放在一起，每个文件的例句拼成一个批次
+        groups = []
+        for audio_path, base_name, _, start_time, end_time, text in hits:
+            if not groups or groups[-1][0] != audio_path:
+                groups.append((audio_path, base_name, []))
+            groups[-1][2].append((start_time, end_time, text))
+        
+        speed = float(self.concordance_speed_var.get().replace('x', ''))
+        token = self.concordance_token
+        self.concordance_preparing = True
+        self.concordance_label.config(text=f"正在准备 {len(hits)} 个例句（{len(groups)} 个文件）…")
+        self.concordance_pool.submit(self.build_concordance_batches, groups, speed, token)
+        self._concordance_job = self.after(100, self.update_concordance_state)
+    
+    def build_concordance_batches(self, groups, speed, token):
+        """后台线程：逐个文件用片段缓存截取该文件的所有例句（按时间定位读取，不解码整个文件），
+        拼成一个WAV批次"""
+        from tempfile import NamedTemporaryFile
+        gap_seconds = 0.4  # 例句之间的停顿
+        for audio_path, base_name, clips in groups:
+            if token != self.concordance_token:
+                return
+            temp_wav = None
+            try:
+                cached = self.decode_cache.cached_path(file_fingerprint(audio_path))
+                clip_paths = [self.clip_cache.render(cached or audio_path, start_time, end_time, speed)
+                              for start_time, end_time, _ in clips]
+                temp_wav = NamedTemporaryFile(delete=False, suffix='.wav')
+                temp_wav.close()
+                timeline = []  # (批次内开始秒数, 文本)
+                # 片段来自同一源文件，采样格式相同，逐个复制帧数据到批次文件
+                with wave.open(temp_wav.name, 'wb') as out:
+                    for clip_path, (_, _, text) in zip(clip_paths, clips):
+                        with wave.open(clip_path, 'rb') as clip:
+                            if not timeline:
+                                out.setparams(clip.getparams())
+                                frame_rate = clip.getframerate()
+                                gap = b'\0' * (int(gap_seconds * frame_rate) * clip.getnchannels() * clip.getsampwidth())
+                            timeline.append((out.tell() / frame_rate, f"{base_name}：{text}"))
+                            out.writeframes(clip.readframes(clip.getnframes()))
+                        out.writeframes(gap)
+                    duration = out.tell() / frame_rate
+            except Exception as e:
+                if temp_wav:
+                    self.remove_temp_file(temp_wav.name)
+                if not self._closing:
+                    self.after_idle(lambda name=base_name, error=str(e): self.on_concordance_batch_failed(token, name, error))
+                continue
+            result = {'path': temp_wav.name, 'duration': duration, 'timeline': timeline}
+            if not self._closing:
+                self.after_idle(lambda result=result: self.on_concordance_batch_ready(token, result))
+        if not self._closing:
+            self.after_idle(lambda: self.on_concordance_prepared(token))
+    
+    def on_concordance_batch_ready(self, token, batch):
+        if token != self.concordance_token:
+            self.remove_temp_file(batch['path'])
+            return
+        self.concordance_ready.append(batch)
+    
+    def on_concordance_batch_failed(self, token, base_name, error):
+        if token == self.concordance_token:
+            self.concordance_failures.append((base_name, error))
+    
+    def concordance_failure_note(self):
+        """生成失败的文件说明，附在连播状态后面"""
+        if not self.concordance_failures:
+            return ""
+        names = "、".join(name for name, _ in self.concordance_failures[:3])
+        more = " 等" if len(self.concordance_failures) > 3 else ""
+        return f"（{len(self.concordance_failures)} 个文件处理失败：{names}{more}）"
+    
+    def on_concordance_prepared(self, token):
+        if token == self.concordance_token:
+            self.concordance_preparing = False
+    
+    def update_concordance_state(self):
+        """定时检查连播进度：当前批次播完时切换到已排队的批次，并始终保持一个批次在排队"""
+        self._concordance_job = None
+        now = time.time()
+        current = self.concordance_current
+        busy = pygame.mixer.music.get_busy()
+        # 按时间推算当前批次已播完；没有排队的批次时以pygame停止播放为准
+        if current and (now - self.concordance_started_at >= current['duration']
+                        if self.concordance_queued else not busy):
+            # pygame 已自动切换到排队的批次；文件可能仍被打开，稍后再删除
+            self.concordance_finished.append(current['path'])
+            self.concordance_started_at += current['duration']
+            current = self.concordance_current = self.concordance_queued
+            self.concordance_queued = None
+            if current is None:
+                self.concordance_started_at = now
+        self.remove_finished_concordance_files(keep_last=busy)
+        if current is None and self.concordance_ready:
+            current = self.concordance_current = self.concordance_ready.pop(0)
+            pygame.mixer.music.load(current['path'])
+            pygame.mixer.music.play()
+            self.concordance_started_at = now
+        if current and self.concordance_queued is None and self.concordance_ready:
+            self.concordance_queued = self.concordance_ready.pop(0)
+            pygame.mixer.music.queue(self.concordance_queued['path'])
+        
+        if current:
+            elapsed = now - self.concordance_started_at
+            starts = [offset for offset, _ in current['timeline']]
+            index = max(0, bisect.bisect_right(starts, elapsed) - 1)
+            self.concordance_label.config(text=current['timeline'][index][1])
+        elif not self.concordance_preparing:
+            self.concordance_label.config(text="例句连播结束" + self.concordance_failure_note())
+            self.unload_music()  # Windows下已加载的文件无法删除
+            self.remove_finished_concordance_files(keep_last=False)
+            return
+        elif self.concordance_failures:
+            self.concordance_label.config(text="正在准备例句…" + self.concordance_failure_note())
+        self._concordance_job = self.after(100, self.update_concordance_state)
+    
+    def stop_concordance(self):
+        """停止连播并清理尚未播放的片段"""
+        self.concordance_token += 1
+        self.concordance_preparing = False
+        if self._concordance_job:
+            self.after_cancel(self._concordance_job)
+            self._concordance_job = None
+        batches = [self.concordance_current, self.concordance_queued] + self.concordance_ready
+        if self.concordance_current or self.concordance_finished:
+            pygame.mixer.music.stop()
+            self.unload_music()
+            self.concordance_label.config(text="")
+        self.concordance_current = self.concordance_queued = None
+        self.concordance_ready = []
+        self.concordance_failures = []
+        for batch in batches:
+            if batch:
+                self.remove_temp_file(batch['path'])
+        self.remove_finished_concordance_files(keep_last=False)
+    
+    def remove_finished_concordance_files(self, keep_last):
+        """删除已播完的批次文件
+
+        切换到排队批次的时间是按时长推算的，最近播完的一个可能仍在播放尾部，
+        keep_last 时保留到下一次切换（或pygame停止播放）再删除。删除失败（仍被占用）的下次再试。
+        """
+        finished = self.concordance_finished[:-1] if keep_last else self.concordance_finished
+        remaining = self.concordance_finished[len(finished):]
+        self.concordance_finished = [path for path in finished if not self.remove_temp_file(path)] + remaining
+    
+    def unload_music(self):
+        try:
+            pygame.mixer.music.unload()
+        except (AttributeError, pygame.error):
+            pass
+    
+    def remove_temp_file(self, path):
+        """删除临时文件，返回是否已不存在"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            return False
+        return True
+    
+    def open_sentence(self, audio_path, srt_path, sentence_index):
+        """加载音频和字幕，并从指定句子开始播放"""
+        self.stop_concordance()
+        if not (os.path.exists(audio_path) and self.subtitle_exists(srt_path)):
+            messagebox.showerror("文件未找到", f"文件已被移动或删除：\n{audio_path}", parent=self)
+            self.library_indexer.request_scan()
+            return
+        
+        self.finalize_current_audio_session()
+        
+        def on_loaded():
+            if self.lyrics:
+                index = max(0, min(sentence_index, len(self.lyrics) - 1))
+                start_time = self.lyrics.start(index)
+                self.seek_offset = start_time
+                self.pause_position = 0.0
+                self.progress_bar.set(start_time)
+            self.update_sentence_display()
+            self.show_player_view()
+            self.after(200, self.toggle_play_pause)
+        
+        try:
+            self.load_srt(srt_path)
+            self.load_audio(audio_path, on_loaded)
+        except Exception as e:
+            messagebox.showerror("加载错误", f"加载文件时出错：\n{str(e)}", parent=self)
+    
     def update_day_position(self):
         """根据窗口大小响应式更新DAY X的位置"""
         try:
@@ -1410,14 +1952,8 @@ class ListeningPlayer(tk.Tk):
             # 更新位置
             self.day_section.place(x=new_x, y=new_y)
             
-            # 更新DAY X标签的字体大小
-            if hasattr(self, 'day_label_main'):
-                day_font_size = int(32 * scale_ratio)
-                self.day_label_main.config(font=("Segoe UI", day_font_size, "bold"))
-            
-            if hasattr(self, 'day_label_sub'):
-                sub_font_size = int(16 * scale_ratio)
-                self.day_label_sub.config(font=("Segoe UI", sub_font_size, "bold"))
+            # DAY X标签引用共享字体，随缩放比例统一更新
+            self.scale_fonts(scale_ratio, names=('day_main', 'day_sub'))
             
         except Exception as e:
             # 如果更新位置时出错，静默处理
@@ -1429,6 +1965,7 @@ class ListeningPlayer(tk.Tk):
 
     def show_player_view(self):
         self.initial_frame.pack_forget()
+        self.search_frame.pack_forget()
         self.player_frame.pack(expand=True, fill=tk.BOTH)
         self.focus_set()
         self.update_player_state()
@@ -1443,6 +1980,8 @@ class ListeningPlayer(tk.Tk):
         self.is_paused = True
         self.is_loaded = False
         self.current_line_index = -1
+        self.audio_load_token += 1  # 放弃正在等待的转码结果
+        self.hide_review_bar()
 
         # --- MODIFIED: Reset loop state when going home ---
         self.is_looping_sentence = False
@@ -1459,17 +1998,7 @@ class ListeningPlayer(tk.Tk):
         self.progress_bar.set(0)
         self.time_label.config(text="00:00 / 00:00")
         
-        self.prev_line_text.config(state=tk.NORMAL)
-        self.prev_line_text.delete('1.0', tk.END)
-        self.prev_line_text.config(state=tk.DISABLED)
-        
-        self.current_line_text.config(state=tk.NORMAL)
-        self.current_line_text.delete('1.0', tk.END)
-        self.current_line_text.config(state=tk.DISABLED)
-        
-        self.next_line_text.config(state=tk.NORMAL)
-        self.next_line_text.delete('1.0', tk.END)
-        self.next_line_text.config(state=tk.DISABLED)
+        self.clear_subtitle_display()
         
         self.focus_set()
 
@@ -1501,16 +2030,101 @@ class ListeningPlayer(tk.Tk):
             return f"{int(m):02d}:{int(s):02d}"
 
     def update_initial_view_stats(self):
-        _, _, history_data = self.get_statistics()
-        for item in self.history_tree.get_children():
-            self.history_tree.delete(item)
-
-        for record in history_data:
-            db_id, audio_path, start_time_str, played_duration, total_audio_length = record
-            date_only = datetime.datetime.fromisoformat(start_time_str).strftime("%Y-%m-%d %H:%M")
-            audio_name = os.path.basename(audio_path)
-            formatted_audio_length = self.format_time(total_audio_length) 
-            self.history_tree.insert("", "end", iid=db_id, values=(date_only, audio_name, formatted_audio_length))
+        """刷新历史记录列表：首次加载第一页，之后只处理有变化的会话"""
+        if not self.history_loaded:
+            self.reload_history_view()
+            return
+        
+        with self.history_dirty_lock:
+            dirty_ids = self.history_dirty_ids
+            self.history_dirty_ids = set()
+        for db_id in dirty_ids:
+            record = self.get_history_record(db_id)
+            if record:
+                self.upsert_history_row(record)
+            else:
+                self.remove_history_row(db_id)
+    
+    def reload_history_view(self):
+        """清空历史列表并重新加载第一页"""
+        self.clear_history_view()
+        self.history_has_more = True
+        self.load_next_history_page()
+    
+    def clear_history_view(self):
+        """清空历史列表及其缓存"""
+        self.history_tree.delete(*self.history_tree.get_children())
+        self.history_order = []
+        self.history_keys = {}
+        self.history_paths = {}
+        with self.history_dirty_lock:
+            self.history_dirty_ids = set()
+        self.history_loaded = True
+        self.history_has_more = False
+    
+    def load_next_history_page(self):
+        """加载下一页更早的历史记录并追加到列表末尾"""
+        self.history_loading_page = False
+        if not self.history_has_more:
+            return
+        
+        before = self.history_order[0] if self.history_order else None
+        records = self.get_history_page(before)
+        self.history_has_more = len(records) == self.history_page_size
+        
+        page_keys = []
+        for record in records:
+            db_id, audio_path, start_time_str, _, _ = record
+            key = (start_time_str, db_id)
+            page_keys.append(key)
+            self.history_keys[db_id] = key
+            self.history_paths[db_id] = audio_path
+            self.history_tree.insert("", "end", iid=db_id, values=self.format_history_values(record))
+        # 新页的记录都比已加载的更早，整体放到升序列表的最前面
+        self.history_order[:0] = reversed(page_keys)
+    
+    def on_history_scroll(self, scrollbar, first, last):
+        """历史列表滚动回调：接近底部时加载下一页"""
+        scrollbar.set(first, last)
+        if self.history_has_more and not self.history_loading_page and float(last) > 0.9:
+            self.history_loading_page = True
+            self.after_idle(self.load_next_history_page)
+    
+    def format_history_values(self, record):
+        """将数据库记录格式化为历史列表的显示值"""
+        _, audio_path, start_time_str, _, total_audio_length = record
+        date_only = datetime.datetime.fromisoformat(start_time_str).strftime("%Y-%m-%d %H:%M")
+        audio_name = os.path.basename(audio_path)
+        formatted_audio_length = self.format_time(total_audio_length)
+        return (date_only, audio_name, formatted_audio_length)
+    
+    def upsert_history_row(self, record):
+        """插入或更新单条历史记录，保持开始时间倒序"""
+        db_id, audio_path, start_time_str, _, _ = record
+        values = self.format_history_values(record)
+        if db_id in self.history_keys:
+            self.history_tree.item(db_id, values=values)
+            return
+        
+        key = (start_time_str, db_id)
+        # 比已加载的最早记录还早的行会在后续分页中加载
+        if self.history_has_more and self.history_order and key < self.history_order[0]:
+            return
+        pos = bisect.bisect_left(self.history_order, key)
+        self.history_order.insert(pos, key)
+        self.history_keys[db_id] = key
+        self.history_paths[db_id] = audio_path
+        self.history_tree.insert("", len(self.history_order) - 1 - pos, iid=db_id, values=values)
+    
+    def remove_history_row(self, db_id):
+        """从历史列表中移除单条记录"""
+        key = self.history_keys.pop(int(db_id), None)
+        if key is None:
+            return
+        self.history_paths.pop(int(db_id), None)
+        pos = bisect.bisect_left(self.history_order, key)
+        del self.history_order[pos]
+        self.history_tree.delete(db_id)
 
     def delete_selected_history(self):
         selected_items = self.history_tree.selection()
@@ -1519,49 +2133,91 @@ class ListeningPlayer(tk.Tk):
             return
         if not messagebox.askyesno("确认删除", "您确定要删除选中的历史记录吗？", parent=self):
             return
-        cursor = self.db_conn.cursor()
-        for item_id in selected_items:
-            db_id = item_id 
-            cursor.execute("DELETE FROM sessions WHERE id = ?", (db_id,))
-            self.history_tree.delete(item_id)
-        self.db_conn.commit()
-        self.update_initial_view_stats()
+        session_ids = [int(item_id) for item_id in selected_items]
+        for db_id in session_ids:
+            # 已删除音频尚未写入的时长不再保留
+            self.pending_session_durations.pop(self.history_paths.get(db_id), None)
+            self.remove_history_row(db_id)
+        self.db_writer.submit(delete_sessions, session_ids)
 
     def clear_all_history(self):
         if not messagebox.askyesno("清空所有历史", "您确定要清空所有历史记录吗？此操作不可撤销！", parent=self):
             return
-        cursor = self.db_conn.cursor()
-        cursor.execute("DELETE FROM sessions")
-        self.db_conn.commit()
-        self.update_initial_view_stats()
+        self.pending_session_durations.clear()
+        self.db_writer.submit(clear_sessions)
+        self.clear_history_view()
     
+    def on_library_changed(self, changed, removed):
+        """音频库索引更新后的回调（在索引线程中调用），切回UI线程刷新打开的对话框"""
+        if not self._relinked:
+            # 首次扫描完成后索引中已有全部指纹：找回被移动/改名的音频，并为旧记录补全指纹。
+            # 读取文件计算指纹在这里（事务之外）完成，写线程只执行更新语句
+            self._relinked = True
+            relinks = find_moved_files(get_connection())
+            if any(relinks):
+                self.db_writer.submit(relink_moved_sessions, relinks, callback=self.mark_history_dirty)
+        if not self._closing:
+            self.after_idle(self.refresh_file_dialog)
+
+    def get_playback_path(self, path):
+        """返回可以立即用于播放和截取片段的文件，尚需转码时返回None
+
+        WAV和FLAC直接使用原文件；有解码缓存时用缓存的FLAC；
+        MP3/OGG先播放原文件，同时在后台转码（跳转更精确），下次打开即使用缓存。
+        """
+        if path.lower().endswith(('.wav', '.flac')):
+            return path
+        cached = self.decode_cache.cached_path(file_fingerprint(path))
+        if cached:
+            return cached
+        if path.lower().endswith(PYGAME_NATIVE_EXTENSIONS):
+            self.decode_cache.request(path, file_fingerprint(path))
+            return path
+        return None
+
+    def refresh_file_dialog(self):
+        if self._file_dialog_refresh:
+            self._file_dialog_refresh()
+
     def get_available_files(self):
+        # 索引已建立时直接读取，不再逐个检查文件
+        if self.library_indexer.ready.is_set():
+            try:
+                return get_library_files(self.db_conn)
+            except Exception:
+                pass
+        
         available_files = []
         try:
             if os.path.exists(self.audio_folder):
                 for filename in os.listdir(self.audio_folder):
-                    if filename.lower().endswith('.mp3'):
+                    if filename.lower().endswith(AUDIO_EXTENSIONS):
                         base_name = os.path.splitext(filename)[0]
                         audio_path = os.path.join(self.audio_folder, filename)
-                        srt_path = os.path.join(self.subtitle_folder, base_name + '.srt')
-                        
-                        if os.path.exists(srt_path):
-                            available_files.append((base_name, audio_path, srt_path))
+                        for ext in SUBTITLE_EXTENSIONS:
+                            srt_path = os.path.join(self.subtitle_folder, base_name + ext)
+                            if os.path.exists(srt_path):
+                                available_files.append((base_name, audio_path, srt_path))
+                                break
         except Exception as e:
             # print(f"扫描文件时出错: {e}")
             pass
         
+        available_files.sort()
         return available_files
 
     def show_file_selection_dialog(self):
+        # 先用当前索引打开对话框；监视器不可用时在后台检查文件夹变化
+        if not self.folder_watcher.running:
+            self.library_indexer.request_scan()
         available_files = self.get_available_files()
         
         if not available_files:
             messagebox.showinfo("无可用文件", 
                               "未找到可用的音频文件和字幕文件对。\n\n"
                               "请确保：\n"
-                              "1. 将.mp3文件放入'音频'文件夹\n"
-                              "2. 将.srt文件放入'字幕'文件夹\n"
+                              "1. 将音频文件（mp3、m4a、flac、wav、mp4等）放入'音频'文件夹\n"
+                              "2. 将字幕文件（srt、vtt、lrc、ass）放入'字幕'文件夹\n"
                               "3. 音频和字幕文件名相同", parent=self)
             return
         
@@ -1595,16 +2251,23 @@ class ListeningPlayer(tk.Tk):
         dialog.grab_set()
         
         title_label = tk.Label(dialog, text="请选择要播放的音频文件", 
-                              font=("Segoe UI", 16), 
+                              font=self.fonts['dialog_title'], 
                               bg=self.colors['bg'], 
                               fg=self.colors['text_primary'])
         title_label.pack(pady=(20, 10))
         
+        # 输入即筛选：前缀匹配优先，其次是包含输入内容的文件名
+        search_var = tk.StringVar()
+        search_entry = ttk.Entry(dialog, textvariable=search_var, font=self.fonts['list'])
+        search_entry.pack(fill=tk.X, padx=20, pady=(0, 10))
+        
         list_frame = tk.Frame(dialog, bg=self.colors['bg'])
         list_frame.pack(expand=True, fill=tk.BOTH, padx=20, pady=(0, 20))
         
+        # 虚拟列表：Listbox 只保存当前可见的几行，滚动和筛选时重新填充这几行，
+        # 文件数量再多打开对话框也不需要逐条插入
         listbox = tk.Listbox(list_frame, 
-                            font=("Segoe UI", 12),
+                            font=self.fonts['list'],
                             bg=self.colors['bg_primary'],
                             fg=self.colors['text_primary'],
                             selectbackground=self.colors['bg_secondary'],
@@ -1612,33 +2275,143 @@ class ListeningPlayer(tk.Tk):
                             activestyle='none',
                             relief='flat',
                             borderwidth=1,
-                            highlightthickness=0)
+                            highlightthickness=0,
+                            exportselection=False,
+                            height=1)
         listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
-        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=listbox.yview)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        listbox.config(yscrollcommand=scrollbar.set)
+        row_height = (self.fonts['list'].metrics('linespace')
+                      + 2 * int(listbox.cget('selectborderwidth')))
+        name_index = NameIndex([base_name for base_name, _, _ in available_files])
+        matches = list(range(len(available_files)))  # 当前筛选结果（available_files 的下标）
+        top = 0       # 第一行可见项在 matches 中的位置
+        selected = 0  # 选中项在 matches 中的位置
+        rows = 1      # 可见行数
+        
+        def render():
+            nonlocal top
+            total = len(matches)
+            top = max(0, min(top, total - rows))
+            listbox.delete(0, tk.END)
+            if total:
+                listbox.insert(0, *[available_files[i][0] for i in matches[top:top + rows]])
+                if top <= selected < top + rows:
+                    listbox.selection_set(selected - top)
+                scrollbar.set(top / total, min(1.0, (top + rows) / total))
+            else:
+                scrollbar.set(0.0, 1.0)
+            count_label.config(text=f"{total} / {len(available_files)}")
+        
+        def ensure_visible():
+            nonlocal top
+            if selected < top:
+                top = selected
+            elif selected >= top + rows:
+                top = selected - rows + 1
+        
+        def on_list_configure(event):
+            nonlocal rows
+            border = 2 * (int(listbox.cget('borderwidth')) + int(listbox.cget('highlightthickness')))
+            rows = max(1, (event.height - border) // row_height)
+            ensure_visible()
+            render()
+        
+        def on_scrollbar(action, amount, unit=None):
+            nonlocal top
+            if action == 'moveto':
+                top = int(float(amount) * len(matches))
+            else:
+                top += int(amount) * (rows if unit == 'pages' else 1)
+            render()
         
-        for base_name, _, _ in available_files:
-            listbox.insert(tk.END, base_name)
+        def on_mousewheel(event):
+            nonlocal top
+            if event.num == 4 or getattr(event, 'delta', 0) > 0:
+                top -= 3
+            else:
+                top += 3
+            render()
+            return "break"
         
-        if available_files:
-            listbox.selection_set(0)
+        def move_selection(delta):
+            nonlocal selected
+            if matches:
+                selected = max(0, min(len(matches) - 1, selected + delta))
+                ensure_visible()
+                render()
+            return "break"
+        
+        def on_click(event):
+            nonlocal selected
+            if matches:
+                selected = min(top + listbox.nearest(event.y), len(matches) - 1)
+                render()
+            search_entry.focus_set()
+            return "break"
+        
+        def apply_filter(*_):
+            nonlocal matches, top, selected
+            matches = name_index.search(search_var.get())
+            top = selected = 0
+            render()
+        
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=on_scrollbar)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        def refresh():
+            """索引变化后重建筛选索引，按当前输入重新筛选并尽量保持选中项"""
+            nonlocal available_files, name_index, matches, selected
+            new_files = self.get_available_files()
+            if new_files == available_files:
+                return
+            selected_path = available_files[matches[selected]][1] if matches else None
+            available_files = new_files
+            name_index = NameIndex([base_name for base_name, _, _ in available_files])
+            matches = name_index.search(search_var.get())
+            selected = 0
+            for pos, i in enumerate(matches):
+                if available_files[i][1] == selected_path:
+                    selected = pos
+                    break
+            ensure_visible()
+            render()
+        
+        self._file_dialog_refresh = refresh
+        
+        def on_destroy(event):
+            if event.widget is dialog:
+                self._file_dialog_refresh = None
+        
+        dialog.bind('<Destroy>', on_destroy)
         
         button_frame = tk.Frame(dialog, bg=self.colors['bg'])
         button_frame.pack(fill=tk.X, padx=20, pady=20)
         
+        count_label = tk.Label(button_frame, font=self.fonts['list_info'],
+                               bg=self.colors['bg'], fg=self.colors['text_secondary'])
+        count_label.pack(side=tk.LEFT)
+        
         def on_ok():
-            selection = listbox.curselection()
-            if selection:
-                _, audio_path, srt_path = available_files[selection[0]]
+            if matches:
+                _, audio_path, srt_path = available_files[matches[selected]]
+                if not (os.path.exists(audio_path) and self.subtitle_exists(srt_path)):
+                    # 索引落后于文件夹：提示后重新扫描
+                    messagebox.showerror("文件未找到", f"文件已被移动或删除：\n{audio_path}", parent=dialog)
+                    self.library_indexer.request_scan()
+                    return
                 dialog.destroy()
                 self.load_selected_files(audio_path, srt_path)
         
         def on_cancel():
             dialog.destroy()
         
+        search_var.trace_add('write', apply_filter)
+        listbox.bind('<Configure>', on_list_configure)
+        listbox.bind('<Button-1>', on_click)
         listbox.bind('<Double-1>', lambda e: on_ok())
+        listbox.bind('<MouseWheel>', on_mousewheel)
+        listbox.bind('<Button-4>', on_mousewheel)
+        listbox.bind('<Button-5>', on_mousewheel)
         
         ok_button = ttk.Button(button_frame, text="确定", command=on_ok, style="Primary.TButton")
         ok_button.pack(side=tk.RIGHT, padx=(10, 0))
@@ -1648,8 +2421,13 @@ class ListeningPlayer(tk.Tk):
         
         dialog.bind('<Return>', lambda e: on_ok())
         dialog.bind('<Escape>', lambda e: on_cancel())
+        dialog.bind('<Up>', lambda e: move_selection(-1))
+        dialog.bind('<Down>', lambda e: move_selection(1))
+        dialog.bind('<Prior>', lambda e: move_selection(-rows))
+        dialog.bind('<Next>', lambda e: move_selection(rows))
         
-        listbox.focus_set()
+        render()
+        search_entry.focus_set()
         
         # 2. 所有内容都配置好后，再将窗口显示出来
         dialog.deiconify()
@@ -1657,11 +2435,13 @@ class ListeningPlayer(tk.Tk):
     def load_selected_files(self, audio_path, srt_path):
         self.finalize_current_audio_session()
         
+        def on_loaded():
+            self.update_sentence_display()
+            self.show_player_view()
+        
         try:
             self.load_srt(srt_path)
-            if self.load_audio(audio_path):
-                self.update_sentence_display()
-                self.show_player_view()
+            self.load_audio(audio_path, on_loaded)
         except Exception as e:
             messagebox.showerror("加载错误", f"加载文件时出错：\n{str(e)}", parent=self)
     
@@ -1669,43 +2449,17 @@ class ListeningPlayer(tk.Tk):
         self.show_file_selection_dialog()
 
     def load_srt(self, path):
-        """解析 SRT 字幕文件"""
-        self.lyrics = []
-        
-        def srt_time_to_seconds(time_str):
-            """将 'HH:MM:SS,ms' 格式的时间转换为秒"""
-            parts = time_str.replace(',', ':').split(':')
-            return int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2]) + int(parts[3]) / 1000.0
-
-        try:
-            with open(path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            srt_pattern = re.compile(r'(\d+)\s*\n(\d{2}:\d{2}:\d{2},\d{3})\s*-->\s*(\d{2}:\d{2}:\d{2},\d{3})\s*\n(.*?)(?=\n\n|\Z)', re.S)
-            matches = srt_pattern.finditer(content)
-
-            for match in matches:
-                start_time_str = match.group(2)
-                text = match.group(4).strip().replace('\n', ' ')
-                
-                time_in_seconds = srt_time_to_seconds(start_time_str)
-                self.lyrics.append((time_in_seconds, text))
-        
-        except Exception as e:
-            print(f"使用正则表达式解析SRT失败: {e}，尝试备用方法。")
-            try:
-                blocks = content.strip().split('\n\n')
-                for block in blocks:
-                    lines = block.strip().split('\n')
-                    if len(lines) >= 3:
-                        time_line = lines[1]
-                        if '-->' in time_line:
-                            start_time_str = time_line.split('-->')[0].strip()
-                            text = ' '.join(lines[2:])
-                            time_in_seconds = srt_time_to_seconds(start_time_str)
-                            self.lyrics.append((time_in_seconds, text))
-            except Exception as backup_e:
-                raise IOError(f"无法解析SRT文件: {path}\n主错误: {e}\n备用错误: {backup_e}")
+        """解析字幕文件（SRT/VTT/LRC/ASS，或读取已缓存的视频内嵌字幕）"""
+        self.lyrics = SubtitleTrack()
+        self._rendered_line_index = None  # 字幕已更换，强制下次刷新重新渲染
+        if is_embedded_subtitle(path):
+            self.lyrics = load_embedded_subtitle(self.db_conn, path)
+        else:
+            self.lyrics = load_subtitle(path)
+    
+    def subtitle_exists(self, path):
+        """字幕文件是否存在；内嵌字幕保存在数据库中，视为存在"""
+        return is_embedded_subtitle(path) or os.path.exists(path)
     
     def on_history_double_click(self, event):
         selected_items = self.history_tree.selection()
@@ -1714,44 +2468,120 @@ class ListeningPlayer(tk.Tk):
         db_id = item_id 
         
         cursor = self.db_conn.cursor()
-        cursor.execute("SELECT audio_path FROM sessions WHERE id = ?", (db_id,))
+        cursor.execute("SELECT audio_path, fingerprint FROM sessions WHERE id = ?", (db_id,))
         result = cursor.fetchone()
         
         if result:
-            audio_path = result[0]
+            audio_path, fingerprint = result
             if not os.path.exists(audio_path):
-                messagebox.showerror("文件未找到", f"音频文件未找到：\n{audio_path}")
-                return
+                # 文件可能被移动或改名：按内容指纹在音频文件夹中查找
+                moved_path = None
+                if fingerprint:
+                    # 先查音频库索引，索引尚未建好时再扫描音频文件夹
+                    moved_path = (find_library_path(self.db_conn, fingerprint)
+                                  or find_file_by_fingerprint(self.audio_folder, fingerprint, AUDIO_EXTENSIONS))
+                if not moved_path:
+                    messagebox.showerror("文件未找到", f"音频文件未找到：\n{audio_path}")
+                    return
+                audio_path = moved_path
+                self.db_writer.submit(update_session_path, int(db_id), audio_path,
+                                      callback=lambda session_id: self.mark_history_dirty([session_id]))
             
             audio_filename = os.path.splitext(os.path.basename(audio_path))[0]
             
-            srt_path = os.path.splitext(audio_path)[0] + ".srt"
+            # 依次查找音频旁边和字幕文件夹中的同名字幕（任一支持的格式）
+            candidates = [os.path.splitext(audio_path)[0] + ext for ext in SUBTITLE_EXTENSIONS]
+            candidates += [os.path.join(self.subtitle_folder, audio_filename + ext) for ext in SUBTITLE_EXTENSIONS]
+            srt_path = next((path for path in candidates if os.path.exists(path)), None)
             
-            if not os.path.exists(srt_path):
-                srt_path = os.path.join(self.subtitle_folder, audio_filename + ".srt")
+            if srt_path is None:
+                # 音频库索引中的配对（包括视频的内嵌字幕）
+                srt_path = get_library_subtitle(self.db_conn, audio_path)
                 
-                if not os.path.exists(srt_path):
-                    messagebox.showerror("文件未找到", f"对应的SRT字幕文件未找到：\nSearched in:\n- {os.path.splitext(audio_path)[0]}.srt\n- {srt_path}")
+                if not srt_path or not self.subtitle_exists(srt_path):
+                    messagebox.showerror("文件未找到", f"对应的字幕文件未找到：\nSearched in:\n- {os.path.dirname(audio_path)}\n- {self.subtitle_folder}")
                     return
             
             self.finalize_current_audio_session()
             
+            def on_loaded():
+                self.update_sentence_display()
+                self.show_player_view()
+                self.after(200, self.toggle_play_pause)
+            
             try:
                 self.load_srt(srt_path)
-                if self.load_audio(audio_path):
-                    self.update_sentence_display()
-                    self.show_player_view()
-                    self.after(200, self.toggle_play_pause)
-                else:
-                    messagebox.showerror("加载失败", f"无法加载音频文件：\n{os.path.basename(audio_path)}")
+                self.load_audio(audio_path, on_loaded)
             except Exception as e:
                 messagebox.showerror("加载错误", f"加载时出现错误：\n{str(e)}")
 
-    def load_audio(self, path):
+    def load_audio(self, path, on_loaded):
+        """加载音频，完成后调用 on_loaded()
+
+        pygame不能直接播放的格式第一次打开时，播放界面先显示“正在准备”，
+        后台转码完成后再加载（界面不会卡住）。
+        """
+        self.audio_load_token += 1
+        try:
+            playback_path = self.get_playback_path(path)
+        except Exception as e:
+            messagebox.showerror("Audio Error", f"Could not decode audio file: {e}")
+            self.is_loaded = False
+            return
+        if playback_path is not None:
+            if self.open_playback_file(path, playback_path):
+                on_loaded()
+            return
+
+        token = self.audio_load_token
+        self.show_audio_preparing(path)
+
+        def on_decoded(cached_path, error):
+            # 在转码线程中调用
+            if not self._closing:
+                self.after_idle(lambda: self.on_audio_decoded(token, path, cached_path, error, on_loaded))
+
+        self.decode_cache.request(path, file_fingerprint(path), callback=on_decoded)
+
+    def show_audio_preparing(self, path):
+        """第一次打开需要转码的音频：显示播放界面和准备中的提示，转码期间播放控制不可用"""
+        pygame.mixer.music.stop()
+        self.is_loaded = False
+        self.is_paused = True
+        self.play_pause_btn.config(text="▶ 播放")
+        self.progress_bar.set(0)
+        self.time_label.config(text="准备中…")
+        self.clear_subtitle_display()
+        self.set_subtitle_text(self.current_line_text,
+                               f"正在转换音频格式：{os.path.basename(path)}\n（只在第一次打开时需要）", "justified")
+        self._rendered_lines = ("", None, "")  # 提示不是字幕，加载后必须重新渲染
+        self.show_player_view()
+
+    def on_audio_decoded(self, token, path, cached_path, error, on_loaded):
+        """后台转码结束（UI线程）：仍在等待这个文件时加载并继续"""
+        if token != self.audio_load_token:
+            return  # 已返回主页或改为打开其他文件
+        if cached_path is None:
+            self.clear_subtitle_display()
+            self.time_label.config(text="00:00 / 00:00")
+            messagebox.showerror("Audio Error", f"Could not decode audio file: {error}", parent=self)
+            self.back_to_home()
+            return
+        self.clear_subtitle_display()
+        if self.open_playback_file(path, cached_path):
+            on_loaded()
+
+    def open_playback_file(self, path, playback_path):
+        """用 playback_path 加载音频 path，返回是否成功"""
         try:
-            pygame.mixer.music.load(path)
-            audio = pygame.mixer.Sound(path)
-            total_length = audio.get_length()
+            pygame.mixer.music.load(playback_path)
+            # 时长缓存在音频库索引中，避免每次都把整个文件解码到内存
+            total_length = get_cached_duration(self.db_conn, path)
+            if total_length is None:
+                total_length = audio_file_duration(playback_path)
+                if total_length is None:
+                    total_length = pygame.mixer.Sound(playback_path).get_length()
+                self.db_writer.submit(set_cached_duration, path, total_length)
             self.progress_bar.config(to=total_length)
             self.time_label.config(text=f"00:00 / {self.format_time(total_length)}")
             self.is_loaded = True
@@ -1759,19 +2589,21 @@ class ListeningPlayer(tk.Tk):
             self.play_pause_btn.config(text="▶ 播放")
             
             self.current_audio_path = path
+            self.current_playback_path = playback_path
+            # 正在使用的解码缓存不参与淘汰（之后截取片段仍要读取它）
+            self.decode_cache.pin(playback_path)
             self.current_audio_total_length = total_length
             self.current_segment_start_time = None
             
-            cursor = self.db_conn.cursor()
-            cursor.execute("SELECT id, duration FROM sessions WHERE audio_path = ?", (path,))
-            existing_session = cursor.fetchone()
-            
-            if existing_session:
-                self.current_session_db_id = existing_session[0]
-                self.current_audio_accumulated_duration = existing_session[1]
+            # 优先使用尚未写入数据库的最新时长
+            pending_duration = self.pending_session_durations.get(path)
+            if pending_duration is not None:
+                self.current_audio_accumulated_duration = pending_duration
             else:
-                self.current_session_db_id = None
-                self.current_audio_accumulated_duration = 0.0
+                # 按路径查找，找不到时按内容指纹匹配被移动过的文件
+                existing_session = find_session_by_path(self.db_conn, path)
+                self.current_audio_accumulated_duration = existing_session[1] if existing_session else 0.0
+            self.current_audio_saved_duration = self.current_audio_accumulated_duration
             return True
         except pygame.error as e:
             messagebox.showerror("Audio Error", f"Could not load audio file: {e}")
@@ -1800,7 +2632,7 @@ class ListeningPlayer(tk.Tk):
             
             # 确保加载正确的音频文件
             try:
-                pygame.mixer.music.load(self.current_audio_path)
+                pygame.mixer.music.load(self.current_playback_path)
             except Exception as e:
                 pass
             
@@ -1839,7 +2671,7 @@ class ListeningPlayer(tk.Tk):
         if not self.is_paused:
             # 确保加载正确的音频文件
             try:
-                pygame.mixer.music.load(self.current_audio_path)
+                pygame.mixer.music.load(self.current_playback_path)
             except Exception as e:
                 pass
             pygame.mixer.music.play(start=seek_time)
@@ -1884,6 +2716,7 @@ class ListeningPlayer(tk.Tk):
         if not self.is_loaded:
             messagebox.showinfo("提示", "请先加载音频文件再使用听写功能。", parent=self)
             return
+        self.end_review_session()
         
         # 切换到听写界面
         self.show_dictation_view()
@@ -1978,6 +2811,14 @@ class ListeningPlayer(tk.Tk):
                                             width=12)
         self.dictation_play_btn.pack(side=tk.LEFT, padx=(0, 10))
         
+        # 听写语速：片段按所选语速预先渲染
+        self.dictation_speed_var = tk.StringVar(value="1.0x")
+        dictation_speed_combobox = ttk.Combobox(buttons_container, textvariable=self.dictation_speed_var,
+                                                state="readonly", width=6, font=self.fonts['combobox'],
+                                                values=["0.5x", "0.75x", "1.0x", "1.25x", "1.5x", "2.0x"])
+        dictation_speed_combobox.pack(side=tk.LEFT, padx=(0, 10), pady=(2, 0))
+        dictation_speed_combobox.bind("<<ComboboxSelected>>", self.on_dictation_speed_change)
+        
         self.dictation_submit_btn = ttk.Button(buttons_container, text="✔️ 提交答案", 
                                               command=self.submit_dictation_answer,
                                               style="Control.TButton",
@@ -2032,16 +2873,11 @@ class ListeningPlayer(tk.Tk):
         # Ensure playback is independent in dictation mode
         pygame.mixer.music.stop()
         
-        # 初始化听写状态
+        # 初始化听写状态（有保存的进度时从上次停下的句子继续）
         self.is_dictation_mode = True
-        self.dictation_current_sentence = 0
-        self.dictation_results = []
-        self.dictation_stats = {
-            'total_chars': 0,
-            'correct_chars': 0,
-            'total_sentences': 0,
-            'correct_sentences': 0
-        }
+        self.dictation_paused_manually = False
+        self.restore_dictation_progress()
+        self.prefetch_dictation_clips()
         
         # 更新界面显示
         self.update_dictation_display()
@@ -2049,6 +2885,53 @@ class ListeningPlayer(tk.Tk):
         # 聚焦到输入框
         self.dictation_input.focus_set()
     
+    def restore_dictation_progress(self):
+        """读取当前音频保存的听写进度（按主键直接读取），恢复当前句子、统计和已提交的答案"""
+        self.dictation_current_sentence = 0
+        self.dictation_results = []
+        self.dictation_stats = dict.fromkeys(DICTATION_STAT_KEYS, 0)
+        self.dictation_input.delete("1.0", tk.END)
+        self.dictation_next_btn.config(state=tk.DISABLED)
+        
+        progress = None
+        if self.current_audio_path:
+            # 先写入尚在队列中的提交（刚退出又重新进入听写时），再读取进度
+            self.db_writer.flush(wait=True, timeout=2.0)
+            progress = load_dictation_progress(self.db_conn, self.current_audio_path)
+        current_answer = None
+        if progress:
+            current_sentence, stats, answers = progress
+            self.dictation_current_sentence = min(current_sentence, len(self.lyrics))
+            self.dictation_stats.update(stats)
+            for sentence_index, user_input, similarity, wer in answers:
+                if sentence_index >= len(self.lyrics):
+                    continue
+                self.dictation_results.append({
+                    'sentence_index': sentence_index,
+                    'correct_text': self.lyrics.text(sentence_index),
+                    'user_input': user_input,
+                    'similarity': similarity,
+                    'wer': wer
+                })
+                if sentence_index == self.dictation_current_sentence:
+                    current_answer = user_input
+        
+        if current_answer is not None:
+            # 上次提交后没有进入下一句：恢复答案和对比结果
+            self.dictation_input.insert("1.0", current_answer)
+            self.compare_and_display_result(
+                align_dictation(current_answer, self.lyrics.text(self.dictation_current_sentence)))
+            self.dictation_next_btn.config(state=tk.NORMAL)
+            return
+        
+        self.dictation_result_text.config(state=tk.NORMAL)
+        self.dictation_result_text.delete("1.0", tk.END)
+        if progress and self.dictation_current_sentence < len(self.lyrics):
+            self.dictation_result_text.insert(
+                tk.END, f"已恢复上次的听写进度，从第 {self.dictation_current_sentence + 1} 句继续。\n\n")
+        self.dictation_result_text.insert(tk.END, "请先播放句子，然后输入您听到的内容。")
+        self.dictation_result_text.config(state=tk.DISABLED)
+    
     def hide_dictation_view(self):
         """隐藏听写练习界面"""
         self.dictation_frame.pack_forget()
@@ -2064,7 +2947,7 @@ class ListeningPlayer(tk.Tk):
         
         # 重新加载原始音频文件，确保切换回正常音频
         try:
-            pygame.mixer.music.load(self.current_audio_path)
+            pygame.mixer.music.load(self.current_playback_path)
         except Exception as e:
             pass
         
@@ -2188,7 +3071,7 @@ class ListeningPlayer(tk.Tk):
         self.create_dictation_ui()
     
     def play_dictation_sentence(self):
-        """播放当前听写句子，支持从暂停处继续"""
+        """播放当前听写句子的片段，支持从暂停处继续"""
         if not self.lyrics or self.dictation_current_sentence >= len(self.lyrics):
             return
 
@@ -2197,62 +3080,101 @@ class ListeningPlayer(tk.Tk):
             self.pause_dictation_sentence()
             return
 
-        # 获取句子的基础起止时间
-        base_start_time = self.lyrics[self.dictation_current_sentence][0]
-        if self.dictation_current_sentence < len(self.lyrics) - 1:
-            end_time = self.lyrics[self.dictation_current_sentence + 1][0]
-        else:
-            end_time = self.current_audio_total_length
-        
-        # 如果是手动暂停后继续，则从暂停点开始
+        # 手动暂停后继续：片段仍在播放器中
         if self.dictation_paused_manually:
-            start_offset = self.dictation_pause_time
-            start_time = base_start_time + start_offset
-        else:  # 否则从头开始
-            self.dictation_pause_time = 0.0
-            start_time = base_start_time
-
-        duration = end_time - start_time
-        if duration <= 0:
+            pygame.mixer.music.unpause()
+            self.on_dictation_clip_started()
+            return
+
+        start_time, end_time = self.get_sentence_bounds(self.dictation_current_sentence)
+        if end_time - start_time <= 0:
             self.pause_dictation_playback() # 如果时长无效，直接处理为播放结束
             return
-            
-        # 每次播放前都重新加载，确保pygame.mixer.music控制的是正确的音频和状态
+        
+        clip_path = self.clip_cache.cached_clip(self.current_playback_path, start_time, end_time, self.dictation_speed)
+        if clip_path:
+            self.start_dictation_clip(clip_path)
+            return
+        
+        # 片段尚未渲染（例如刚切换语速）：后台渲染完成后再播放
+        self.dictation_play_btn.config(text="⏳ 准备中...", state=tk.DISABLED)
+        sentence_index, speed = self.dictation_current_sentence, self.dictation_speed
+        future = self.thread_pool.submit(self.clip_cache.render, self.current_playback_path,
+                                         start_time, end_time, speed)
+        future.add_done_callback(
+            lambda f: None if self._closing else self.after_idle(self.on_dictation_clip_ready, f, sentence_index, speed))
+        self.prefetch_dictation_clips()
+    
+    def on_dictation_clip_ready(self, future, sentence_index, speed):
+        """后台渲染的片段完成（主线程）；期间切换了句子或语速时不播放"""
+        if self.dictation_sentence_playing:
+            return
+        self.dictation_play_btn.config(text="🔊 播放句子", state=tk.NORMAL)
         try:
-            pygame.mixer.music.load(self.current_audio_path)
-            pygame.mixer.music.play(start=start_time)
+            clip_path = future.result()
+        except Exception as e:
+            messagebox.showerror("播放错误", f"无法生成句子片段：{e}", parent=self)
+            return
+        if self.is_dictation_mode and sentence_index == self.dictation_current_sentence and speed == self.dictation_speed:
+            self.start_dictation_clip(clip_path)
+    
+    def start_dictation_clip(self, clip_path):
+        """从头播放一个句子片段"""
+        try:
+            pygame.mixer.music.load(clip_path)
+            pygame.mixer.music.play()
         except Exception as e:
             messagebox.showerror("播放错误", f"无法播放音频片段：{e}", parent=self)
             return
-        
-        # 更新状态
-        self.dictation_play_start_time = time.time()
+        self.on_dictation_clip_started()
+    
+    def on_dictation_clip_started(self):
+        self.is_paused = False
         self.dictation_sentence_playing = True
         self.dictation_paused_manually = False
         self.dictation_play_btn.config(text="⏸ 暂停播放")
-
-        # 设置自动暂停任务
         if self.dictation_auto_pause_job:
             self.after_cancel(self.dictation_auto_pause_job)
-        # 增加100ms缓冲，防止提前触发
-        self.dictation_auto_pause_job = self.after(int(duration * 1000 + 100), self.pause_dictation_playback)
+        self.dictation_auto_pause_job = self.after(100, self.check_dictation_clip_finished)
+    
+    def check_dictation_clip_finished(self):
+        """片段播放到末尾后恢复按钮状态（片段本身在句子结束处停止，这里只更新界面）"""
+        if pygame.mixer.music.get_busy():
+            self.dictation_auto_pause_job = self.after(100, self.check_dictation_clip_finished)
+            return
+        self.dictation_auto_pause_job = None
+        self.pause_dictation_playback()
+    
+    def prefetch_dictation_clips(self):
+        """在后台预先渲染当前句子和后面几句的片段，学习者输入时即可准备好"""
+        if not self.lyrics or not self.current_playback_path:
+            return
+        last = min(len(self.lyrics), self.dictation_current_sentence + self.dictation_prefetch_count + 1)
+        for index in range(self.dictation_current_sentence, last):
+            start_time, end_time = self.get_sentence_bounds(index)
+            if end_time > start_time:
+                self.clip_cache.prefetch(self.current_playback_path, start_time, end_time, self.dictation_speed)
+    
+    def on_dictation_speed_change(self, event=None):
+        try:
+            self.dictation_speed = float(self.dictation_speed_var.get().replace("x", ""))
+        except ValueError:
+            self.dictation_speed = 1.0
+        # 已加载的是旧语速的片段，停止后按新语速重新准备
+        self.stop_dictation_playback()
+        self.prefetch_dictation_clips()
+        self.dictation_input.focus_set()
     
     def pause_dictation_sentence(self):
         """手动暂停听写句子播放"""
-        if hasattr(self, 'dictation_auto_pause_job') and self.dictation_auto_pause_job:
-            # 取消自动暂停任务
+        if self.dictation_auto_pause_job:
             self.after_cancel(self.dictation_auto_pause_job)
             self.dictation_auto_pause_job = None
         
-        # 计算已播放时间并保存为暂停点
-        if hasattr(self, 'dictation_play_start_time') and self.dictation_play_start_time:
-            elapsed_time = time.time() - self.dictation_play_start_time
-            self.dictation_pause_time += elapsed_time  # 累加到已有的暂停时间
-            self.dictation_paused_manually = True
-        
         pygame.mixer.music.pause()
         self.is_paused = True
         self.dictation_sentence_playing = False
+        self.dictation_paused_manually = True
         self.dictation_play_btn.config(text="🔊 播放句子", state=tk.NORMAL)
     
     def pause_dictation_playback(self):
@@ -2260,6 +3182,7 @@ class ListeningPlayer(tk.Tk):
         pygame.mixer.music.pause()
         self.is_paused = True
         self.dictation_sentence_playing = False
+        self.dictation_paused_manually = False
         self.dictation_play_btn.config(text="🔊 播放句子", state=tk.NORMAL)
         self.dictation_auto_pause_job = None
     
@@ -2274,6 +3197,7 @@ class ListeningPlayer(tk.Tk):
         pygame.mixer.music.stop()
         self.is_paused = True
         self.dictation_sentence_playing = False
+        self.dictation_paused_manually = False
         
         # 重置播放按钮状态
         if hasattr(self, 'dictation_play_btn'):
@@ -2294,16 +3218,17 @@ class ListeningPlayer(tk.Tk):
         if self.dictation_current_sentence >= len(self.lyrics):
             return
         
-        correct_text = self.lyrics[self.dictation_current_sentence][1]
+        correct_text = self.lyrics.text(self.dictation_current_sentence)
         
-        # 比较文本并显示结果（不区分大小写）
-        self.compare_and_display_result(user_input, correct_text)
+        # 只对齐一次（不区分大小写），显示和统计共用同一结果
+        alignment = align_dictation(user_input, correct_text)
+        self.compare_and_display_result(alignment)
         
         # 启用下一句按钮
         self.dictation_next_btn.config(state=tk.NORMAL)
         
         # 更新统计
-        self.update_dictation_stats(user_input, correct_text)
+        self.update_dictation_stats(alignment)
     
     def submit_dictation_on_enter_input(self, event=None):
         self.submit_dictation_answer()
@@ -2313,82 +3238,58 @@ class ListeningPlayer(tk.Tk):
         self.submit_dictation_answer()
         return "break"
 
-    def compare_and_display_result(self, user_input, correct_text):
-        """比较用户输入和正确答案，显示差异（不区分大小写）"""
-        import difflib
-        
-        # 转换为小写进行比较
-        user_lower = user_input.lower()
-        correct_lower = correct_text.lower()
+    def compare_and_display_result(self, alignment):
+        """显示用户输入和正确答案的差异（不区分大小写）
+
+        先生成完整文本和各标签的区间，再一次插入、每个标签一次设置，Tcl 调用次数与答案长度无关。
+        """
+        render_start = time.perf_counter()
+        text, tag_ranges = build_result_markup(alignment)
         
-        # 清空结果显示区域
         self.dictation_result_text.config(state=tk.NORMAL)
         self.dictation_result_text.delete("1.0", tk.END)
-        
-        # 添加标题
-        self.dictation_result_text.insert(tk.END, "正确答案：\n", "correct")
-        self.dictation_result_text.insert(tk.END, correct_text + "\n\n", "correct")
-        
-        self.dictation_result_text.insert(tk.END, "您的答案：\n", "user_answer")
-        self.dictation_result_text.insert(tk.END, user_input + "\n\n", "user_answer")
-        
-        # 使用difflib进行字符级别的比较
-        self.dictation_result_text.insert(tk.END, "详细对比：\n", "header")
-        
-        # 简单的字符匹配对比
-        correct_chars = list(correct_text)
-        user_chars = list(user_input)
-        
-        # 使用difflib的SequenceMatcher（基于小写版本）
-        matcher = difflib.SequenceMatcher(None, user_lower, correct_lower)
-        
-        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
-            if tag == 'equal':
-                # 正确的字符
-                text = ''.join(correct_chars[j1:j2])  # 使用用户输入的字符保持原始大小写
-                self.dictation_result_text.insert(tk.END, text, "correct")
-            elif tag == 'replace':
-                # 替换（错误）- 显示用户错误的部分为红色
-                user_part = ''.join(user_chars[j1:j2])
-                self.dictation_result_text.insert(tk.END, user_part, "incorrect")
-            elif tag == 'delete':
-                # 缺失的字符 - 显示正确答案中缺失的部分
-                missing_text = ''.join(correct_chars[i1:i2])
-                self.dictation_result_text.insert(tk.END, missing_text, "missing")
-            elif tag == 'insert':
-                # 多余的字符 - 显示用户多输入的部分为红色
-                extra_text = ''.join(user_chars[j1:j2])
-                self.dictation_result_text.insert(tk.END, extra_text, "incorrect")
-        
+        self.dictation_result_text.insert("1.0", text)
+        for tag, ranges in tag_ranges.items():
+            self.dictation_result_text.tag_add(tag, *(f"1.0 + {offset} chars" for r in ranges for offset in r))
         self.dictation_result_text.config(state=tk.DISABLED)
+        
+        # 记录渲染耗时（段落长度的答案也应在一帧之内完成）
+        self.last_dictation_render_ms = (time.perf_counter() - render_start) * 1000
     
-    def update_dictation_stats(self, user_input, correct_text):
+    def update_dictation_stats(self, alignment):
         """更新听写统计信息"""
-        # 计算字符准确率
-        import difflib
-        
-        matcher = difflib.SequenceMatcher(None, correct_text, user_input)
-        similarity = matcher.ratio()
+        correct_text = alignment.correct_text
+        similarity = alignment.similarity
         
         # 更新统计数据
         self.dictation_stats['total_sentences'] += 1
         self.dictation_stats['total_chars'] += len(correct_text)
         
-        # 简单的准确率计算
-        correct_chars = int(len(correct_text) * similarity)
-        self.dictation_stats['correct_chars'] += correct_chars
+        # 对齐上的字符数即为写对的字符数
+        self.dictation_stats['correct_chars'] += alignment.correct_chars
+        self.dictation_stats['total_words'] += alignment.words.reference_count
+        self.dictation_stats['word_errors'] += alignment.words.error_count
         
-        # 如果相似度超过80%，认为句子正确
-        if similarity > 0.8:
+        # 相似度超过80%的句子算作正确
+        if alignment.is_correct:
             self.dictation_stats['correct_sentences'] += 1
         
         # 记录结果
         self.dictation_results.append({
             'sentence_index': self.dictation_current_sentence,
             'correct_text': correct_text,
-            'user_input': user_input,
-            'similarity': similarity
+            'user_input': alignment.user_input,
+            'similarity': similarity,
+            'wer': alignment.words.wer
         })
+        start_time, end_time = self.get_sentence_bounds(self.dictation_current_sentence)
+        self.record_sentence_event(self.dictation_current_sentence, SENTENCE_EVENT_DICTATION,
+                                   duration=end_time - start_time, similarity=similarity)
+        if self.current_audio_path:
+            # 保存答案和统计快照，重新打开文件时可以直接恢复
+            self.db_writer.submit(save_dictation_answer, self.current_audio_path, self.dictation_current_sentence,
+                                  alignment.user_input, similarity, alignment.words.wer,
+                                  self.dictation_current_sentence, dict(self.dictation_stats), datetime.datetime.now())
         
         # 更新显示
         self.update_dictation_display()
@@ -2399,8 +3300,13 @@ class ListeningPlayer(tk.Tk):
         if self.dictation_input:
             self.dictation_input.delete("1.0", tk.END)
         
-        # 移动到下一句
+        # 移动到下一句（上一句的片段可能仍在播放或处于暂停状态）
+        self.stop_dictation_playback()
         self.dictation_current_sentence += 1
+        self.prefetch_dictation_clips()
+        if self.current_audio_path:
+            self.db_writer.submit(save_dictation_position, self.current_audio_path, self.dictation_current_sentence,
+                                  dict(self.dictation_stats), datetime.datetime.now())
         
         # 禁用下一句按钮直到下次提交
         self.dictation_next_btn.config(state=tk.DISABLED)
@@ -2424,15 +3330,14 @@ class ListeningPlayer(tk.Tk):
         if not messagebox.askyesno("确认重置", "确定要重置听写练习吗？这将清空所有进度。", parent=self):
             return
         
-        # 重置所有状态
+        # 重置所有状态（同时清除保存的进度）
         self.dictation_current_sentence = 0
         self.dictation_results = []
-        self.dictation_stats = {
-            'total_chars': 0,
-            'correct_chars': 0,
-            'total_sentences': 0,
-            'correct_sentences': 0
-        }
+        self.dictation_stats = dict.fromkeys(DICTATION_STAT_KEYS, 0)
+        if self.current_audio_path:
+            self.db_writer.submit(clear_dictation_progress, self.current_audio_path)
+        self.stop_dictation_playback()
+        self.prefetch_dictation_clips()
         
         # 清空界面
         if self.dictation_input:
@@ -2450,6 +3355,13 @@ class ListeningPlayer(tk.Tk):
         # 更新显示
         self.update_dictation_display()
     
+    def get_dictation_word_accuracy(self):
+        """单词准确率（1 - 词错误率，最低为0），以百分比表示"""
+        total_words = self.dictation_stats['total_words']
+        if not total_words:
+            return 0.0
+        return max(0.0, 1.0 - self.dictation_stats['word_errors'] / total_words) * 100
+    
     def update_dictation_display(self):
         """更新听写界面显示"""
         if not self.dictation_stats_label:
@@ -2468,7 +3380,8 @@ class ListeningPlayer(tk.Tk):
             else:
                 sentence_accuracy = 0
             
-            stats_text = f"✅ 听写完成！字符准确率：{char_accuracy:.1f}%，句子准确率：{sentence_accuracy:.1f}%"
+            stats_text = (f"✅ 听写完成！单词准确率：{self.get_dictation_word_accuracy():.1f}%，"
+                          f"字符准确率：{char_accuracy:.1f}%，句子准确率：{sentence_accuracy:.1f}%")
             
             # 禁用相关按钮
             if hasattr(self, 'dictation_play_btn'):
@@ -2486,8 +3399,9 @@ class ListeningPlayer(tk.Tk):
             if self.dictation_stats['total_sentences'] > 0:
                 char_accuracy = (self.dictation_stats['correct_chars'] / self.dictation_stats['total_chars']) * 100
                 sentence_accuracy = (self.dictation_stats['correct_sentences'] / self.dictation_stats['total_sentences']) * 100
-                stats_text = (f"第 {current_progress}/{total_sentences} 句 | 字符准确率：{char_accuracy:.1f}% | "
-                           f"句子准确率：{sentence_accuracy:.1f}%")
+                stats_text = (f"第 {current_progress}/{total_sentences} 句 | "
+                              f"单词准确率：{self.get_dictation_word_accuracy():.1f}% | 字符准确率：{char_accuracy:.1f}% | "
+                              f"句子准确率：{sentence_accuracy:.1f}%")
             else:
                 stats_text = f"第 {current_progress}/{total_sentences} 句"
             
@@ -2506,6 +3420,84 @@ class ListeningPlayer(tk.Tk):
                 self.history_tree.selection_set(item_id)
             self.history_context_menu.post(event.x_root, event.y_root)
             
+    def toggle_review_session(self):
+        if self.is_reviewing:
+            self.end_review_session()
+        else:
+            self.start_review_session()
+
+    def start_review_session(self):
+        """复习模式：只循环播放听写得分低或循环次数多的句子，按间隔重复安排下次复习"""
+        if not self.is_loaded or not self.lyrics:
+            messagebox.showinfo("提示", "请先加载带字幕的音频文件再开始复习。", parent=self)
+            return
+        # 等待尚未写入的听写结果和循环记录，保证队列包含刚才的练习
+        self.db_writer.flush(wait=True, timeout=2.0)
+        queue_indices = [i for i in get_review_queue(self.db_conn, self.current_audio_path, datetime.date.today())
+                         if i < len(self.lyrics)]
+        if not queue_indices:
+            messagebox.showinfo("提示", "今天没有需要复习的句子。\n听写得分较低或多次循环的句子会加入复习。", parent=self)
+            return
+
+        self.review_queue = queue_indices
+        self.review_position = 0
+        self.is_reviewing = True
+
+        if self.is_paused:
+            self.toggle_play_pause()
+        if not self.is_looping_sentence:
+            self.is_looping_sentence = True
+            self.sentence_loop_btn.config(text="✓ 单句循环")
+            self.speed_combobox.configure(state="readonly")
+        self.review_btn.config(text="✓ 复习")
+        self.review_bar.pack(anchor="center", pady=(5, 0))
+        self.play_review_item()
+
+    def prepare_review_segments(self):
+        """在片段缓存的后台线程中预先渲染队列中随后几句（当前句由播放时渲染），切换句子时不用等待"""
+        start = self.review_position + 1
+        for index in self.review_queue[start:start + self.review_prefetch_count]:
+            start_time, end_time = self.get_sentence_bounds(index)
+            self.clip_cache.prefetch(self.current_playback_path, start_time, end_time, self.playback_speed)
+
+    def play_review_item(self):
+        self.current_line_index = self.review_queue[self.review_position]
+        self.play_current_sentence_with_speed_async()
+        self.update_sentence_display()
+        self.prepare_review_segments()
+        self.review_progress_label.config(
+            text=f"复习 {self.review_position + 1}/{len(self.review_queue)} · 第 {self.current_line_index + 1} 句")
+
+    def grade_review_item(self, remembered):
+        if not self.is_reviewing:
+            return
+        self.db_writer.submit(update_review_schedule, self.current_audio_path, self.current_line_index,
+                              remembered, datetime.date.today())
+        self.review_position += 1
+        if self.review_position < len(self.review_queue):
+            self.play_review_item()
+        else:
+            count = len(self.review_queue)
+            self.end_review_session()
+            messagebox.showinfo("复习完成", f"本次复习了 {count} 句，已按记忆情况安排下次复习。", parent=self)
+        self.focus_set()
+
+    def end_review_session(self):
+        if not self.is_reviewing:
+            return
+        self.hide_review_bar()
+        # 回到正常播放
+        if self.is_looping_sentence:
+            self.toggle_sentence_loop()
+        self.focus_set()
+
+    def hide_review_bar(self):
+        self.is_reviewing = False
+        self.review_queue = []
+        self.review_position = 0
+        self.review_btn.config(text="📚 复习")
+        self.review_bar.pack_forget()
+
     def jump_to_sentence(self, direction):
         if not self.lyrics: return
         target_index = self.current_line_index + direction
@@ -2520,7 +3512,7 @@ class ListeningPlayer(tk.Tk):
                 self.update_sentence_display()
             else:
                 # 正常播放模式，跳转到指定句子的时间点
-                new_time = self.lyrics[target_index][0]
+                new_time = self.lyrics.start(target_index)
                 self.progress_bar.set(new_time)
                 self.perform_seek(None)
         self.focus_set()
@@ -2534,69 +3526,50 @@ class ListeningPlayer(tk.Tk):
             target_line_index = self.current_line_index
         else:
             # 正常播放模式下，根据当前播放时间计算字幕
-            current_time = self.progress_bar.get()
-            target_line_index = -1
-            for i, (line_time, text) in enumerate(self.lyrics):
-                if current_time >= line_time:
-                    target_line_index = i
+            target_line_index = self.lyrics.index_at(self.progress_bar.get())
         
         # 只有在字幕索引真的改变时才更新显示
         if target_line_index != self.current_line_index or self.is_looping_sentence:
             if not self.is_looping_sentence:
                 self.current_line_index = target_line_index
 
-            prev_text = self.lyrics[self.current_line_index - 1][1] if self.current_line_index > 0 else ""
-            current_text = self.lyrics[self.current_line_index][1] if self.current_line_index != -1 else ""
-            next_text = self.lyrics[self.current_line_index + 1][1] if self.current_line_index < len(self.lyrics) - 1 else ""
-            
-            # 防闪烁优化：检查内容是否真的需要更新
-            try:
-                current_prev = self.prev_line_text.get('1.0', 'end-1c')
-                current_main = self.current_line_text.get('1.0', 'end-1c')
-                current_next = self.next_line_text.get('1.0', 'end-1c')
-                
-                # 只更新内容真正改变的文本框
-                if current_prev != prev_text:
-                    self.prev_line_text.config(state=tk.NORMAL)
-                    self.prev_line_text.delete('1.0', tk.END)
-                    self.prev_line_text.insert(tk.END, prev_text)
-                    self.prev_line_text.tag_add("centered", "1.0", tk.END)
-                    self.prev_line_text.config(state=tk.DISABLED)
-                
-                if current_main != current_text:
-                    self.current_line_text.config(state=tk.NORMAL)
-                    self.current_line_text.delete('1.0', tk.END)
-                    self.current_line_text.insert(tk.END, current_text)
-                    self.current_line_text.tag_add("justified", "1.0", tk.END)
-                    self.current_line_text.config(state=tk.DISABLED)
-                
-                if current_next != next_text:
-                    self.next_line_text.config(state=tk.NORMAL)
-                    self.next_line_text.delete('1.0', tk.END)
-                    self.next_line_text.insert(tk.END, next_text)
-                    self.next_line_text.tag_add("centered", "1.0", tk.END)
-                    self.next_line_text.config(state=tk.DISABLED)
-                    
-            except tk.TclError:
-                # 如果获取文本失败，则进行完整更新
-                self.prev_line_text.config(state=tk.NORMAL)
-                self.prev_line_text.delete('1.0', tk.END)
-                self.prev_line_text.insert(tk.END, prev_text)
-                self.prev_line_text.tag_add("centered", "1.0", tk.END)
-                self.prev_line_text.config(state=tk.DISABLED)
-
-                self.current_line_text.config(state=tk.NORMAL)
-                self.current_line_text.delete('1.0', tk.END)
-                self.current_line_text.insert(tk.END, current_text)
-                self.current_line_text.tag_add("justified", "1.0", tk.END)
-                self.current_line_text.config(state=tk.DISABLED)
-
-                self.next_line_text.config(state=tk.NORMAL)
-                self.next_line_text.delete('1.0', tk.END)
-                self.next_line_text.insert(tk.END, next_text)
-                self.next_line_text.tag_add("centered", "1.0", tk.END)
-                self.next_line_text.config(state=tk.DISABLED)
-            
+            # 防闪烁优化：索引未变化时直接返回，不再回读Text控件内容
+            if self.current_line_index == self._rendered_line_index:
+                return
+
+            prev_text = self.lyrics.text(self.current_line_index - 1) if self.current_line_index > 0 else ""
+            current_text = self.lyrics.text(self.current_line_index) if self.current_line_index != -1 else ""
+            next_text = self.lyrics.text(self.current_line_index + 1) if self.current_line_index < len(self.lyrics) - 1 else ""
+
+            # 只更新内容真正改变的文本框（与Python侧缓存比较，避免Tcl往返）
+            rendered_prev, rendered_main, rendered_next = self._rendered_lines
+            if rendered_prev != prev_text:
+                self.set_subtitle_text(self.prev_line_text, prev_text, "centered")
+            if rendered_main != current_text:
+                self.set_subtitle_text(self.current_line_text, current_text, "justified")
+            if rendered_next != next_text:
+                self.set_subtitle_text(self.next_line_text, next_text, "centered")
+
+            self._rendered_line_index = self.current_line_index
+            self._rendered_lines = (prev_text, current_text, next_text)
+
+    def set_subtitle_text(self, widget, text, tag):
+        """替换字幕文本控件的内容"""
+        widget.config(state=tk.NORMAL)
+        widget.delete('1.0', tk.END)
+        if text:
+            widget.insert(tk.END, text, tag)
+        widget.config(state=tk.DISABLED)
+
+    def clear_subtitle_display(self):
+        """清空字幕显示并重置渲染缓存"""
+        for widget in (self.prev_line_text, self.current_line_text, self.next_line_text):
+            widget.config(state=tk.NORMAL)
+            widget.delete('1.0', tk.END)
+            widget.config(state=tk.DISABLED)
+        self._rendered_line_index = None
+        self._rendered_lines = ("", "", "")
+
     # --- MODIFIED: The core logic update function ---
     def update_player_state(self, force_update=False):
         if self.is_loaded:
@@ -2625,6 +3598,9 @@ class ListeningPlayer(tk.Tk):
                     if elapsed >= self.current_loop_duration - 0.05:  # 减少缓冲时间到0.05秒
                         # print("[DEBUG] 单句循环片段播放结束，自动重播")
                         if not self.is_processing_audio:  # 避免重复处理
+                            self.record_sentence_event(self.current_line_index, SENTENCE_EVENT_LOOP,
+                                                       speed=self.playback_speed,
+                                                       duration=self.current_loop_duration)
                             self.play_current_sentence_with_speed_async()
                         self._update_job = self.after(100, self.update_player_state)
                         return
@@ -2711,6 +3687,9 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
+    # 打包为exe后，内嵌字幕提取使用的进程池需要此调用
+    import multiprocessing
+    multiprocessing.freeze_support()
     # 在程序启动时设置环境变量，减少窗口闪烁
     import os
     os.environ['PYTHONHASHSEED'] = '0'
@@ -0,0 +1,312 @@
+import os
+import queue
+import hashlib
+import subprocess
+import threading
+import wave
+from library import file_fingerprint
+
+# 解码缓存：非WAV/FLAC音频（以及视频中的音轨）用ffmpeg转码一次为FLAC，
+# 以文件内容指纹命名。FLAC无损，大小约为WAV的一半（一小时约300MB，WAV约635MB），
+# pygame可以按采样精确跳转，解码开销远小于MP3/AAC。之后的播放、跳转和片段截取都读取缓存，不再解码原文件。
+# 片段缓存：听写用的句子片段按 (音频, 起止时间, 语速) 渲染为独立的WAV，
+# 播放时直接加载片段，播放到片段末尾自然结束。
+
+# pygame.mixer.music 能直接播放的格式；其余格式必须先转码才能播放
+PYGAME_NATIVE_EXTENSIONS = ('.mp3', '.ogg', '.flac', '.wav')
+CACHE_LIMIT_BYTES = 4 * 1024 ** 3  # 超出后删除最久未使用的缓存文件
+CLIP_CACHE_LIMIT_BYTES = 256 * 1024 ** 2
+CACHE_FILE_EXTENSIONS = ('.wav', '.flac')  # 参与淘汰的缓存文件（包括旧版本留下的WAV解码缓存）
+
+CREATE_NO_WINDOW = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+
+
+def wav_duration(path):
+    """从WAV文件头读取时长（秒），不读取音频数据"""
+    with wave.open(path, 'rb') as f:
+        return f.getnframes() / float(f.getframerate())
+
+
+def flac_duration(path):
+    """从FLAC的STREAMINFO块读取时长（秒），头中没有记录总采样数时返回None"""
+    with open(path, 'rb') as f:
+        header = f.read(42)
+    if len(header) < 42 or header[:4] != b'fLaC':
+        raise ValueError(f"不是FLAC文件：{path}")
+    # STREAMINFO 第10~17字节：采样率(20位)、声道数-1(3位)、位深-1(5位)、总采样数(36位)
+    bits = int.from_bytes(header[18:26], 'big')
+    sample_rate = bits >> 44
+    total_samples = bits & ((1 << 36) - 1)
+    if not sample_rate or not total_samples:
+        return None
+    return total_samples / float(sample_rate)
+
+
+def audio_file_duration(path):
+    """从文件头读取WAV/FLAC的时长，其他格式或无法读取时返回None"""
+    lower_path = path.lower()
+    try:
+        if lower_path.endswith('.wav'):
+            return wav_duration(path)
+        if lower_path.endswith('.flac'):
+            return flac_duration(path)
+    except (OSError, ValueError, EOFError, wave.Error):
+        return None
+    return None
+
+
+def atempo_filter(speed):
+    """返回 ffmpeg 变速滤镜（atempo 只支持0.5~2.0倍，超出时多个叠加）"""
+    filters = []
+    remain = speed
+    while remain > 2.0:
+        filters.append("atempo=2.0")
+        remain /= 2.0
+    while remain < 0.5:
+        filters.append("atempo=0.5")
+        remain /= 0.5
+    filters.append(f"atempo={remain}")
+    return ",".join(filters)
+
+
+def _run_ffmpeg(cmd, timeout, action):
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            timeout=timeout, creationflags=CREATE_NO_WINDOW)
+    if result.returncode != 0:
+        stderr_msg = result.stderr.decode('utf-8', errors='replace')
+        raise RuntimeError(f"FFmpeg{action}失败（返回码：{result.returncode}）:\n{stderr_msg}")
+
+
+class _FileCache:
+    """以名称为键的文件缓存：同一名称只生成一次，后台线程处理 request() 提交的生成任务，
+    总大小超过上限时从最久未使用的文件开始删除。子类实现 _create(path, *args)。"""
+
+    thread_name = "file-cache"
+    extension = '.wav'
+
+    def __init__(self, cache_dir, ffmpeg_path, limit_bytes):
+        self.cache_dir = cache_dir
+        self._ffmpeg_path = ffmpeg_path  # 返回ffmpeg路径的函数（找不到时抛出异常）
+        self.limit_bytes = limit_bytes
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._in_progress = {}  # 名称 -> threading.Event
+        self._callbacks = {}    # 名称 -> [callback(路径或None, 异常或None)]，生成结束时在生成线程中调用
+        self._queued = set()    # 已在后台队列中等待生成的名称
+        self._pinned = frozenset()  # 淘汰时跳过的文件路径
+        self._thread = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._queue.put(None)
+
+    def path_for(self, name):
+        return os.path.join(self.cache_dir, name + self.extension)
+
+    def has(self, name):
+        return os.path.exists(self.path_for(name))
+
+    def cached_path(self, name):
+        """缓存存在时返回其路径（并更新修改时间，供淘汰时判断最近使用），否则返回None"""
+        path = self.path_for(name)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def pin(self, *paths):
+        """淘汰时保留这些文件（替换之前保留的文件）"""
+        self._pinned = frozenset(paths)
+
+    def _request(self, name, *args):
+        """后台生成（已缓存、正在生成或已在队列中时忽略）"""
+        if self.cached_path(name):
+            return  # 已缓存（同时更新其最近使用时间）
+        with self._lock:
+            if name in self._in_progress or name in self._queued:
+                return
+            self._queued.add(name)
+        self._queue.put((name, args))
+
+    def _request_now(self, name, callback, *args):
+        """立即在单独的线程中生成（不排在后台队列之后），完成后调用 callback(路径或None, 异常或None)
+
+        正在生成时只登记回调，由正在生成的线程在结束时调用。
+        """
+        with self._lock:
+            self._callbacks.setdefault(name, []).append(callback)
+            if name in self._in_progress:
+                return
+        threading.Thread(target=self._get_quietly, args=(name, *args), name=self.thread_name, daemon=True).start()
+
+    def _get_quietly(self, name, *args):
+        try:
+            self._get(name, *args)
+        except Exception:
+            pass  # 错误已通过回调报告
+
+    def _get(self, name, *args):
+        """生成并返回缓存路径；其他线程正在生成同一文件时等待其完成"""
+        with self._lock:
+            event = self._in_progress.get(name)
+            owner = event is None
+            if owner:
+                event = self._in_progress[name] = threading.Event()
+        if not owner:
+            event.wait()
+            path = self.cached_path(name)
+            if path is None:
+                raise RuntimeError(f"音频处理失败：{args[0] if args else name}")
+            return path
+
+        path = error = None
+        try:
+            path = self.cached_path(name)
+            if path is None:
+                path = self.path_for(name)
+                temp_path = path + '.part'
+                try:
+                    self._create(temp_path, *args)
+                    # 写完后再改名，中途退出不会留下不完整的缓存
+                    os.replace(temp_path, path)
+                finally:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                self._evict()
+            return path
+        except Exception as e:
+            path, error = None, e
+            raise
+        finally:
+            with self._lock:
+                del self._in_progress[name]
+                callbacks = self._callbacks.pop(name, [])
+            event.set()
+            for callback in callbacks:
+                try:
+                    callback(path, error)
+                except Exception:
+                    pass
+
+    def _create(self, path, *args):
+        raise NotImplementedError
+
+    def _evict(self):
+        """缓存总大小超过上限时，从最久未使用的文件开始删除"""
+        entries = []
+        total = 0
+        pinned = self._pinned
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(CACHE_FILE_EXTENSIONS):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        if total <= self.limit_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries[:-1]:  # 保留最近使用的一个（通常就是刚生成的文件）
+            if path in pinned:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.limit_bytes:
+                break
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            name, args = item
+            with self._lock:
+                self._queued.discard(name)
+            try:
+                self._get(name, *args)
+            except Exception:
+                pass
+
+
+class DecodeCache(_FileCache):
+    """按指纹缓存的FLAC解码结果
+
+    has()/cached_path() 只检查缓存是否存在；request() 交给后台线程转码，同一文件的重复请求只转码一次；
+    带 callback 时不排队，立即转码（用户正在等待），完成后在转码线程中调用 callback(缓存路径或None, 异常或None)。
+    """
+
+    thread_name = "decode-cache"
+    extension = '.flac'
+
+    def __init__(self, cache_dir, ffmpeg_path, limit_bytes=CACHE_LIMIT_BYTES):
+        super().__init__(cache_dir, ffmpeg_path, limit_bytes)
+
+    def request(self, source_path, fingerprint, callback=None):
+        """后台转码（已缓存或正在转码时忽略）"""
+        if callback is None:
+            self._request(fingerprint, source_path)
+        else:
+            self._request_now(fingerprint, callback, source_path)
+
+    def _create(self, path, source_path):
+        cmd = [
+            self._ffmpeg_path(), "-v", "error", "-y", "-i", source_path,
+            "-map", "0:a:0", "-vn", "-acodec", "flac", "-sample_fmt", "s16", "-f", "flac", path
+        ]
+        _run_ffmpeg(cmd, 600, "转码")
+
+
+class ClipCache(_FileCache):
+    """句子片段缓存：截取 [start, end) 并按 speed 变速后保存为WAV
+
+    render() 在当前线程中渲染（已缓存时直接返回）；prefetch() 交给后台线程预先渲染。
+    源文件以内容指纹区分：文件移动或改名后已渲染的片段仍然有效，内容变化后旧片段不会再被使用。
+    """
+
+    thread_name = "clip-cache"
+
+    def __init__(self, cache_dir, ffmpeg_path, limit_bytes=CLIP_CACHE_LIMIT_BYTES):
+        super().__init__(cache_dir, ffmpeg_path, limit_bytes)
+
+    @staticmethod
+    def clip_name(source_path, start, end, speed):
+        key = f"{file_fingerprint(source_path)}|{start:.3f}|{end:.3f}|{speed:g}"
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def cached_clip(self, source_path, start, end, speed):
+        """片段已渲染时返回其路径，否则返回None"""
+        try:
+            return self.cached_path(self.clip_name(source_path, start, end, speed))
+        except OSError:
+            return None
+
+    def prefetch(self, source_path, start, end, speed):
+        try:
+            self._request(self.clip_name(source_path, start, end, speed), source_path, start, end, speed)
+        except OSError:
+            pass
+
+    def render(self, source_path, start, end, speed):
+        return self._get(self.clip_name(source_path, start, end, speed), source_path, start, end, speed)
+
+    def _create(self, path, source_path, start, end, speed):
+        # -ss/-t 放在 -i 之前按时间定位读取（转码时 ffmpeg 会精确丢弃定位点之前的采样），
+        # 不必解码整个文件；片段长度由 -t 决定，变速在截取之后进行
+        cmd = [self._ffmpeg_path(), "-v", "error", "-y", "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}",
+               "-i", source_path, "-vn"]
+        if speed != 1.0:
+            cmd += ["-filter:a", atempo_filter(speed)]
+        cmd += ["-acodec", "pcm_s16le", "-f", "wav", path]
+        _run_ffmpeg(cmd, 60, "截取片段")
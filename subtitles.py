@@ -0,0 +1,374 @@
+import os
+import re
+import bisect
+import subprocess
+from array import array
+
+# 字幕解析：播放器和后台字幕索引共用同一套解析函数，保证句子序号一致。
+# 各格式的解析器都逐行读取文件（不把整个文件读入内存再做正则匹配），
+# 输出同一种字幕模型 SubtitleTrack。
+
+# 按优先级排列：同名的多个字幕文件只使用排在前面的格式
+SUBTITLE_EXTENSIONS = ('.srt', '.vtt', '.ass', '.ssa', '.lrc')
+
+# 视频容器中可以直接转换为SRT的文本字幕编码（图形字幕如PGS/DVD字幕无法提取文本）
+TEXT_SUBTITLE_CODECS = ('subrip', 'srt', 'ass', 'ssa', 'mov_text', 'webvtt', 'text')
+STREAM_PATTERN = re.compile(r'Stream #\d+:\d+\S*: Subtitle: (\w+)')
+CREATE_NO_WINDOW = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+
+LAST_CUE_DURATION = 5.0  # LRC 只有开始时间，最后一句的结束时间按此估计
+
+TAG_PATTERN = re.compile(r'<[^>]*>')            # VTT/SRT 中的 <i>、<c.xxx>、<00:01.000> 等标签
+ASS_OVERRIDE_PATTERN = re.compile(r'\{[^}]*\}')  # ASS 中的 {\pos(..)} 等样式代码
+LRC_TIME_PATTERN = re.compile(r'\[(\d+):(\d+(?:[.:]\d+)?)\]')
+
+
+class Cue:
+    """一句字幕（SubtitleTrack 按下标访问时返回）"""
+
+    __slots__ = ('start', 'end', 'text')
+
+    def __init__(self, start, end, text):
+        self.start = start
+        self.end = end
+        self.text = text
+
+    def __iter__(self):
+        return iter((self.start, self.end, self.text))
+
+    def __repr__(self):
+        return f"Cue({self.start!r}, {self.end!r}, {self.text!r})"
+
+
+class SubtitleTrack:
+    """字幕模型：开始/结束时间保存在 array('d') 中，全部文本拼接为一个字符串并用偏移量定位
+
+    所有解析器都输出此结构。每句只占两个 double 和一个偏移量，不为每句创建元组和字符串对象；
+    按下标读取开始/结束时间和文本都是 O(1)，index_at() 用二分查找定位播放时间所在的句子。
+    解析过程中追加的文本先暂存，第一次读取文本时才拼接。
+    """
+
+    __slots__ = ('starts', 'ends', '_buffer', '_offsets', '_pending')
+
+    def __init__(self):
+        self.starts = array('d')
+        self.ends = array('d')
+        self._buffer = ''
+        self._offsets = array('q', [0])  # 第 i 句文本为 _buffer[_offsets[i]:_offsets[i + 1]]
+        self._pending = []
+
+    def append(self, start, end, text):
+        self.starts.append(start)
+        self.ends.append(end)
+        self._pending.append(text)
+
+    def _compact(self):
+        """把暂存的文本拼接到缓冲区末尾"""
+        offset = self._offsets[-1]
+        for text in self._pending:
+            offset += len(text)
+            self._offsets.append(offset)
+        self._buffer += ''.join(self._pending)
+        self._pending = []
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.starts)
+        return Cue(self.starts[index], self.ends[index], self.text(index))
+
+    def __iter__(self):
+        """依次返回 (开始时间, 结束时间, 文本)"""
+        if self._pending:
+            self._compact()
+        buffer, offsets = self._buffer, self._offsets
+        for i, (start, end) in enumerate(zip(self.starts, self.ends)):
+            yield start, end, buffer[offsets[i]:offsets[i + 1]]
+
+    def __getstate__(self):
+        if self._pending:
+            self._compact()
+        return self.starts, self.ends, self._buffer, self._offsets
+
+    def __setstate__(self, state):
+        self.starts, self.ends, self._buffer, self._offsets = state
+        self._pending = []
+
+    def start(self, index):
+        return self.starts[index]
+
+    def end(self, index):
+        return self.ends[index]
+
+    def text(self, index):
+        if self._pending:
+            self._compact()
+        if index < 0:
+            index += len(self.starts)
+        if not 0 <= index < len(self.starts):
+            raise IndexError("subtitle index out of range")
+        return self._buffer[self._offsets[index]:self._offsets[index + 1]]
+
+    def index_at(self, seconds):
+        """返回开始时间不晚于 seconds 的最后一句的序号，在第一句之前时返回 -1"""
+        return bisect.bisect_right(self.starts, seconds) - 1
+
+    def sort(self):
+        """按开始时间排序（LRC/ASS 中的句子不一定按时间顺序出现）"""
+        starts = self.starts
+        order = sorted(range(len(starts)), key=starts.__getitem__)
+        if all(order[i] == i for i in range(len(order))):
+            return
+        cues = list(self)
+        self.__init__()
+        for i in order:
+            self.append(*cues[i])
+
+    @classmethod
+    def from_cues(cls, cues):
+        track = cls()
+        for start, end, text in cues:
+            track.append(start, end, text)
+        return track
+
+
+def parse_timestamp(time_str):
+    """将 'HH:MM:SS,mmm'、'MM:SS.mmm'、'H:MM:SS.cc' 等格式的时间转换为秒"""
+    parts = time_str.strip().replace(',', '.').split(':')
+    seconds = float(parts[-1])
+    if len(parts) > 1:
+        seconds += int(parts[-2]) * 60
+    if len(parts) > 2:
+        seconds += int(parts[-3]) * 3600
+    return seconds
+
+
+def _parse_timing_line(line):
+    """解析 '开始 --> 结束 [设置]' 行，返回 (开始, 结束)"""
+    start_str, _, rest = line.partition('-->')
+    end_str = rest.split(None, 1)[0] if rest.strip() else start_str
+    return parse_timestamp(start_str), parse_timestamp(end_str)
+
+
+def _parse_blocks(lines, track, strip_tags):
+    """SRT/VTT 共用：时间行之后到空行之前的各行为一句字幕"""
+    start = end = None
+    text_lines = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            if start is not None and text_lines:
+                track.append(start, end, ' '.join(text_lines))
+            start = None
+            text_lines = []
+        elif start is None:
+            # 序号行、VTT 的 cue 标识和 NOTE/STYLE 块都在时间行之前，直接跳过
+            if '-->' in line:
+                try:
+                    start, end = _parse_timing_line(line)
+                except (ValueError, IndexError):
+                    start = None
+        else:
+            text_lines.append(TAG_PATTERN.sub('', line) if strip_tags else line)
+    if start is not None and text_lines:
+        track.append(start, end, ' '.join(text_lines))
+    return track
+
+
+def parse_srt_lines(lines):
+    """解析 SRT 格式的文本行，返回 SubtitleTrack"""
+    return _parse_blocks(lines, SubtitleTrack(), strip_tags=False)
+
+
+def parse_vtt_lines(lines):
+    """解析 WebVTT 格式的文本行（去掉 <i>、<c> 等标签），返回 SubtitleTrack"""
+    return _parse_blocks(lines, SubtitleTrack(), strip_tags=True)
+
+
+def parse_lrc_lines(lines):
+    """解析 LRC 歌词格式：[mm:ss.xx]文本，一行可以有多个时间标签；结束时间取下一句的开始时间"""
+    cues = []
+    for line in lines:
+        times = LRC_TIME_PATTERN.findall(line)
+        if not times:
+            continue  # [ti:标题]、[offset:..] 等元数据行
+        text = LRC_TIME_PATTERN.sub('', line).strip()
+        for minutes, seconds in times:
+            cues.append((int(minutes) * 60 + float(seconds.replace(':', '.')), text))
+    cues.sort(key=lambda cue: cue[0])
+    track = SubtitleTrack()
+    for i, (start, text) in enumerate(cues):
+        if not text:
+            continue  # 空文本的时间标签只用于结束上一句
+        end = cues[i + 1][0] if i + 1 < len(cues) else start + LAST_CUE_DURATION
+        track.append(start, end, text)
+    return track
+
+
+def parse_ass_lines(lines):
+    """解析 ASS/SSA 字幕的 [Events] 段：按 Format 行确定字段顺序，去掉样式代码"""
+    track = SubtitleTrack()
+    in_events = False
+    fields = None
+    for line in lines:
+        line = line.strip()
+        if line.startswith('['):
+            in_events = line.lower() == '[events]'
+            continue
+        if not in_events:
+            continue
+        key, _, value = line.partition(':')
+        key = key.strip().lower()
+        if key == 'format':
+            fields = [field.strip().lower() for field in value.split(',')]
+        elif key == 'dialogue' and fields:
+            values = value.split(',', len(fields) - 1)
+            if len(values) < len(fields):
+                continue
+            record = dict(zip(fields, values))
+            text = ASS_OVERRIDE_PATTERN.sub('', record['text'])
+            text = text.replace('\\N', ' ').replace('\\n', ' ').replace('\\h', ' ').strip()
+            if not text:
+                continue
+            try:
+                track.append(parse_timestamp(record['start']), parse_timestamp(record['end']), text)
+            except (ValueError, KeyError):
+                continue
+    track.sort()
+    return track
+
+
+PARSERS = {
+    '.srt': parse_srt_lines,
+    '.vtt': parse_vtt_lines,
+    '.lrc': parse_lrc_lines,
+    '.ass': parse_ass_lines,
+    '.ssa': parse_ass_lines,
+}
+
+
+def load_subtitle(path):
+    """按扩展名选择解析器读取字幕文件，返回 SubtitleTrack"""
+    parser = PARSERS.get(os.path.splitext(path)[1].lower())
+    if parser is None:
+        raise IOError(f"不支持的字幕格式: {path}")
+    try:
+        # utf-8-sig 同时兼容带BOM的文件
+        with open(path, 'r', encoding='utf-8-sig', errors='replace') as f:
+            return parser(f)
+    except OSError as e:
+        raise IOError(f"无法读取字幕文件: {path}\n{e}")
+
+
+def find_text_subtitle_stream(ffmpeg_path, path):
+    """返回视频文件中第一条文本字幕在字幕流中的序号（用于 -map 0:s:N），没有时返回None"""
+    result = subprocess.run([ffmpeg_path, "-hide_banner", "-i", path], stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, timeout=60, creationflags=CREATE_NO_WINDOW)
+    codecs = STREAM_PATTERN.findall(result.stderr.decode('utf-8', errors='replace'))
+    for index, codec in enumerate(codecs):
+        if codec in TEXT_SUBTITLE_CODECS:
+            return index
+    return None
+
+
+def extract_embedded_subtitle(ffmpeg_path, path):
+    """提取视频文件中的第一条文本字幕（在后台进程池中运行）
+
+    返回 SubtitleTrack；文件中没有文本字幕时返回None。
+    """
+    stream = find_text_subtitle_stream(ffmpeg_path, path)
+    if stream is None:
+        return None
+    result = subprocess.run([ffmpeg_path, "-v", "error", "-i", path, "-map", f"0:s:{stream}", "-f", "srt", "-"],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=300,
+                            creationflags=CREATE_NO_WINDOW)
+    if result.returncode != 0:
+        stderr_msg = result.stderr.decode('utf-8', errors='replace')
+        raise RuntimeError(f"FFmpeg提取字幕失败（返回码：{result.returncode}）:\n{stderr_msg}")
+    return parse_srt_lines(result.stdout.decode('utf-8', errors='replace').splitlines())
+
+
+def _benchmark(cue_count=50000):
+    """各格式解析速度测试：python subtitles.py [句子数]"""
+    import tempfile
+    import time
+
+    def srt_time(seconds, sep=','):
+        ms = int(round(seconds * 1000))
+        return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d}{sep}{ms % 1000:03d}"
+
+    def ass_time(seconds):
+        cs = int(round(seconds * 100))
+        return f"{cs // 360000}:{cs // 6000 % 60:02d}:{cs // 100 % 60:02d}.{cs % 100:02d}"
+
+    def lrc_time(seconds):
+        cs = int(round(seconds * 100))
+        return f"{cs // 6000:02d}:{cs // 100 % 60:02d}.{cs % 100:02d}"
+
+    text = "This is sentence number {} of the benchmark subtitle file."
+    writers = {
+        '.srt': lambda f, i, s, e: f.write(f"{i + 1}\n{srt_time(s)} --> {srt_time(e)}\n{text.format(i)}\n\n"),
+        '.vtt': lambda f, i, s, e: f.write(f"{srt_time(s, '.')} --> {srt_time(e, '.')}\n<i>{text.format(i)}</i>\n\n"),
+        '.lrc': lambda f, i, s, e: f.write(f"[{lrc_time(s)}]{text.format(i)}\n"),
+        '.ass': lambda f, i, s, e: f.write(f"Dialogue: 0,{ass_time(s)},{ass_time(e)},Default,,0,0,0,,"
+                                           f"{{\\i1}}{text.format(i)}\n"),
+    }
+    headers = {
+        '.vtt': "WEBVTT\n\n",
+        '.ass': "[Script Info]\nScriptType: v4.00+\n\n[Events]\n"
+                "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n",
+    }
+    with tempfile.TemporaryDirectory() as folder:
+        for ext, write in writers.items():
+            path = os.path.join(folder, 'bench' + ext)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(headers.get(ext, ''))
+                for i in range(cue_count):
+                    write(f, i, i * 2.0, i * 2.0 + 1.5)
+            best = None
+            for _ in range(3):
+                t = time.perf_counter()
+                track = load_subtitle(path)
+                elapsed = time.perf_counter() - t
+                best = elapsed if best is None else min(best, elapsed)
+            assert len(track) == cue_count, (ext, len(track))
+            print(f"{ext:5s} {cue_count} 句  {os.path.getsize(path) / 1024 / 1024:6.2f} MB  "
+                  f"{best * 1000:8.1f} ms  ({cue_count / best / 1000:.0f}k 句/秒)")
+
+    # 内存占用：SubtitleTrack 与 [(开始, 结束, 文本), ...] 元组列表比较
+    import tracemalloc
+    cues = [(i * 2.0, i * 2.0 + 1.5, text.format(i)) for i in range(cue_count)]
+    encoded = [(start, end, text.encode('utf-8')) for start, end, text in cues]  # 建模型时才生成新字符串
+
+    def measure(build):
+        tracemalloc.start()
+        result = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return result, size
+
+    _, tuple_bytes = measure(lambda: [(start, end, data.decode('utf-8')) for start, end, data in encoded])
+
+    def build_track():
+        track = SubtitleTrack()
+        for start, end, data in encoded:
+            track.append(start, end, data.decode('utf-8'))
+        track.text(0)  # 拼接暂存的文本
+        return track
+
+    track, track_bytes = measure(build_track)
+    track_bytes = max(track_bytes, 1)
+    print(f"内存  元组列表 {tuple_bytes / cue_count:6.1f} 字节/句  SubtitleTrack {track_bytes / cue_count:6.1f} 字节/句  "
+          f"({tuple_bytes / track_bytes:.1f}x)")
+
+    t = time.perf_counter()
+    for i in range(cue_count):
+        track.index_at(i * 2.0 + 0.5)
+    print(f"index_at  {(time.perf_counter() - t) / cue_count * 1e6:.2f} µs/次")
+
+
+if __name__ == "__main__":
+    import sys
+    _benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)